@@ -0,0 +1,164 @@
+import os
+import json
+import math
+import hashlib
+import cv2
+import numpy as np
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+class ImageCache:
+
+    """ Training images decoded once and resized the way Ultralytics resizes them, stored back to back
+    in one uint8 file that every dataloader worker memory-maps instead of decoding JPEGs each epoch """
+
+    def __init__(self, cache_dir: Path):
+
+        self.cache_dir = Path(cache_dir)
+        # Rows of (offset, height, width, original_height, original_width)
+        self.index = np.load(self.cache_dir / 'index.npy')
+        self._images = None
+
+    @property
+    def images(self) -> np.memmap:
+        # Opened lazily so each dataloader worker maps the file itself instead of receiving a pickled copy
+        if self._images is None:
+            self._images = np.memmap(self.cache_dir / 'images.u8', dtype=np.uint8, mode='r')
+        return self._images
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int):
+        offset, height, width, height0, width0 = (int(v) for v in self.index[i])
+        image = np.array(self.images[offset:offset + height * width * 3]).reshape(height, width, 3)
+        return image, (height0, width0)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+def cache_key(im_files: list, imgsz: int) -> str:
+
+    """ Changes whenever an image is added, removed or rewritten, or the training resolution changes """
+
+    digest = hashlib.sha1(str(imgsz).encode())
+    for im_file in im_files:
+        stat = os.stat(im_file)
+        digest.update(f"{im_file}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def _load_resized(im_file: str, imgsz: int):
+
+    """ Same decode and long-side resize as BaseDataset.load_image(rect_mode=True) """
+
+    image = cv2.imread(im_file)
+    if image is None:
+        raise FileNotFoundError(f"Image not found: {im_file}")
+
+    height0, width0 = image.shape[:2]
+    ratio = imgsz / max(height0, width0)
+    if ratio != 1:
+        size = (min(math.ceil(width0 * ratio), imgsz), min(math.ceil(height0 * ratio), imgsz))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+
+    return np.ascontiguousarray(image), (height0, width0)
+
+def build_image_cache(im_files: list, imgsz: int, cache_dir: Path, threads: int = None) -> ImageCache:
+
+    """ Decode and resize every image into cache_dir, reusing an existing cache if it is still valid """
+
+    cache_dir = Path(cache_dir)
+    meta_path = cache_dir / 'meta.json'
+    key = cache_key(im_files, imgsz)
+
+    if meta_path.exists() and json.loads(meta_path.read_text()).get('key') == key:
+        return ImageCache(cache_dir)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    meta_path.unlink(missing_ok=True)
+
+    index = np.zeros((len(im_files), 5), dtype=np.int64)
+    offset = 0
+    threads = threads or min(8, os.cpu_count() or 1)
+
+    print(f"[CACHE] Decoding {len(im_files)} images at imgsz={imgsz} into {cache_dir}")
+
+    # cv2 releases the GIL while decoding and resizing, so threads keep every core busy
+    with open(cache_dir / 'images.u8', 'wb') as f, ThreadPoolExecutor(max_workers=threads) as executor:
+        for i, (image, (height0, width0)) in enumerate(executor.map(lambda im_file: _load_resized(im_file, imgsz), im_files)):
+            f.write(image.tobytes())
+            index[i] = (offset, image.shape[0], image.shape[1], height0, width0)
+            offset += image.size
+
+    np.save(cache_dir / 'index.npy', index)
+    # Written last, so an interrupted build is rebuilt next time
+    meta_path.write_text(json.dumps({'key': key, 'imgsz': imgsz, 'images': len(im_files), 'bytes': offset}))
+
+    print(f"[CACHE] Cached {len(im_files)} images ({offset / 1e9:.2f} GB)")
+    return ImageCache(cache_dir)
+
+class MemmapYOLODataset(YOLODataset):
+
+    """ YOLODataset that reads pre-decoded images from an ImageCache instead of decoding JPEGs """
+
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        image_dir = Path(self.im_files[0]).parent
+        cache_dir = image_dir.parent / f'{image_dir.name}_memmap_{self.imgsz}'
+        self.image_cache = build_image_cache(self.im_files, self.imgsz, cache_dir)
+
+    def load_image(self, i, rect_mode=True):
+
+        # Non-rect mode stretches to a square, which the cache does not store
+        if not rect_mode:
+            return super().load_image(i, rect_mode)
+
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+
+        image, hw0 = self.image_cache[i]
+
+        # Same buffer bookkeeping as BaseDataset.load_image: Mosaic draws its other tiles from self.buffer
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = image, hw0, image.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+
+        return image, hw0, image.shape[:2]
+
+class MemmapDetectionTrainer(DetectionTrainer):
+
+    """ DetectionTrainer whose train and val datasets read from the memory-mapped image cache """
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+
+        model = getattr(self.model, 'module', self.model)
+        stride = max(int(model.stride.max() if model else 0), 32)
+
+        return MemmapYOLODataset(
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == 'train',
+            hyp=self.args,
+            rect=self.args.rect or mode == 'val',
+            cache=None,
+            single_cls=self.args.single_cls or False,
+            stride=stride,
+            pad=0.0 if mode == 'train' else 0.5,
+            prefix=f'{mode}: ',
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == 'train' else 1.0,
+        )
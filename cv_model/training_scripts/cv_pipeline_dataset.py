@@ -0,0 +1,25 @@
+import os
+
+from pathlib import Path
+
+# Kept free of ultralytics and torch so eval, quantize and sweep can resolve their defaults cheaply
+
+def dataset_path() -> Path:
+    return Path(os.getenv('PPE_DATASET_PATH', Path.home() / 'datasets' / 'ppe-project')).expanduser()
+
+def ensure_dataset(download_path: Path) -> Path:
+
+    """ Download the Roboflow PPE dataset on first use and return its data.yaml """
+
+    if not (download_path / 'data.yaml').exists():
+
+        from roboflow import Roboflow
+
+        download_path.mkdir(parents=True, exist_ok=True)
+
+        rf_client = Roboflow(api_key=os.getenv('ROBOFLOW_API_KEY'))
+        project = rf_client.workspace("twelvelabs").project("ppe-factory-bmdcj-rupp1")
+        version = project.version(1)
+        version.download("yolov11", location=str(download_path), overwrite=True)
+
+    return download_path / 'data.yaml'
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import yaml
+import argparse
+import cv2
+import numpy as np
+
+from pathlib import Path
+from dotenv import load_dotenv
+
+# PPE_CV_PIPELINE lives in the worker, which is not an installable package.
+WORKER_PATH = Path(__file__).resolve().parents[2] / 'rtsp-stream-worker'
+sys.path.insert(0, str(WORKER_PATH))
+
+from cv_pipeline import PPE_CV_PIPELINE, box_iou
+from cv_pipeline_dataset import dataset_path
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def validation_images(data_yaml: Path) -> list:
+
+    """ Resolve the validation split of a Roboflow/Ultralytics data.yaml into a list of image paths """
+
+    with open(data_yaml, 'r') as f:
+        data = yaml.safe_load(f)
+
+    root = Path(data.get('path', data_yaml.parent))
+    if not root.is_absolute():
+        root = (data_yaml.parent / root).resolve()
+
+    val_dir = Path(data['val'])
+    if not val_dir.is_absolute():
+        # Roboflow exports use paths relative to data.yaml, Ultralytics relative to `path`
+        candidates = [(root / val_dir).resolve(), (data_yaml.parent / val_dir).resolve(), (data_yaml.parent / 'valid' / 'images')]
+        val_dir = next((c for c in candidates if c.exists()), candidates[0])
+
+    return sorted(p for p in val_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+def load_labels(image_path: Path, width: int, height: int):
+
+    """ Load YOLO-format ground truth for an image as (boxes_xyxy, class_ids) in pixels """
+
+    label_path = Path(str(image_path.parent).replace('images', 'labels')) / f'{image_path.stem}.txt'
+    if not label_path.exists():
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.int64)
+
+    rows = [line.split() for line in label_path.read_text().splitlines() if line.strip()]
+    rows = [row for row in rows if len(row) == 5]
+    if not rows:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.int64)
+
+    values = np.array(rows, dtype=np.float32)
+    cx, cy, w, h = values[:, 1] * width, values[:, 2] * height, values[:, 3] * width, values[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return boxes, values[:, 0].astype(np.int64)
+
+def match_detections(detections, gt_boxes, gt_class_ids, iou_threshold: float = 0.5):
+
+    """ Greedy same-class matching at IoU >= threshold; returns (true_positives, detections, ground_truths) """
+
+    boxes, scores, class_ids = detections
+    matched = np.zeros(len(gt_boxes), dtype=bool)
+    true_positives = 0
+
+    for index in np.argsort(-scores):
+        candidates = np.where((gt_class_ids == class_ids[index]) & ~matched)[0]
+        if not len(candidates):
+            continue
+        overlaps = box_iou(boxes[index], gt_boxes[candidates])
+        best = int(np.argmax(overlaps))
+        if overlaps[best] >= iou_threshold:
+            matched[candidates[best]] = True
+            true_positives += 1
+
+    return true_positives, len(boxes), len(gt_boxes)
+
+def evaluate_mode(pipeline: PPE_CV_PIPELINE, images: list, mode: str, conf: float, warmup: int = 2) -> dict:
+
+    """ Run one inference mode over the images and return recall, precision and throughput """
+
+    for image_path in images[:warmup]:
+        pipeline.detect(cv2.imread(str(image_path)), conf=conf, inference_mode=mode)
+
+    pipeline.cascade_stats = {"frames": 0, "escalated": 0}
+
+    true_positives = total_detections = total_ground_truths = 0
+    latencies = []
+
+    for image_path in images:
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+
+        started_at = time.perf_counter()
+        detections = pipeline.detect(image, conf=conf, inference_mode=mode)
+        latencies.append(time.perf_counter() - started_at)
+
+        gt_boxes, gt_class_ids = load_labels(image_path, image.shape[1], image.shape[0])
+        tp, n_det, n_gt = match_detections(detections, gt_boxes, gt_class_ids)
+        true_positives += tp
+        total_detections += n_det
+        total_ground_truths += n_gt
+
+    total_seconds = sum(latencies)
+
+    report = {
+        'mode': mode,
+        'images': len(latencies),
+        'recall': true_positives / max(total_ground_truths, 1),
+        'precision': true_positives / max(total_detections, 1),
+        'images_per_second': len(latencies) / max(total_seconds, 1e-9),
+        'mean_latency_ms': 1000 * total_seconds / max(len(latencies), 1),
+        'p95_latency_ms': 1000 * float(np.percentile(latencies, 95)) if latencies else 0.0,
+    }
+
+    if mode == 'cascade':
+        report['escalation_rate'] = pipeline.cascade_stats['escalated'] / max(pipeline.cascade_stats['frames'], 1)
+
+    return report
+
+def main():
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Compare PPE_CV_PIPELINE inference modes against the full-frame baseline on the validation split.')
+    parser.add_argument('--data', default=str(dataset_path() / 'data.yaml'), help='Dataset data.yaml')
+    parser.add_argument('--model', default=None, help='Model weights (defaults to the worker config)')
+    parser.add_argument('--modes', nargs='+', default=['full', 'tiled'], choices=['full', 'tiled', 'cascade'], help='Inference modes to evaluate, the first is the baseline')
+    parser.add_argument('--prefilter-model', default=None, help='Cascade prefilter weights (defaults to the worker config)')
+    parser.add_argument('--conf', type=float, default=None, help='Confidence threshold (defaults to the worker config)')
+    parser.add_argument('--limit', type=int, default=0, help='Only use the first N validation images')
+    parser.add_argument('--output', default='cv_pipeline_eval.json', help='Where to write the JSON report')
+    args = parser.parse_args()
+
+    images = validation_images(Path(args.data))
+    if args.limit:
+        images = images[:args.limit]
+
+    if not images:
+        raise FileNotFoundError(f"No validation images found for {args.data}")
+
+    pipeline = PPE_CV_PIPELINE(model_path=args.model)
+    if args.prefilter_model:
+        pipeline.cascade['prefilter_model_path'] = os.path.abspath(args.prefilter_model)
+        pipeline._prefilter_model = None
+
+    conf = pipeline.conf if args.conf is None else args.conf
+
+    print(f"Evaluating {len(images)} validation images at imgsz={pipeline.imgsz} on device={pipeline.device}")
+
+    reports = [evaluate_mode(pipeline, images, mode, conf) for mode in args.modes]
+    baseline = reports[0]
+
+    for report in reports:
+        report['recall_vs_baseline'] = report['recall'] - baseline['recall']
+        report['speedup_vs_baseline'] = report['images_per_second'] / max(baseline['images_per_second'], 1e-9)
+        print(f"{report['mode']:>8}: recall={report['recall']:.4f} ({report['recall_vs_baseline']:+.4f}) "
+              f"precision={report['precision']:.4f} {report['images_per_second']:.2f} img/s "
+              f"(x{report['speedup_vs_baseline']:.2f}) p95={report['p95_latency_ms']:.1f}ms")
+
+    with open(args.output, 'w') as f:
+        json.dump({'data': args.data, 'model': pipeline.model_path, 'imgsz': pipeline.imgsz, 'conf': conf, 'results': reports}, f, indent=2)
+
+    print(f"Wrote report to {args.output}")
+
+if __name__ == '__main__':
+    main()
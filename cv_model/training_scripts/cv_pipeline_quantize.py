@@ -0,0 +1,171 @@
+import csv
+import json
+import time
+import queue
+import argparse
+import resource
+import multiprocessing
+
+from pathlib import Path
+from dotenv import load_dotenv
+
+from cv_pipeline_eval import validation_images
+from cv_pipeline_dataset import dataset_path
+
+REPO_PATH = Path(__file__).resolve().parents[2]
+FP32_WEIGHTS = REPO_PATH / 'rtsp-stream-worker' / 'cv_model_best.pt'
+FP32_RESULTS = REPO_PATH / 'cv_model' / 'ppe_training_runs' / 'yolo11m_finetune_imgsz1280_run12' / 'results.csv'
+
+def training_metrics(results_csv: Path) -> dict:
+
+    """ mAP50 / mAP50-95 of the best epoch (by mAP50-95) recorded during FP32 training """
+
+    with open(results_csv, 'r') as f:
+        rows = [{key.strip(): value for key, value in row.items()} for row in csv.DictReader(f)]
+
+    best = max(rows, key=lambda row: float(row['metrics/mAP50-95(B)']))
+    return {'epoch': int(best['epoch']), 'mAP50': float(best['metrics/mAP50(B)']), 'mAP50-95': float(best['metrics/mAP50-95(B)'])}
+
+def export_int8(weights: Path, data: str, imgsz: int, fraction: float, export_format: str, dynamic: bool) -> str:
+
+    """ Post-training INT8 quantization, calibrated on a sample of the validation split """
+
+    from ultralytics import YOLO
+
+    model = YOLO(str(weights))
+    # Ultralytics calibrates INT8 on the `val` split of `data`; `fraction` picks how much of it.
+    return model.export(format=export_format, int8=True, data=data, fraction=fraction, imgsz=imgsz, dynamic=dynamic, batch=1, device='cpu')
+
+def validate(model_path: str, data: str, imgsz: int) -> dict:
+
+    from ultralytics import YOLO
+
+    metrics = YOLO(model_path, task='detect').val(data=data, imgsz=imgsz, batch=1, device='cpu', split='val', plots=False, verbose=False)
+    return {'mAP50': float(metrics.box.map50), 'mAP50-95': float(metrics.box.map)}
+
+def _profile_worker(model_path: str, image_paths: list, imgsz: int, queue):
+
+    """ Runs in a fresh process so RSS reflects only this model """
+
+    from ultralytics import YOLO
+
+    def rss_bytes():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    baseline_rss = rss_bytes()
+    model = YOLO(model_path, task='detect')
+
+    for image_path in image_paths[:2]:
+        model.predict(image_path, imgsz=imgsz, device='cpu', verbose=False)
+
+    latencies = []
+    for image_path in image_paths:
+        started_at = time.perf_counter()
+        model.predict(image_path, imgsz=imgsz, device='cpu', verbose=False)
+        latencies.append(time.perf_counter() - started_at)
+
+    latencies.sort()
+    queue.put({
+        'mean_latency_ms': 1000 * sum(latencies) / len(latencies),
+        'p50_latency_ms': 1000 * latencies[len(latencies) // 2],
+        'p95_latency_ms': 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        'peak_rss_bytes': rss_bytes(),
+        'model_rss_bytes': rss_bytes() - baseline_rss,
+    })
+
+def profile(model_path: str, image_paths: list, imgsz: int, timeout_s: float = 1800) -> dict:
+
+    """ Latency and memory of a model, measured in a child process. Raises if the child crashes
+    (e.g. the backend fails to load or runs out of memory) or takes longer than timeout_s """
+
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process = context.Process(target=_profile_worker, args=(model_path, [str(p) for p in image_paths], imgsz, result_queue))
+    process.start()
+
+    deadline = time.monotonic() + timeout_s
+    result = None
+    try:
+        while result is None:
+            # Checked before reading, so a result put just before the child exits is not missed
+            exited = not process.is_alive()
+            try:
+                result = result_queue.get(timeout=1)
+            except queue.Empty:
+                if exited:
+                    raise RuntimeError(f"Profiling {model_path} failed: worker exited with code {process.exitcode}")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Profiling {model_path} took longer than {timeout_s:.0f}s")
+    finally:
+        if result is None:
+            process.terminate()
+        process.join()
+
+    return result
+
+def model_size_bytes(model_path: str) -> int:
+    path = Path(model_path)
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file()) if path.is_dir() else path.stat().st_size
+
+def main():
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='INT8 post-training quantization of the PPE detector, calibrated on the validation split.')
+    parser.add_argument('--weights', default=str(FP32_WEIGHTS))
+    parser.add_argument('--data', default=str(dataset_path() / 'data.yaml'))
+    parser.add_argument('--imgsz', type=int, default=1280)
+    parser.add_argument('--fraction', type=float, default=0.25, help='Fraction of the validation split used for calibration')
+    parser.add_argument('--format', default='openvino', choices=['openvino', 'onnx', 'engine', 'tflite'], help='INT8 export backend (openvino for CPU hosts)')
+    parser.add_argument('--static', action='store_true', help='Export a fixed imgsz input (ROI/tiled modes need dynamic shapes)')
+    parser.add_argument('--latency-images', type=int, default=50, help='Validation images timed per model')
+    parser.add_argument('--output', default='cv_pipeline_quantize.json')
+    args = parser.parse_args()
+
+    print(f"Quantizing {args.weights} to INT8 ({args.format}), calibrating on {args.fraction:.0%} of the validation split")
+    int8_model_path = str(export_int8(Path(args.weights), args.data, args.imgsz, args.fraction, args.format, not args.static))
+    print(f"Exported INT8 model to {int8_model_path}")
+
+    image_paths = validation_images(Path(args.data))[:args.latency_images]
+
+    report = {'data': args.data, 'imgsz': args.imgsz, 'calibration_fraction': args.fraction, 'training_fp32': training_metrics(FP32_RESULTS), 'models': {}}
+
+    for name, model_path in (('fp32', args.weights), ('int8', int8_model_path)):
+        print(f"Validating {name}: {model_path}")
+        report['models'][name] = {
+            'path': model_path,
+            'size_bytes': model_size_bytes(model_path),
+            **validate(model_path, args.data, args.imgsz),
+            **profile(model_path, image_paths, args.imgsz),
+        }
+
+    fp32, int8 = report['models']['fp32'], report['models']['int8']
+    report['int8_vs_fp32'] = {
+        'mAP50_delta': int8['mAP50'] - fp32['mAP50'],
+        'mAP50-95_delta': int8['mAP50-95'] - fp32['mAP50-95'],
+        'mAP50_delta_vs_training': int8['mAP50'] - report['training_fp32']['mAP50'],
+        'mAP50-95_delta_vs_training': int8['mAP50-95'] - report['training_fp32']['mAP50-95'],
+        'latency_speedup': fp32['mean_latency_ms'] / int8['mean_latency_ms'],
+        'peak_rss_reduction': 1 - int8['peak_rss_bytes'] / fp32['peak_rss_bytes'],
+        'size_reduction': 1 - int8['size_bytes'] / fp32['size_bytes'],
+    }
+
+    training = report['training_fp32']
+    print(f"\n{'':>18} {'mAP50':>8} {'mAP50-95':>9} {'mean ms':>9} {'p95 ms':>8} {'peak RSS MB':>12} {'size MB':>8}")
+    print(f"{'FP32 (results.csv)':>18} {training['mAP50']:>8.4f} {training['mAP50-95']:>9.4f}")
+    for name, model in report['models'].items():
+        print(f"{name.upper():>18} {model['mAP50']:>8.4f} {model['mAP50-95']:>9.4f} {model['mean_latency_ms']:>9.1f} "
+              f"{model['p95_latency_ms']:>8.1f} {model['peak_rss_bytes'] / 1e6:>12.0f} {model['size_bytes'] / 1e6:>8.1f}")
+
+    comparison = report['int8_vs_fp32']
+    print(f"\nINT8: {comparison['latency_speedup']:.2f}x faster, {comparison['peak_rss_reduction']:.0%} less peak RSS, "
+          f"mAP50-95 {comparison['mAP50-95_delta']:+.4f}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Wrote report to {args.output}")
+    print(f"To deploy, copy {int8_model_path} next to the worker and set model_path in rtsp-stream-worker/cv_pipeline.yaml")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import time
+import argparse
+import itertools
+import cv2
+import numpy as np
+
+from pathlib import Path
+from dotenv import load_dotenv
+
+from cv_pipeline_eval import validation_images
+from cv_pipeline_dataset import dataset_path
+from cv_pipeline_quantize import REPO_PATH, FP32_WEIGHTS, model_size_bytes
+
+WORKER_CONFIG = REPO_PATH / 'rtsp-stream-worker' / 'cv_pipeline.yaml'
+INT8_WEIGHTS = REPO_PATH / 'rtsp-stream-worker' / 'cv_model_best_int8_openvino_model'
+
+def backend_name(model_path: str) -> str:
+
+    """ Inference backend Ultralytics picks for a weights path """
+
+    path = Path(model_path)
+    if path.suffix == '.pt':
+        return 'torch'
+    if path.suffix == '.onnx':
+        return 'onnx'
+    if path.suffix == '.engine':
+        return 'tensorrt'
+    if path.name.endswith('_openvino_model'):
+        return 'openvino'
+    return path.suffix.lstrip('.') or path.name
+
+def validate(model, data: str, imgsz: int, conf: float, iou: float) -> dict:
+
+    """ mAP on the validation split at the deployment thresholds (not Ultralytics' conf=0.001 default) """
+
+    metrics = model.val(data=data, imgsz=imgsz, conf=conf, iou=iou, batch=1, device='cpu', split='val', plots=False, verbose=False)
+    return {'mAP50': float(metrics.box.map50), 'mAP50-95': float(metrics.box.map)}
+
+def time_inference(model, images: list, imgsz: int, conf: float, iou: float, batch: int, warmup: int = 2) -> dict:
+
+    """ Per-image latency and throughput of model.predict on pre-decoded images, `batch` images per call """
+
+    for image in images[:warmup]:
+        model.predict(image, imgsz=imgsz, conf=conf, iou=iou, device='cpu', verbose=False)
+
+    latencies = []
+    started_at = time.perf_counter()
+
+    for start in range(0, len(images), batch):
+        group = images[start:start + batch]
+        call_started_at = time.perf_counter()
+        model.predict(group, imgsz=imgsz, conf=conf, iou=iou, device='cpu', verbose=False)
+        # Every image in a batch waits for the whole call
+        latencies += [time.perf_counter() - call_started_at] * len(group)
+
+    total_seconds = time.perf_counter() - started_at
+    latencies_ms = 1000 * np.array(latencies)
+
+    return {
+        'images_per_second': len(images) / max(total_seconds, 1e-9),
+        'p50_latency_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_latency_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_latency_ms': float(np.percentile(latencies_ms, 99)),
+    }
+
+def pareto_frontier(results: list, accuracy_key: str = 'mAP50-95', latency_key: str = 'p95_latency_ms') -> list:
+
+    """ Configurations no other configuration beats on both accuracy and latency, fastest first """
+
+    frontier = []
+    for result in sorted(results, key=lambda r: (r[latency_key], -r[accuracy_key])):
+        if not frontier or result[accuracy_key] > frontier[-1][accuracy_key]:
+            frontier.append(result)
+    return frontier
+
+def pick_default(frontier: list, max_map_drop: float, accuracy_key: str = 'mAP50-95') -> dict:
+
+    """ Fastest frontier point whose accuracy is within max_map_drop of the most accurate one """
+
+    best = max(r[accuracy_key] for r in frontier)
+    return next(r for r in frontier if r[accuracy_key] >= best - max_map_drop)
+
+def write_worker_config(config_path: Path, values: dict):
+
+    """ Update top-level keys of cv_pipeline.yaml in place, keeping its comments and layout """
+
+    lines = config_path.read_text().splitlines(keepends=True)
+
+    for key, value in values.items():
+        pattern = re.compile(rf'^{re.escape(key)}:(\s*)(\S+)(.*)$', re.DOTALL)
+        for i, line in enumerate(lines):
+            match = pattern.match(line)
+            if match:
+                # Keep inline comments aligned with the original value column
+                spaced_value = f' {value}'.ljust(len(match.group(1)) + len(match.group(2))) if match.group(3).strip() else f' {value}'
+                lines[i] = f'{key}:{spaced_value}{match.group(3)}'
+                break
+        else:
+            raise KeyError(f"{key} not found in {config_path}")
+
+    config_path.write_text(''.join(lines))
+
+def main():
+
+    load_dotenv()
+
+    default_models = [str(FP32_WEIGHTS)] + ([str(INT8_WEIGHTS)] if INT8_WEIGHTS.exists() else [])
+
+    parser = argparse.ArgumentParser(description='Sweep conf, iou, imgsz, backend and batch size on CPU and report the accuracy/latency Pareto frontier.')
+    parser.add_argument('--data', default=str(dataset_path() / 'data.yaml'))
+    parser.add_argument('--models', nargs='+', default=default_models, help='Weights to compare; the backend follows the format (.pt, _openvino_model/, .onnx)')
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[960, 1280])
+    parser.add_argument('--conf', nargs='+', type=float, default=[0.25, 0.4])
+    parser.add_argument('--iou', nargs='+', type=float, default=[0.45, 0.6])
+    parser.add_argument('--batch', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--latency-images', type=int, default=50, help='Validation images timed per configuration')
+    parser.add_argument('--max-map-drop', type=float, default=0.01, help='mAP50-95 the chosen default may give up for speed')
+    parser.add_argument('--write-config', action='store_true', help=f'Write the chosen default into {WORKER_CONFIG.name}')
+    parser.add_argument('--output', default='cv_pipeline_sweep.json')
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    images = [cv2.imread(str(p)) for p in validation_images(Path(args.data))[:args.latency_images]]
+    images = [image for image in images if image is not None]
+    if not images:
+        raise FileNotFoundError(f"No validation images found for {args.data}")
+
+    results = []
+
+    for model_path in args.models:
+
+        model = YOLO(model_path, task='detect')
+        backend = backend_name(model_path)
+
+        for imgsz, conf, iou in itertools.product(args.imgsz, args.conf, args.iou):
+
+            # mAP does not depend on the batch size, so validate once per threshold/size combination
+            accuracy = validate(model, args.data, imgsz, conf, iou)
+
+            for batch in args.batch:
+                result = {
+                    'model_path': model_path,
+                    'backend': backend,
+                    'size_bytes': model_size_bytes(model_path),
+                    'imgsz': imgsz,
+                    'conf': conf,
+                    'iou': iou,
+                    'batch': batch,
+                    **accuracy,
+                    **time_inference(model, images, imgsz, conf, iou, batch),
+                }
+                results.append(result)
+                print(f"{backend:>8} imgsz={imgsz:<5} conf={conf:<5} iou={iou:<5} batch={batch:<3} "
+                      f"mAP50-95={result['mAP50-95']:.4f} p95={result['p95_latency_ms']:.1f}ms {result['images_per_second']:.2f} img/s")
+
+    frontier = pareto_frontier(results)
+    chosen = pick_default(frontier, args.max_map_drop)
+
+    print(f"\nPareto frontier (mAP50-95 vs p95 latency per image):")
+    for result in frontier:
+        marker = '*' if result is chosen else ' '
+        print(f"{marker} {result['backend']:>8} imgsz={result['imgsz']:<5} conf={result['conf']:<5} iou={result['iou']:<5} batch={result['batch']:<3} "
+              f"mAP50-95={result['mAP50-95']:.4f} p95={result['p95_latency_ms']:.1f}ms {result['images_per_second']:.2f} img/s")
+
+    with open(args.output, 'w') as f:
+        json.dump({'data': args.data, 'latency_images': len(images), 'max_map_drop': args.max_map_drop,
+                   'results': results, 'frontier': frontier, 'chosen': chosen}, f, indent=2)
+
+    print(f"Wrote report to {args.output}")
+
+    defaults = {
+        'model_path': os.path.relpath(chosen['model_path'], WORKER_CONFIG.parent),
+        'imgsz': chosen['imgsz'],
+        'conf': chosen['conf'],
+        'iou': chosen['iou'],
+        'batch': chosen['batch'],
+    }
+
+    if args.write_config:
+        write_worker_config(WORKER_CONFIG, defaults)
+        print(f"Updated {WORKER_CONFIG} with {defaults}")
+    else:
+        print(f"Run with --write-config to set {defaults} in {WORKER_CONFIG}")
+
+if __name__ == '__main__':
+    main()
@@ -1,66 +1,122 @@
 import os
-import torch
+import csv
+import time
+import yaml
+import argparse
 
 from pathlib import Path
 from dotenv import load_dotenv
 from ultralytics import YOLO
-from roboflow import Roboflow
 
-def main():
+from cv_pipeline_cache import MemmapDetectionTrainer
+from cv_pipeline_dataset import dataset_path, ensure_dataset
+
+TRAINING_CONFIG = Path(__file__).resolve().parent / 'cv_pipeline_train.yaml'
+
+def load_profile(name: str, config_path: Path = TRAINING_CONFIG) -> dict:
+
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+
+    if name not in config or name in ('augmentation', 'defaults'):
+        raise ValueError(f"Invalid training profile: {name}")
+
+    profile = dict(config[name])
+
+    # Weights and run directories are relative to the config file, model names like yolo11n.yaml are not
+    for key in ('model', 'project'):
+        value = os.path.expandvars(str(profile[key]))
+        if '$' in value:
+            raise ValueError(f"Set the environment variable in {key}: {profile[key]}")
+        resolved = (config_path.parent / value).resolve()
+        profile[key] = str(resolved) if resolved.exists() or key == 'project' else value
+
+    return profile
+
+def dataloader_workers(workers) -> int:
+    if workers == 'auto':
+        return max(1, min(8, (os.cpu_count() or 1) - 1))
+    return int(workers)
+
+def parse_overrides(overrides: list) -> dict:
+    """Parse KEY=VALUE pairs, with values read as YAML (numbers, booleans, lists)."""
+    return {key: yaml.safe_load(value) for key, value in (item.split('=', 1) for item in overrides)}
+
+def add_throughput_callbacks(model: YOLO):
+
+    """ Print and record epoch time and training images/s to <run>/throughput.csv """
+
+    timings = {}
+
+    def on_train_epoch_start(trainer):
+        timings['started_at'] = time.perf_counter()
+
+    def on_train_epoch_end(trainer):
+
+        epoch_seconds = time.perf_counter() - timings['started_at']
+        images = len(trainer.train_loader.dataset)
+        images_per_second = images / max(epoch_seconds, 1e-9)
+
+        print(f"[TRAIN] Epoch {trainer.epoch + 1}: {epoch_seconds:.1f}s, {images_per_second:.1f} images/s")
+
+        throughput_path = Path(trainer.save_dir) / 'throughput.csv'
+        write_header = not throughput_path.exists()
+        with open(throughput_path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(['epoch', 'epoch_seconds', 'images', 'images_per_second'])
+            writer.writerow([trainer.epoch + 1, round(epoch_seconds, 3), images, round(images_per_second, 2)])
+
+    model.add_callback('on_train_epoch_start', on_train_epoch_start)
+    model.add_callback('on_train_epoch_end', on_train_epoch_end)
+
+def last_checkpoint(project: str, name: str):
+
+    """ Most recent last.pt of a run, including the name2/name3 directories Ultralytics creates on reruns """
+
+    checkpoints = list(Path(project).glob(f'{name}*/weights/last.pt'))
+    return max(checkpoints, key=lambda p: p.stat().st_mtime) if checkpoints else None
+
+def train(profile_name: str, resume: bool = False, overrides: dict = None):
+
+    profile = {**load_profile(profile_name), **(overrides or {})}
+
+    model_path = profile.pop('model')
+    cache = profile.pop('cache', 'memmap')
+    profile['workers'] = dataloader_workers(profile.get('workers', 'auto'))
+    if 'data' not in profile:
+        profile['data'] = str(ensure_dataset(dataset_path()))
+
+    # The memmap cache replaces Ultralytics' own image caching
+    trainer = MemmapDetectionTrainer if cache == 'memmap' else None
+    if cache != 'memmap':
+        profile['cache'] = cache
+
+    if resume:
+        checkpoint = last_checkpoint(profile['project'], profile['name'])
+        if checkpoint is None:
+            raise FileNotFoundError(f"No checkpoint to resume in {profile['project']}/{profile['name']}*")
+        print(f"[TRAIN] Resuming from {checkpoint}")
+        model = YOLO(str(checkpoint))
+        add_throughput_callbacks(model)
+        return model.train(resume=True, trainer=trainer)
+
+    print(f"[TRAIN] Profile {profile_name}: {model_path} at imgsz={profile['imgsz']} on device={profile['device']} with {profile['workers']} workers, cache={cache}")
+    model = YOLO(model_path)
+    add_throughput_callbacks(model)
+    return model.train(trainer=trainer, **profile)
+
+def main(default_profile: str = 'train'):
 
     load_dotenv()
 
-    # Check if GPU is available
-    is_available = torch.cuda.is_available()
-    print(is_available)
-
-    # Verify and Download Roboflow training dataset.
-    DOWNLOAD_PATH = "C:/datasets/ppe-project"
-    if not os.path.exists(DOWNLOAD_PATH):
-
-        os.makedirs(DOWNLOAD_PATH)
-
-        rf_client = Roboflow(api_key=os.getenv('ROBOFLOW_API_KEY'))
-        project = rf_client.workspace("twelvelabs").project("ppe-factory-bmdcj-rupp1")
-        version = project.version(1)
-        dataset = version.download("yolov11", location=DOWNLOAD_PATH)
-
-    # Load pre-trained RT-DETR model.
-    model = YOLO("../../models/yolo11s.pt")
-
-    # Train pre-trained model on PPE dataset.
-    dataset_path = Path(DOWNLOAD_PATH)  / 'data.yaml'
-    results = model.train(
-
-        data=dataset_path,
-
-        epochs=80,
-        patience=20,
-        batch=-1,
-        imgsz=640,
-        device=0,
-
-        # --- AUGMENTATIONS FOR CCTV SIMULATION ---
-
-        # 1. To simulate camera angle and distance
-        perspective=0.001,  # CRITICAL: Simulates viewing from an angle. Start small.
-        degrees=20.0,       # Increased rotation for more varied angles.
-        scale=0.5,          # Increased scaling range to make objects much smaller or larger.
-        translate=0.1,      # Re-enable to shift subjects off-center.
-        shear=1.0,          # Re-enable to slant the image, adding to the angled effect.
-
-        # 2. To simulate poor lighting and color
-        hsv_h=0.015,        # Re-enable Hue for color shifts.
-        hsv_s=0.7,          # Re-enable Saturation for washed-out or vibrant colors.
-        hsv_v=0.4,          # Re-enable Value for brightness/darkness variations.
-        fliplr=0.5,         # Keep horizontal flipping.
-
-        # 3. To improve robustness to clutter and small objects
-        mosaic=1.0,         # CRITICAL: Combines images to teach the model about scale and partial objects.
-        close_mosaic=10,  # Keep for initial epochs to stabilize training.
-        mixup=0.05,          # Re-enable to blend images, improving robustness. Start with a small value.
-        copy_paste=0.05      # Copies objects from one image to another. Good for increasing object density.
-    )
+    parser = argparse.ArgumentParser(description=f'Train the PPE detector from a profile in {TRAINING_CONFIG.name}.')
+    parser.add_argument('--profile', default=default_profile, help='train, finetune or smoke')
+    parser.add_argument('--resume', action='store_true', help="Continue the profile's most recent run from weights/last.pt")
+    parser.add_argument('overrides', nargs='*', metavar='KEY=VALUE', help='Override profile values, e.g. epochs=5 device=cpu')
+    args = parser.parse_args()
+
+    train(args.profile, resume=args.resume, overrides=parse_overrides(args.overrides))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('ultralytics')
+
+from ultralytics.cfg import get_cfg
+
+from cv_pipeline_cache import MemmapYOLODataset, build_image_cache
+
+@pytest.fixture
+def two_image_dataset(tmp_path):
+
+    images_dir, labels_dir = tmp_path / 'images', tmp_path / 'labels'
+    images_dir.mkdir()
+    labels_dir.mkdir()
+
+    for i in range(2):
+        cv2.imwrite(str(images_dir / f'{i}.jpg'), np.full((48, 64, 3), 40 * (i + 1), dtype=np.uint8))
+        (labels_dir / f'{i}.txt').write_text('0 0.5 0.5 0.25 0.25\n')
+
+    return images_dir
+
+def make_dataset(images_dir, augment=True):
+    return MemmapYOLODataset(
+        img_path=str(images_dir), imgsz=64, batch_size=2, augment=augment,
+        hyp=get_cfg(overrides={'mosaic': 1.0}), rect=False, cache=None, stride=32, pad=0.0,
+        data={'names': {0: 'person'}, 'channels': 3},
+    )
+
+def test_mosaic_sample_draws_from_the_buffer(two_image_dataset):
+
+    dataset = make_dataset(two_image_dataset)
+    sample = dataset[0]
+
+    assert tuple(sample['img'].shape) == (3, 64, 64)
+    assert dataset.buffer
+
+def test_buffer_is_bounded_and_evicted_images_are_released(two_image_dataset):
+
+    dataset = make_dataset(two_image_dataset)
+    dataset.max_buffer_length = 2
+
+    for i in (0, 1, 0, 1):
+        dataset.ims[i] = None
+        dataset.load_image(i)
+
+    assert len(dataset.buffer) < dataset.max_buffer_length
+    assert sum(image is not None for image in dataset.ims) == len(dataset.buffer)
+
+def test_without_augmentation_nothing_is_buffered(two_image_dataset):
+
+    dataset = make_dataset(two_image_dataset, augment=False)
+    image, hw0, hw = dataset.load_image(1)
+
+    assert hw0 == (48, 64) and hw == image.shape[:2]
+    assert dataset.buffer == [] and dataset.ims == [None, None]
+
+def test_image_cache_matches_a_fresh_decode(two_image_dataset, tmp_path):
+
+    im_files = sorted(str(path) for path in two_image_dataset.glob('*.jpg'))
+    cache = build_image_cache(im_files, 32, tmp_path / 'cache')
+
+    image, (height0, width0) = cache[1]
+    expected = cv2.resize(cv2.imread(im_files[1]), (32, 24), interpolation=cv2.INTER_LINEAR)
+
+    assert (height0, width0) == (48, 64)
+    assert np.array_equal(image, expected)
+    # A second build with unchanged files reuses the cache
+    assert build_image_cache(im_files, 32, tmp_path / 'cache').index.tolist() == cache.index.tolist()
@@ -0,0 +1,11 @@
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('dotenv')
+pytest.importorskip('ultralytics')
+
+from cv_pipeline_quantize import profile
+
+def test_profile_raises_when_the_worker_dies_without_a_result(tmp_path):
+    with pytest.raises(RuntimeError, match='worker exited with code 1'):
+        profile(str(tmp_path / 'missing_int8_openvino_model'), [tmp_path / 'image.jpg'], imgsz=64, timeout_s=120)
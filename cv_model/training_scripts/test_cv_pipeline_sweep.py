@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('dotenv')
+pytest.importorskip('ultralytics')
+
+from cv_pipeline_sweep import pareto_frontier, pick_default
+
+def result(name, accuracy, latency):
+    return {'name': name, 'mAP50-95': accuracy, 'p95_latency_ms': latency}
+
+def test_pareto_frontier_drops_dominated_configurations():
+
+    results = [
+        result('slow-accurate', 0.60, 90.0),
+        result('dominated', 0.50, 80.0),
+        result('balanced', 0.55, 40.0),
+        result('fast', 0.40, 20.0),
+        result('fast-but-worse', 0.35, 20.0),
+        result('same-accuracy-slower', 0.55, 60.0),
+    ]
+
+    assert [r['name'] for r in pareto_frontier(results)] == ['fast', 'balanced', 'slow-accurate']
+
+def test_pareto_frontier_with_custom_keys():
+
+    results = [{'acc': 0.5, 'ms': 10.0}, {'acc': 0.4, 'ms': 30.0}]
+
+    assert pareto_frontier(results, accuracy_key='acc', latency_key='ms') == [{'acc': 0.5, 'ms': 10.0}]
+
+def test_pick_default_takes_the_fastest_point_within_the_map_drop():
+
+    frontier = pareto_frontier([result('fast', 0.40, 20.0), result('balanced', 0.58, 40.0), result('accurate', 0.60, 90.0)])
+
+    assert pick_default(frontier, max_map_drop=0.03)['name'] == 'balanced'
+    assert pick_default(frontier, max_map_drop=0.0)['name'] == 'accurate'
+    assert pick_default(frontier, max_map_drop=0.5)['name'] == 'fast'
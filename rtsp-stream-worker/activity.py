@@ -0,0 +1,180 @@
+import os
+import csv
+import asyncio
+
+# numpy is imported inside the functions that use it; main.py imports this module at startup
+
+ACTIVITY_POLICIES = ('off', 'drop', 'merge')
+ACTIVITY_SIGNALS = ('motion', 'person')
+# Score at which a window counts as active: frame-difference energy, or people in view
+ACTIVITY_THRESHOLDS = {'motion': 0.01, 'person': 1.0}
+
+# Frames are sampled this small for the motion signal; enough to see people moving, cheap to decode
+MOTION_FRAME_SIZE = (160, 90)
+PERSON_FRAME_SIZE = (640, 360)
+
+async def _iter_frames(video_file_path: str, sample_fps: float, size: tuple, pixel_format: str):
+
+    """ Decode frames at sample_fps, scaled to size, one uint8 array at a time """
+
+    import numpy as np
+
+    width, height = size
+    channels = 1 if pixel_format == 'gray' else 3
+    frame_bytes = width * height * channels
+    shape = (height, width) if channels == 1 else (height, width, 3)
+
+    process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-i', video_file_path,
+        '-an', '-vf', f'fps={sample_fps},scale={width}:{height}',
+        '-pix_fmt', pixel_format, '-f', 'rawvideo', '-',
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+
+    try:
+        while True:
+            try:
+                data = await process.stdout.readexactly(frame_bytes)
+            except asyncio.IncompleteReadError:
+                break
+            yield np.frombuffer(data, dtype=np.uint8).reshape(shape)
+    finally:
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+
+async def _enumerate(iterator):
+    index = 0
+    async for item in iterator:
+        yield index, item
+        index += 1
+
+async def activity_timeline(video_file_path: str, signal: str = 'motion', sample_fps: float = 1.0, pipeline=None, person_imgsz: int = 640) -> list:
+
+    """ (seconds, score) samples over the whole video from a single low-fps decode pass.
+
+    motion: mean absolute difference to the previous sample, in [0, 1] (frame-difference energy).
+    person: number of people the detector finds in the sample at person_imgsz. """
+
+    if signal not in ACTIVITY_SIGNALS:
+        raise ValueError(f"Invalid activity signal: {signal}")
+    if signal == 'person' and not pipeline.person_class_ids:
+        raise ValueError(f"Person activity needs a person class, model has: {list(pipeline.model.names.values())}")
+
+    import numpy as np
+
+    timeline = []
+    loop = asyncio.get_event_loop()
+
+    if signal == 'motion':
+        previous = None
+        async for index, frame in _enumerate(_iter_frames(video_file_path, sample_fps, MOTION_FRAME_SIZE, 'gray')):
+            if previous is not None:
+                timeline.append((index / sample_fps, float(np.abs(frame.astype(np.int16) - previous).mean() / 255)))
+            previous = frame.astype(np.int16)
+        return timeline
+
+    def count_people(frame):
+        return float(pipeline.count_people(np.ascontiguousarray(frame), imgsz=person_imgsz))
+
+    async for index, frame in _enumerate(_iter_frames(video_file_path, sample_fps, PERSON_FRAME_SIZE, 'bgr24')):
+        timeline.append((index / sample_fps, await loop.run_in_executor(None, count_people, frame)))
+    return timeline
+
+def score_segments(segments: list, timeline: list, threshold: float):
+
+    """ Give each segment the peak activity sampled inside it and flag it active at or above threshold """
+
+    import numpy as np
+
+    times = np.array([t for t, _ in timeline], dtype=np.float64)
+    scores = np.array([score for _, score in timeline], dtype=np.float64)
+
+    for segment in segments:
+        inside = (times >= segment['start']) & (times < segment['end'])
+        segment['score'] = float(scores[inside].max()) if inside.any() else 0.0
+        segment['active'] = segment['score'] >= threshold
+
+    return segments
+
+def read_segment_list(segment_list_path: str) -> list:
+
+    """ Segments written by ffmpeg's segment muxer (-segment_list_type csv), in order """
+
+    segments = []
+    segment_dir = os.path.dirname(segment_list_path)
+    with open(segment_list_path, 'r', newline='') as f:
+        for file_name, start, end in csv.reader(f):
+            segment_path = os.path.join(segment_dir, file_name)
+            segments.append({
+                'path': segment_path,
+                'start': float(start),
+                'end': float(end),
+                'duration': float(end) - float(start),
+                'bytes': os.path.getsize(segment_path),
+            })
+    return segments
+
+def plan_uploads(segments: list, policy: str, max_chunk_seconds: float, min_idle_run_seconds: float = 60) -> tuple:
+
+    """ Group scored segments (each with an `active` flag) into upload chunks.
+
+    drop:  every idle segment is skipped.
+    merge: idle runs shorter than min_idle_run_seconds are kept and merged with the active
+           footage around them; only longer idle runs (and idle footage at either end) are skipped.
+
+    Returns (chunks, skipped) where chunks is a list of segment lists, each at most
+    max_chunk_seconds long unless a single segment is longer. """
+
+    if policy not in ACTIVITY_POLICIES:
+        raise ValueError(f"Invalid idle segment policy: {policy}")
+
+    keep = [segment['active'] for segment in segments]
+
+    if policy == 'off':
+        keep = [True] * len(segments)
+
+    elif policy == 'merge':
+        i = 0
+        while i < len(segments):
+            if keep[i]:
+                i += 1
+                continue
+            run_end = i
+            while run_end < len(segments) and not keep[run_end]:
+                run_end += 1
+            run_seconds = sum(segment['duration'] for segment in segments[i:run_end])
+            # Only gaps with active footage on both sides are bridged
+            if 0 < i and run_end < len(segments) and run_seconds < min_idle_run_seconds:
+                for j in range(i, run_end):
+                    keep[j] = True
+            i = run_end
+
+    chunks, current, current_seconds = [], [], 0.0
+    skipped = {'segments': 0, 'seconds': 0.0, 'bytes': 0}
+
+    for segment, kept in zip(segments, keep):
+
+        if not kept:
+            skipped['segments'] += 1
+            skipped['seconds'] += segment['duration']
+            skipped['bytes'] += segment['bytes']
+            # A skipped stretch always ends the chunk, so chunks never splice across a gap
+            if current:
+                chunks.append(current)
+            current, current_seconds = [], 0.0
+            continue
+
+        if current and current_seconds + segment['duration'] > max_chunk_seconds:
+            chunks.append(current)
+            current, current_seconds = [], 0.0
+
+        current.append(segment)
+        current_seconds += segment['duration']
+
+    if current:
+        chunks.append(current)
+
+    return chunks, skipped
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import aiohttp
+
+from aiohttp import web
+from urllib.parse import urljoin
+
+from common import use_worker_modules, write_report
+from stand_ins import generate_test_video
+
+use_worker_modules()
+
+import main as worker
+
+async def resolve_media_playlist(session: aiohttp.ClientSession, playlist_url: str) -> str:
+    """Follow a multivariant playlist to its first media playlist."""
+
+    async with session.get(playlist_url) as response:
+        response.raise_for_status()
+        playlist = await response.text()
+
+    lines = playlist.splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith('#EXT-X-STREAM-INF') and i + 1 < len(lines):
+            return urljoin(playlist_url, lines[i + 1].strip())
+    return playlist_url
+
+async def watch(session: aiohttp.ClientSession, playlist_url: str, seconds: float) -> dict:
+
+    """ Play an HLS stream like a live client: poll the media playlist and fetch every new init/segment """
+
+    media_url = await resolve_media_playlist(session, playlist_url)
+    fetched = set()
+    total_bytes = playlist_bytes = segments = 0
+    started_at = time.perf_counter()
+
+    while time.perf_counter() - started_at < seconds:
+
+        async with session.get(media_url) as response:
+            if response.status != 200:
+                await asyncio.sleep(0.5)
+                continue
+            playlist = await response.text()
+        playlist_bytes += len(playlist.encode())
+
+        uris = re.findall(r'#EXT-X-MAP:URI="([^"]+)"', playlist)
+        uris += [line.strip() for line in playlist.splitlines() if line.strip() and not line.startswith('#')]
+
+        for uri in uris:
+            segment_url = urljoin(media_url, uri)
+            if segment_url in fetched:
+                continue
+            fetched.add(segment_url)
+            async with session.get(segment_url) as response:
+                if response.status == 200:
+                    total_bytes += len(await response.read())
+                    segments += 1
+
+        target_duration = re.search(r'#EXT-X-TARGETDURATION:(\d+)', playlist)
+        await asyncio.sleep(int(target_duration.group(1)) / 2 if target_duration else 1)
+
+    elapsed = time.perf_counter() - started_at
+    total_bytes += playlist_bytes
+
+    return {'bytes': total_bytes, 'playlist_bytes': playlist_bytes, 'segments': segments, 'seconds': elapsed, 'bytes_per_second': total_bytes / elapsed}
+
+async def measure(variant_urls: dict, viewers: int, seconds: float) -> dict:
+
+    results = {}
+    async with aiohttp.ClientSession() as session:
+        for name, url in variant_urls.items():
+            sessions = await asyncio.gather(*[watch(session, url, seconds) for _ in range(viewers)])
+            per_viewer = sum(s['bytes_per_second'] for s in sessions) / len(sessions)
+            results[name] = {
+                'url': url,
+                'viewers': viewers,
+                'egress_bytes_per_second_per_viewer': per_viewer,
+                'egress_kbit_per_second_per_viewer': per_viewer * 8 / 1000,
+                'total_bytes': sum(s['bytes'] for s in sessions),
+                'segments_per_viewer': sum(s['segments'] for s in sessions) / len(sessions),
+            }
+            print(f"[BENCH] {name}: {results[name]['egress_kbit_per_second_per_viewer']:.0f} kbit/s per viewer")
+
+    top = next(iter(results.values()))['egress_bytes_per_second_per_viewer']
+    for result in results.values():
+        result['relative_to_top_rung'] = result['egress_bytes_per_second_per_viewer'] / max(top, 1e-9)
+    return results
+
+async def run_local_ladder(args) -> dict:
+
+    """ Encode the configured ladder to HLS with the worker's encoder settings and serve it locally """
+
+    work_dir = tempfile.mkdtemp(prefix='hls_bench_')
+    video_file_path = args.video or generate_test_video(os.path.join(work_dir, 'testsrc.mp4'), 30)
+
+    outputs = []
+    for rendition in worker.hls_renditions:
+        os.makedirs(os.path.join(work_dir, rendition['name']))
+        outputs.append(['-f', 'hls', '-hls_time', '2', '-hls_list_size', '7', '-hls_flags', 'delete_segments+independent_segments',
+                        os.path.join(work_dir, rendition['name'], 'index.m3u8')])
+
+    ffmpeg_process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-re', '-stream_loop', '-1', '-i', video_file_path,
+        *worker.build_ladder_ffmpeg_args(worker.hls_renditions, outputs),
+    )
+
+    app = web.Application()
+    app.router.add_static('/', work_dir)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    try:
+        # Wait until every rung has a playlist with a few segments
+        for rendition in worker.hls_renditions:
+            playlist_path = os.path.join(work_dir, rendition['name'], 'index.m3u8')
+            while not os.path.exists(playlist_path) or open(playlist_path).read().count('#EXTINF') < 2:
+                if ffmpeg_process.returncode is not None:
+                    raise RuntimeError(f"FFmpeg exited with code {ffmpeg_process.returncode}")
+                await asyncio.sleep(0.5)
+
+        variant_urls = {rendition['name']: f"{base_url}/{rendition['name']}/index.m3u8" for rendition in worker.hls_renditions}
+        return await measure(variant_urls, args.viewers, args.seconds)
+
+    finally:
+        ffmpeg_process.terminate()
+        await ffmpeg_process.wait()
+        await runner.cleanup()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Measure HLS egress bytes per viewer for each rendition of the ladder.')
+    parser.add_argument('--url', action='append', default=[], metavar='NAME=URL', help='Measure a running stream instead, e.g. 360p=https://.../Steel-Machine-1_360p/index.m3u8')
+    parser.add_argument('--video', default=None, help='Source video for the local ladder (default: 30s testsrc)')
+    parser.add_argument('--viewers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.url:
+        variant_urls = dict(item.split('=', 1) for item in args.url)
+        results = asyncio.run(measure(variant_urls, args.viewers, args.seconds))
+    else:
+        results = asyncio.run(run_local_ladder(args))
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    config['renditions'] = worker.hls_renditions
+    write_report('hls_egress', config, results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+
+from common import use_worker_modules, percentiles, write_report
+
+use_worker_modules()
+
+from log_pipeline import LogPipeline
+
+# Stand-in for an ffmpeg/MediaMTX process: a mix of distinct lines and bursts of one repeated warning
+PRODUCER = r'''
+import sys, time
+rate, duration, repeat_fraction = float(sys.argv[1]), float(sys.argv[2]), float(sys.argv[3])
+started_at, sent = time.monotonic(), 0
+while time.monotonic() - started_at < duration:
+    if (sent % 100) < repeat_fraction * 100:
+        sys.stderr.write("[rtsp @ 0x55d0] Non-monotonic DTS; previous: 1234, current: 1200; changing to 1235\n")
+    else:
+        sys.stderr.write(f"frame={sent} fps=30 q=23.0 size={sent * 12}kB time=00:00:{sent % 60:02d}.00 bitrate=1000.0kbits/s speed=1x\n")
+    sent += 1
+    if sent % 10 == 0:
+        sys.stderr.flush()
+        time.sleep(max(0.0, started_at + sent / rate - time.monotonic()))
+sys.stderr.flush()
+'''
+
+SLOW_SINK = r'''
+import sys, time
+bytes_per_second = float(sys.argv[1])
+while True:
+    data = sys.stdin.buffer.read1(65536)
+    if not data:
+        break
+    time.sleep(len(data) / bytes_per_second)
+'''
+
+async def print_lines(stream, prefix):
+    """The previous reader: one synchronous print per line."""
+    while True:
+        line = await stream.readline()
+        if line:
+            print(f"[{prefix}] {line.decode().strip()}")
+        else:
+            break
+
+async def measure_loop_lag(stop: asyncio.Event, interval_s: float, samples: list):
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval_s)
+        samples.append(time.perf_counter() - started_at - interval_s)
+
+async def run_mode(mode: str, args) -> dict:
+
+    pipeline = LogPipeline(
+        queue_size=args.queue_size, rate_lines_per_second=args.rate_limit,
+        burst_lines=args.burst, ring_lines=args.ring_lines,
+    ) if mode == 'pipeline' else None
+
+    processes = [
+        await asyncio.create_subprocess_exec(
+            sys.executable, '-c', PRODUCER, str(args.lines_per_second), str(args.duration), str(args.repeat_fraction),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        for _ in range(args.sources)
+    ]
+
+    lag_samples, stop = [], asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, args.tick_ms / 1000, lag_samples))
+
+    cpu_started_at, started_at = time.process_time(), time.perf_counter()
+    if pipeline is None:
+        readers = [print_lines(process.stderr, f'FFMPEG_{i}') for i, process in enumerate(processes)]
+    else:
+        readers = [pipeline.pump(process.stderr, f'ffmpeg/bench-{i}', 'stderr') for i, process in enumerate(processes)]
+    await asyncio.gather(*readers, *[process.wait() for process in processes])
+    drained_seconds = time.perf_counter() - started_at
+
+    stop.set()
+    await lag_task
+    if pipeline is not None:
+        pipeline.close(timeout=60)
+
+    results = {
+        'drain_s': drained_seconds,
+        'cpu_s': time.process_time() - cpu_started_at,
+        'loop_lag_s': percentiles(lag_samples),
+    }
+    if pipeline is not None:
+        results['pipeline'] = dict(pipeline.stats)
+    return results
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Event loop lag and CPU of reading subprocess output with synchronous prints versus the log pipeline.')
+    parser.add_argument('--sources', type=int, default=14, help='Concurrent producer processes (one per looping encoder)')
+    parser.add_argument('--lines-per-second', type=float, default=200, help='Lines each producer writes per second')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--repeat-fraction', type=float, default=0.3, help='Share of lines that repeat the previous warning')
+    parser.add_argument('--sink', choices=['devnull', 'slow-pipe'], default='slow-pipe', help='Where stdout goes; slow-pipe stands in for a backed-up log driver')
+    parser.add_argument('--sink-bytes-per-second', type=float, default=512 * 1024)
+    parser.add_argument('--tick-ms', type=float, default=5)
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--rate-limit', type=float, default=50)
+    parser.add_argument('--burst', type=int, default=200)
+    parser.add_argument('--ring-lines', type=int, default=500)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    original_stdout = sys.stdout
+    results = {}
+
+    for mode in ('print', 'pipeline'):
+
+        # Unbuffered like the container (PYTHONUNBUFFERED=1): every line is its own write
+        sink_process = None
+        if args.sink == 'devnull':
+            sys.stdout = open(os.devnull, 'w', buffering=1)
+        else:
+            sink_process = subprocess.Popen([sys.executable, '-c', SLOW_SINK, str(args.sink_bytes_per_second)], stdin=subprocess.PIPE)
+            sys.stdout = open(sink_process.stdin.fileno(), 'w', buffering=1, closefd=False)
+
+        try:
+            results[mode] = asyncio.run(run_mode(mode, args))
+        finally:
+            sys.stdout.close()
+            sys.stdout = original_stdout
+            if sink_process is not None:
+                sink_process.stdin.close()
+                sink_process.wait()
+
+        stats = results[mode]
+        print(f"[BENCH] {mode:>8}: drained in {stats['drain_s']:.2f}s, cpu {stats['cpu_s']:.2f}s, "
+              f"loop lag p99 {stats['loop_lag_s']['p99'] * 1000:.1f}ms max {stats['loop_lag_s']['max'] * 1000:.1f}ms")
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    write_report('log_pipeline', config, results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import os
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import itertools
+import tempfile
+import aiohttp
+
+from common import use_worker_modules, percentiles, write_report
+from stand_ins import StandInS3, generate_test_video
+
+use_worker_modules()
+
+import fastapi
+import uvicorn
+
+import main as worker
+from media_cache import MediaCache
+
+VIDEO_NAME = 'Bench-Camera-1'
+S3_VIDEO_KEY = 'bench-camera-1.mp4'
+
+class StandInS3Client:
+
+    """ The two boto3 calls /clip and /thumbnail make, against StandInS3, with a HEAD round trip of head_latency_s """
+
+    def __init__(self, s3: StandInS3, head_latency_s: float):
+        self.s3 = s3
+        self.head_latency_s = head_latency_s
+        self.head_calls = 0
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        # Called from the executor thread, like the real client
+        self.head_calls += 1
+        time.sleep(self.head_latency_s)
+        return {'ETag': '"bench"', 'ContentLength': os.path.getsize(os.path.join(self.s3.root_dir, Key))}
+
+    def generate_presigned_url(self, operation: str, Params: dict, ExpiresIn: int) -> str:
+        return self.s3.url_for(Params['Key'])
+
+async def fetch(session: aiohttp.ClientSession, url: str, samples: dict):
+
+    started_at = time.perf_counter()
+    async with session.get(url) as response:
+        body = await response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{url} returned {response.status}: {body[:200]}")
+        outcome = response.headers.get('X-Cache', 'unknown')
+    samples.setdefault(outcome, []).append(time.perf_counter() - started_at)
+
+async def load(session: aiohttp.ClientSession, urls: list, concurrency: int) -> dict:
+
+    """ Fetch every URL with at most `concurrency` requests in flight, grouping latencies by X-Cache outcome """
+
+    samples = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(url):
+        async with semaphore:
+            await fetch(session, url, samples)
+
+    await asyncio.gather(*[bounded(url) for url in urls])
+    return samples
+
+def request_urls(base_url: str, kind: str, source: str, timestamps: list, clip_seconds: float) -> list:
+    source_query = f"video_name={VIDEO_NAME}" if source == 'preset' else f"s3_video_key={S3_VIDEO_KEY}"
+    if kind == 'clip':
+        return [f"{base_url}/clip?{source_query}&start={t:.3f}&duration={clip_seconds}" for t in timestamps]
+    return [f"{base_url}/thumbnail?{source_query}&t={t:.3f}&width=320" for t in timestamps]
+
+async def run(args) -> dict:
+
+    work_dir = tempfile.mkdtemp(prefix='media_cache_bench_')
+    video_file_path = args.video or generate_test_video(os.path.join(work_dir, 'source.mp4'), args.duration)
+
+    worker.preset_video_paths[VIDEO_NAME] = video_file_path
+
+    # The same video behind a stand-in S3, to include the object version lookup in the request path
+    s3_dir = os.path.join(work_dir, 's3')
+    os.makedirs(s3_dir)
+    shutil.copyfile(video_file_path, os.path.join(s3_dir, S3_VIDEO_KEY))
+    s3 = await StandInS3(s3_dir).start()
+    s3_client = StandInS3Client(s3, args.s3_head_latency_ms / 1000)
+    worker.get_s3_client = lambda: s3_client
+
+    worker.media_cache = MediaCache(os.path.join(work_dir, 'cache'), args.cache_budget_mb * 1024 * 1024)
+
+    app = fastapi.FastAPI()
+    app.get("/clip")(worker.get_clip)
+    app.get("/thumbnail")(worker.get_thumbnail)
+
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=args.port, log_level='warning'))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            for source, kind in itertools.product(('preset', 's3'), ('thumbnail', 'clip')):
+                name = f"{source}_{kind}"
+                head_calls_before = s3_client.head_calls
+
+                # Distinct timestamps: every request is a miss, then every repeat is a hit
+                timestamps = [round(random.uniform(0, max(args.duration - args.clip_seconds, 0)), 3) for _ in range(args.requests)]
+                urls = request_urls(base_url, kind, source, timestamps, args.clip_seconds)
+                samples = await load(session, urls, args.concurrency)
+                for outcome, latencies in (await load(session, urls * args.repeats, args.concurrency)).items():
+                    samples.setdefault(outcome, []).extend(latencies)
+
+                # Identical concurrent requests for a new timestamp share one ffmpeg run
+                producer_runs_before = worker.media_cache.stats['misses']
+                burst_url = request_urls(base_url, kind, source, [args.duration / 2 + 0.123], args.clip_seconds)[0]
+                for outcome, latencies in (await load(session, [burst_url] * args.concurrency, args.concurrency)).items():
+                    samples.setdefault(outcome, []).extend(latencies)
+
+                results[name] = {outcome: percentiles(latencies) for outcome, latencies in samples.items()}
+                results[name]['burst_requests'] = args.concurrency
+                results[name]['burst_producer_runs'] = worker.media_cache.stats['misses'] - producer_runs_before
+                if source == 's3':
+                    # With the version lookup cached, hits cost no S3 round trip
+                    results[name]['head_object_calls'] = s3_client.head_calls - head_calls_before
+
+                for outcome in ('miss', 'hit', 'coalesced'):
+                    if outcome in results[name]:
+                        stats = results[name][outcome]
+                        print(f"[BENCH] {name:>15} {outcome:>9}: p50 {stats['p50'] * 1000:7.1f}ms  p99 {stats['p99'] * 1000:7.1f}ms  (n={stats['count']})")
+
+        results['cache'] = worker.media_cache.usage()
+
+    finally:
+        server.should_exit = True
+        await server_task
+        await s3.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Load test the clip and thumbnail endpoints on preset and S3 videos: p50/p99 latency for cache misses, hits and coalesced requests.')
+    parser.add_argument('--video', default=None, help='Source video (default: synthetic testsrc)')
+    parser.add_argument('--duration', type=float, default=120, help='Synthetic video length in seconds')
+    parser.add_argument('--requests', type=int, default=50, help='Distinct timestamps per kind')
+    parser.add_argument('--repeats', type=int, default=4, help='Times each timestamp is requested again (cache hits)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--clip-seconds', type=float, default=5)
+    parser.add_argument('--cache-budget-mb', type=int, default=512)
+    parser.add_argument('--s3-head-latency-ms', type=float, default=30, help='Round trip of the S3 HEAD request that looks up the object version')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    write_report('media_cache', config, results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from common import use_worker_modules, percentiles, write_report
+from stand_ins import generate_test_video
+from bench_worker import tiny_random_yolo, write_cv_config
+
+use_worker_modules()
+
+from cv_pipeline import PPE_CV_PIPELINE
+from preset_tracks import PresetTrackCache
+
+def run(args) -> dict:
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='tracks_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        width, height = [int(v) for v in args.resolution.split('x')]
+        video_file_path = args.video or generate_test_video(os.path.join(work_dir, 'preset.mp4'), args.duration, width, height, args.fps)
+        model_path = args.model or tiny_random_yolo(work_dir)
+        config_path = write_cv_config(work_dir, model_path, args.imgsz, 'full')
+
+        cache = PresetTrackCache(os.path.join(work_dir, 'tracks'), lambda: PPE_CV_PIPELINE(config_path=config_path))
+
+        # Cold build, then a warm start that only loads the cached file
+        started_at = time.perf_counter()
+        tracks = cache._load_or_build(video_file_path, 'Bench-Camera-1')
+        build_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        cache._load_or_build(video_file_path, 'Bench-Camera-1')
+        warm_load_seconds = time.perf_counter() - started_at
+
+        lookup_latencies = []
+        for _ in range(args.lookups):
+            position_s = random.uniform(0, 10 * tracks.duration)
+            started_at = time.perf_counter()
+            tracks.at(position_s)
+            lookup_latencies.append(time.perf_counter() - started_at)
+
+        # What a live detection on the same frame would cost instead
+        import cv2
+
+        pipeline = cache._pipeline
+        live_latencies = []
+        video_capture = cv2.VideoCapture(video_file_path)
+        while len(live_latencies) < args.live_frames:
+            ret, frame = video_capture.read()
+            if not ret:
+                break
+            started_at = time.perf_counter()
+            pipeline.detect(frame)
+            live_latencies.append(time.perf_counter() - started_at)
+        video_capture.release()
+
+        return {
+            'frames': tracks.frame_count,
+            'video_duration_s': tracks.duration,
+            'build_s': build_seconds,
+            'build_fps': tracks.frame_count / max(build_seconds, 1e-9),
+            'warm_load_s': warm_load_seconds,
+            'tracks_bytes': sum(os.path.getsize(os.path.join(cache.cache_dir, name)) for name in os.listdir(cache.cache_dir)),
+            'lookup_latency_s': percentiles(lookup_latencies),
+            'live_detect_latency_s': percentiles(live_latencies),
+        }
+
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Measure preset detection track build time and replay lookup latency against live detection.')
+    parser.add_argument('--video', default=None, help='Preset video to analyze (default: synthetic testsrc)')
+    parser.add_argument('--duration', type=float, default=10, help='Synthetic video length in seconds')
+    parser.add_argument('--resolution', default='1280x720')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--model', default=None, help='Model weights (default: random-weight yolo11n)')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--live-frames', type=int, default=30)
+    parser.add_argument('--work-dir', default=None)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"[BENCH] Built {results['frames']} frames in {results['build_s']:.1f}s; lookup p99 "
+          f"{results['lookup_latency_s']['p99'] * 1e6:.1f}us vs live detect p50 {results['live_detect_latency_s']['p50'] * 1000:.1f}ms")
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'work_dir')}
+    write_report('preset_tracks', config, results, args.output)
+
+if __name__ == '__main__':
+    main()
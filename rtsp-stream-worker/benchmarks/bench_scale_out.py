@@ -0,0 +1,133 @@
+import os
+import time
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+
+from common import use_worker_modules, write_report
+from stand_ins import StandInRedis
+
+use_worker_modules()
+
+from state import RedisKV, StateStore, run_job_worker
+
+def burn_cpu(work_ms: float):
+    """Stand-in for a CPU-bound job stage (decode/encode)."""
+
+    deadline = time.perf_counter() + work_ms / 1000
+    block = b'\0' * 65536
+    while time.perf_counter() < deadline:
+        hashlib.sha256(block).digest()
+
+def node_process(redis_url: str, node_index: int, work_ms: float, concurrency: int, lease_ms: int, crash_after: int):
+
+    """ One worker node: claims jobs from the shared store until the queue is drained """
+
+    async def run():
+
+        store = StateStore(RedisKV(redis_url), f'bench-node-{node_index}')
+        handled = 0
+
+        async def handler(job_id: str, payload: dict):
+            nonlocal handled
+
+            if crash_after and node_index == 0 and handled == crash_after:
+                # Die holding a lease so another node has to pick the job up once it expires
+                os._exit(1)
+
+            await asyncio.get_event_loop().run_in_executor(None, burn_cpu, work_ms)
+            status = await store.get_status(payload['stream_name']) or {}
+            await store.update_status(payload['stream_name'], status='completed', node_id=store.node_id, attempts=status.get('attempts', 0) + 1)
+            handled += 1
+
+        await asyncio.gather(*[run_job_worker(store, handler, lease_ms=lease_ms, poll_interval=0.05, stop_when_idle=True) for _ in range(concurrency)])
+        await store.close()
+
+    asyncio.run(run())
+
+async def wait_for_leases(store: StateStore, lease_ms: int):
+    """After every node exits, wait out the leases of jobs a crashed node still holds and requeue them."""
+    if not await store.kv.hgetall(store._key('jobs', 'active')):
+        return 0
+    await asyncio.sleep(lease_ms / 1000)
+    return await store.requeue_expired_jobs()
+
+async def run_nodes(node_count: int, args) -> dict:
+
+    redis = await StandInRedis().start()
+    store = StateStore(RedisKV(redis.url), 'bench-controller')
+
+    stream_names = [f'bench-stream-{i}' for i in range(args.jobs)]
+    for stream_name in stream_names:
+        await store.set_status(stream_name, {'status': 'queued'})
+        await store.enqueue_job({'stream_name': stream_name, 's3_video_key': f'{stream_name}.mp4'})
+
+    loop = asyncio.get_event_loop()
+    started_at = time.perf_counter()
+
+    pending_rounds = 0
+    while True:
+        processes = [
+            multiprocessing.Process(target=node_process, args=(redis.url, i, args.work_ms, args.concurrency, args.lease_ms, args.crash_after if pending_rounds == 0 else 0))
+            for i in range(node_count)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            await loop.run_in_executor(None, process.join)
+
+        # A crashed node's job is only requeued after its lease expires
+        if not await wait_for_leases(store, args.lease_ms) or pending_rounds >= 3:
+            break
+        pending_rounds += 1
+
+    elapsed = time.perf_counter() - started_at
+
+    statuses = [await store.get_status(stream_name) for stream_name in stream_names]
+    completed = [status for status in statuses if status and status.get('status') == 'completed']
+    per_node = {}
+    for status in completed:
+        per_node[status['node_id']] = per_node.get(status['node_id'], 0) + 1
+
+    await store.close()
+    await redis.stop()
+
+    return {
+        'nodes': node_count,
+        'jobs': args.jobs,
+        'completed': len(completed),
+        'duplicates': sum(status.get('attempts', 1) - 1 for status in completed),
+        'seconds': elapsed,
+        'jobs_per_second': len(completed) / elapsed,
+        'jobs_per_node': per_node,
+        'store_commands': redis.commands_served,
+    }
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Measure job throughput across worker node processes sharing a Redis-protocol state store.')
+    parser.add_argument('--nodes', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--work-ms', type=float, default=50, help='CPU time each synthetic job burns')
+    parser.add_argument('--concurrency', type=int, default=1, help='Job workers per node')
+    parser.add_argument('--lease-ms', type=int, default=2000)
+    parser.add_argument('--crash-after', type=int, default=0, help='Kill node 0 while holding its Nth job, to exercise lease expiry')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = {}
+    for node_count in args.nodes:
+        result = asyncio.run(run_nodes(node_count, args))
+        results[f'nodes_{node_count}'] = result
+        print(f"[BENCH] {node_count} node(s): {result['completed']}/{result['jobs']} jobs in {result['seconds']:.2f}s "
+              f"({result['jobs_per_second']:.1f} jobs/s, {result['duplicates']} duplicates)")
+
+    baseline = results[f'nodes_{args.nodes[0]}']['jobs_per_second']
+    for result in results.values():
+        result['speedup'] = result['jobs_per_second'] / baseline
+
+    write_report('scale_out', {key: value for key, value in vars(args).items() if key != 'output'}, results, args.output)
+
+if __name__ == '__main__':
+    main()
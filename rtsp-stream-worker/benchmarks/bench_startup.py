@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+import urllib.error
+import urllib.request
+
+from common import WORKER_DIR, percentiles, write_report
+
+# Modules main.py used to import eagerly; their standalone cost is what lazy loading saves
+HEAVY_MODULES = ['numpy', 'cv2', 'boto3', 'PIL.Image', 'requests', 'ultralytics']
+
+def worker_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault('AWS_REGION', 'us-east-1')
+    return env
+
+def timed_python(code: str, extra_args: list = None) -> tuple:
+
+    """ Run code in a fresh interpreter from the worker directory, returning (wall seconds, completed process) """
+
+    started_at = time.perf_counter()
+    completed = subprocess.run([sys.executable, *(extra_args or []), '-c', code], cwd=WORKER_DIR, env=worker_env(), capture_output=True, text=True)
+    return time.perf_counter() - started_at, completed
+
+def slowest_imports(importtime_output: str, top: int) -> list:
+
+    """ Top-level imports by cumulative time from `python -X importtime` output """
+
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented under the module that pulled them in
+        if not name.startswith('  '):
+            imports.append({'module': name.strip(), 'cumulative_s': int(cumulative_us) / 1e6})
+    return sorted(imports, key=lambda entry: entry['cumulative_s'], reverse=True)[:top]
+
+def measure_imports(runs: int, top: int) -> dict:
+
+    baseline = percentiles([timed_python('pass')[0] for _ in range(runs)])
+
+    samples, timings = [], []
+    for _ in range(runs):
+        seconds, completed = timed_python('import json, main; print(json.dumps(main.startup_timings))', ['-X', 'importtime'])
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing main failed: {completed.stderr[-2000:]}")
+        samples.append(seconds)
+        timings.append(json.loads(completed.stdout.strip().splitlines()[-1])['imports_s'])
+    importtime_output = completed.stderr
+
+    heavy = {}
+    for module in HEAVY_MODULES:
+        seconds, completed = timed_python(f'import {module}')
+        heavy[module] = seconds - baseline['p50'] if completed.returncode == 0 else None
+
+    return {
+        'interpreter_s': baseline,
+        'import_main_wall_s': percentiles(samples),
+        'import_main_self_reported_s': percentiles(timings),
+        'slowest_imports': slowest_imports(importtime_output, top),
+        'heavy_module_import_s': heavy,
+    }
+
+def poll(url: str) -> tuple:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, OSError):
+        return None, None
+
+def measure_ready(port: int, timeout: float) -> dict:
+
+    """ Launch the worker and time how long /health and /ready take to return 200 """
+
+    started_at = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'main.py'], cwd=WORKER_DIR, env=worker_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    results = {'health_s': None, 'ready_s': None, 'startup': None}
+    try:
+        while time.perf_counter() - started_at < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Worker exited with code {process.returncode} before becoming ready")
+
+            if results['health_s'] is None and poll(f"http://127.0.0.1:{port}/health")[0] == 200:
+                results['health_s'] = time.perf_counter() - started_at
+
+            status, body = poll(f"http://127.0.0.1:{port}/ready")
+            if status == 200:
+                results['ready_s'] = time.perf_counter() - started_at
+                results['startup'] = json.loads(body)['startup']
+                break
+
+            time.sleep(0.05)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    return results
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Measure worker cold start: import time of main.py and, with --launch, time until /ready returns 200.')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per import measurement')
+    parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to report')
+    parser.add_argument('--launch', action='store_true', help='Also start main.py (needs mediamtx and cloudflared) and time readiness')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--ready-timeout', type=float, default=120)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = measure_imports(args.runs, args.top)
+    print(f"[BENCH] import main: p50 {results['import_main_wall_s']['p50']:.2f}s wall "
+          f"(interpreter alone {results['interpreter_s']['p50']:.2f}s)")
+    for module, seconds in results['heavy_module_import_s'].items():
+        print(f"[BENCH] {module:>12}: {'not installed' if seconds is None else f'{seconds:.2f}s'}")
+
+    if args.launch:
+        results['ready'] = measure_ready(args.port, args.ready_timeout)
+        print(f"[BENCH] /health after {results['ready']['health_s']}s, /ready after {results['ready']['ready_s']}s")
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    write_report('startup', config, results, args.output)
+
+if __name__ == '__main__':
+    main()
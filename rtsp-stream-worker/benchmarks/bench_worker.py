@@ -0,0 +1,227 @@
+import os
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from common import use_worker_modules, percentiles, PeakRSSSampler, children_peak_rss_bytes, write_report, compare_reports
+from stand_ins import StandInS3, StandInVSS, generate_test_video
+
+use_worker_modules()
+
+import main as worker
+
+def tiny_random_yolo(output_dir: str) -> str:
+
+    """ Build a yolo11n with random weights from its yaml, so CV benchmarks need no download or GPU """
+
+    from ultralytics import YOLO
+
+    model_path = os.path.join(output_dir, 'yolo11n_random.pt')
+    if not os.path.exists(model_path):
+        YOLO('yolo11n.yaml').save(model_path)
+    return model_path
+
+def write_cv_config(output_dir: str, model_path: str, imgsz: int, inference_mode: str) -> str:
+
+    import yaml
+
+    config_path = os.path.join(output_dir, 'cv_pipeline_bench.yaml')
+    with open(config_path, 'w') as f:
+        yaml.dump({'model_path': model_path, 'device': 'cpu', 'imgsz': imgsz, 'inference_mode': inference_mode}, f)
+    return config_path
+
+async def bench_download(s3: StandInS3, video_key: str, video_bytes: int, runs: int) -> dict:
+
+    latencies = []
+    with PeakRSSSampler() as rss:
+        for run in range(runs):
+            started_at = time.perf_counter()
+            video_file_path = await worker.download_video_async(s3.url_for(video_key), f'bench_download_{run}')
+            latencies.append(time.perf_counter() - started_at)
+            os.remove(video_file_path)
+
+    return {
+        'latency_s': percentiles(latencies),
+        'throughput_mb_s': video_bytes / 1e6 / (sum(latencies) / len(latencies)),
+        'peak_rss_bytes': rss.peak_bytes,
+    }
+
+async def bench_chunk(video_file_path: str, video_bytes: int, runs: int) -> dict:
+
+    latencies = []
+    chunk_counts = []
+    with PeakRSSSampler() as rss:
+        for run in range(runs):
+            started_at = time.perf_counter()
+            chunk_output_folder = await worker.chunk_video_async(video_file_path, f'bench_chunk_{run}')
+            latencies.append(time.perf_counter() - started_at)
+            chunk_counts.append(len(os.listdir(chunk_output_folder)))
+            shutil.rmtree(chunk_output_folder)
+
+    return {
+        'latency_s': percentiles(latencies),
+        'throughput_mb_s': video_bytes / 1e6 / (sum(latencies) / len(latencies)),
+        'chunks': chunk_counts[0],
+        'peak_rss_bytes': rss.peak_bytes,
+        'ffmpeg_peak_rss_bytes': children_peak_rss_bytes(),
+    }
+
+async def bench_upload(vss: StandInVSS, video_file_path: str, runs: int) -> dict:
+
+    # Time every _upload_chunk call that upload_chunks_async fans out
+    request_latencies = []
+    upload_chunk = worker._upload_chunk
+
+    async def timed_upload_chunk(chunk_file_path: str):
+        started_at = time.perf_counter()
+        try:
+            return await upload_chunk(chunk_file_path)
+        finally:
+            request_latencies.append(time.perf_counter() - started_at)
+
+    chunk_output_folder = await worker.chunk_video_async(video_file_path, 'bench_upload')
+    chunk_bytes = sum(os.path.getsize(os.path.join(chunk_output_folder, f)) for f in os.listdir(chunk_output_folder))
+
+    os.environ['NVIDIA_VSS_BASE_URL'] = vss.base_url
+    worker._upload_chunk = timed_upload_chunk
+
+    latencies = []
+    try:
+        with PeakRSSSampler() as rss:
+            for _ in range(runs):
+                started_at = time.perf_counter()
+                await worker.upload_chunks_async(chunk_output_folder)
+                latencies.append(time.perf_counter() - started_at)
+    finally:
+        worker._upload_chunk = upload_chunk
+        shutil.rmtree(chunk_output_folder)
+
+    return {
+        'latency_s': percentiles(latencies),
+        'request_latency_s': percentiles(request_latencies),
+        'throughput_mb_s': chunk_bytes / 1e6 / (sum(latencies) / len(latencies)),
+        'bytes_received': vss.bytes_received,
+        'peak_rss_bytes': rss.peak_bytes,
+    }
+
+def bench_cv(video_file_path: str, config_path: str, max_frames: int) -> dict:
+
+    import cv2
+    from cv_pipeline import PPE_CV_PIPELINE
+    from profiling import StageTimers
+
+    load_started_at = time.perf_counter()
+    pipeline = PPE_CV_PIPELINE(config_path=config_path)
+    load_seconds = time.perf_counter() - load_started_at
+
+    frame_latencies = []
+    with PeakRSSSampler() as rss:
+
+        # Per-frame detect + draw latency
+        video_capture = cv2.VideoCapture(video_file_path)
+        while len(frame_latencies) < max_frames:
+            ret, frame = video_capture.read()
+            if not ret:
+                break
+            started_at = time.perf_counter()
+            pipeline._draw_boxes(frame, pipeline.detect(frame))
+            frame_latencies.append(time.perf_counter() - started_at)
+        video_capture.release()
+
+        # End-to-end analyze_video, including decode and encode, split into stages
+        pipeline.timers = StageTimers()
+        started_at = time.perf_counter()
+        processed_video_file_path = pipeline.analyze_video(video_file_path)
+        analyze_seconds = time.perf_counter() - started_at
+        pipeline.timers, analyze_stages = None, pipeline.timers.summary()
+        os.remove(processed_video_file_path)
+
+    video_capture = cv2.VideoCapture(video_file_path)
+    frame_count = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_capture.release()
+
+    return {
+        'model_load_s': load_seconds,
+        'frame_latency_s': percentiles(frame_latencies),
+        'detect_fps': len(frame_latencies) / max(sum(frame_latencies), 1e-9),
+        'analyze_video_fps': frame_count / max(analyze_seconds, 1e-9),
+        'analyze_video_stages': analyze_stages,
+        'peak_rss_bytes': rss.peak_bytes,
+    }
+
+async def run(args) -> dict:
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='worker_bench_')
+    videos_dir = os.path.join(work_dir, 'videos')
+    os.makedirs(videos_dir, exist_ok=True)
+
+    worker.temp_video_folder_path = os.path.join(work_dir, 'temp')
+    os.makedirs(worker.temp_video_folder_path, exist_ok=True)
+
+    width, height = [int(v) for v in args.resolution.split('x')]
+    video_key = f'testsrc_{args.duration}s_{args.resolution}.mp4'
+    video_file_path = generate_test_video(os.path.join(videos_dir, video_key), args.duration, width, height, args.fps)
+    video_bytes = os.path.getsize(video_file_path)
+    print(f"[BENCH] Synthetic video {video_key}: {video_bytes / 1e6:.1f} MB")
+
+    s3 = await StandInS3(videos_dir, bandwidth_bytes_per_s=args.s3_bandwidth_mb_s * 1e6).start()
+    vss = await StandInVSS(latency_s=args.vss_latency).start()
+
+    results = {}
+    try:
+        if 'download' in args.stages:
+            print("[BENCH] Download stage...")
+            results['download'] = await bench_download(s3, video_key, video_bytes, args.runs)
+        if 'chunk' in args.stages:
+            print("[BENCH] Chunk stage...")
+            results['chunk'] = await bench_chunk(video_file_path, video_bytes, args.runs)
+        if 'upload' in args.stages:
+            print("[BENCH] Upload stage...")
+            results['upload'] = await bench_upload(vss, video_file_path, args.runs)
+        if 'cv' in args.stages:
+            print("[BENCH] CV stage...")
+            cv_video_key = f'testsrc_{args.cv_duration}s_{args.resolution}.mp4'
+            cv_video_file_path = generate_test_video(os.path.join(videos_dir, cv_video_key), args.cv_duration, width, height, args.fps)
+            model_path = args.model or tiny_random_yolo(work_dir)
+            config_path = write_cv_config(work_dir, model_path, args.imgsz, args.inference_mode)
+            results['cv'] = await asyncio.get_event_loop().run_in_executor(None, bench_cv, cv_video_file_path, config_path, args.cv_frames)
+    finally:
+        await s3.stop()
+        await vss.stop()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the worker ingest (download, chunk), CV and upload paths against local stand-ins.')
+    parser.add_argument('--stages', nargs='+', default=['download', 'chunk', 'upload', 'cv'], choices=['download', 'chunk', 'upload', 'cv'])
+    parser.add_argument('--runs', type=int, default=5, help='Repetitions per ingest/upload stage')
+    parser.add_argument('--duration', type=float, default=120, help='Synthetic video length in seconds')
+    parser.add_argument('--resolution', default='1280x720')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--s3-bandwidth-mb-s', type=float, default=0, help='Throttle the S3 stand-in (0 = unthrottled)')
+    parser.add_argument('--vss-latency', type=float, default=0, help='Extra seconds the VSS stand-in waits per upload')
+    parser.add_argument('--cv-duration', type=float, default=5, help='Length of the CV benchmark video in seconds')
+    parser.add_argument('--cv-frames', type=int, default=60, help='Frames timed individually for CV latency')
+    parser.add_argument('--model', default=None, help='Model weights (default: random-weight yolo11n)')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--inference-mode', default='full', choices=['full', 'tiled'])
+    parser.add_argument('--work-dir', default=None, help='Keep synthetic videos here between runs')
+    parser.add_argument('--output', default=None, help='JSON report path')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'), help='Compare two reports instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+
+    results = asyncio.run(run(args))
+    config = {key: value for key, value in vars(args).items() if key not in ('compare', 'output', 'work_dir')}
+    write_report('worker', config, results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import math
+import time
+import resource
+import platform
+import threading
+import subprocess
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+def use_worker_modules():
+    """Make the worker's flat modules (main, helpers, cv_pipeline) importable."""
+
+    if WORKER_DIR not in sys.path:
+        sys.path.insert(0, WORKER_DIR)
+
+    # boto3 rejects an empty region when main.py builds its S3 client
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+
+def percentiles(samples: list, points=(50, 95, 99)) -> dict:
+    """Nearest-rank percentiles plus min/mean/max of a list of samples."""
+
+    if not samples:
+        return {}
+
+    ordered = sorted(samples)
+    stats = {f'p{p}': ordered[min(len(ordered), max(1, math.ceil(p / 100 * len(ordered)))) - 1] for p in points}
+    stats.update({'min': ordered[0], 'mean': sum(ordered) / len(ordered), 'max': ordered[-1], 'count': len(ordered)})
+    return stats
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process, read from /proc where available."""
+
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is KB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+class PeakRSSSampler:
+
+    """ Samples this process's RSS on a background thread to get the peak for one stage """
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+            self._stop.wait(self.interval_s)
+
+    def __enter__(self):
+        self.peak_bytes = current_rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+
+def children_peak_rss_bytes() -> int:
+    """Peak RSS of any waited-for child process (ffmpeg), in bytes."""
+
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=WORKER_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def write_report(name: str, config: dict, results: dict, output_path: str = None) -> str:
+
+    """ Write a benchmark report as JSON, defaulting to results/<name>_<commit>_<timestamp>.json """
+
+    commit = git_commit()
+    report = {
+        'benchmark': name,
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'config': config,
+        'results': results,
+    }
+
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, f"{name}_{commit}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"[BENCH] Wrote {output_path}")
+    return output_path
+
+def compare_reports(baseline_path: str, candidate_path: str):
+
+    """ Print the relative change of every numeric result between two reports """
+
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    with open(candidate_path, 'r') as f:
+        candidate = json.load(f)
+
+    def flatten(value, prefix=''):
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                yield from flatten(inner, f'{prefix}.{key}' if prefix else key)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix, value
+
+    baseline_values = dict(flatten(baseline['results']))
+    print(f"[BENCH] {baseline['benchmark']}: {baseline['commit']} -> {candidate['commit']}")
+    for key, value in flatten(candidate['results']):
+        if key in baseline_values and baseline_values[key]:
+            change = (value - baseline_values[key]) / abs(baseline_values[key]) * 100
+            print(f"  {key:<60} {baseline_values[key]:>14.4f} -> {value:>14.4f} ({change:+.1f}%)")
@@ -0,0 +1,224 @@
+import os
+import uuid
+import asyncio
+import subprocess
+
+from aiohttp import web
+
+async def _start_site(app: web.Application, host: str = '127.0.0.1'):
+    """Start an aiohttp app on a free local port and return (runner, base_url)."""
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+class StandInS3:
+
+    """ Serves files from a local directory the way a presigned S3 GET URL would """
+
+    def __init__(self, root_dir: str, bandwidth_bytes_per_s: float = 0):
+        self.root_dir = root_dir
+        self.bandwidth_bytes_per_s = bandwidth_bytes_per_s
+        self.runner = None
+        self.base_url = None
+        self.bytes_served = 0
+
+    async def _get_object(self, request: web.Request):
+
+        file_path = os.path.join(self.root_dir, request.match_info['key'])
+        if not os.path.exists(file_path):
+            return web.Response(status=404, text='NoSuchKey')
+
+        response = web.StreamResponse(headers={'Content-Length': str(os.path.getsize(file_path)), 'Content-Type': 'video/mp4'})
+        await response.prepare(request)
+
+        chunk_size = 64 * 1024
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                await response.write(chunk)
+                self.bytes_served += len(chunk)
+                if self.bandwidth_bytes_per_s:
+                    await asyncio.sleep(len(chunk) / self.bandwidth_bytes_per_s)
+
+        await response.write_eof()
+        return response
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/{key:.+}', self._get_object)
+        self.runner, self.base_url = await _start_site(app)
+        return self
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+class StandInVSS:
+
+    """ Accepts multipart uploads on POST /files like NVIDIA VSS and answers with a file id """
+
+    def __init__(self, latency_s: float = 0):
+        self.latency_s = latency_s
+        self.runner = None
+        self.base_url = None
+        self.bytes_received = 0
+        self.files = {}
+
+    async def _post_file(self, request: web.Request):
+
+        reader = await request.multipart()
+        file_id = str(uuid.uuid4())
+        filename = None
+
+        async for part in reader:
+            if part.name == 'file':
+                filename = part.filename
+                while chunk := await part.read_chunk(64 * 1024):
+                    self.bytes_received += len(chunk)
+
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+        self.files[file_id] = filename
+        return web.json_response({'id': file_id, 'filename': filename, 'purpose': 'vision', 'media_type': 'video'})
+
+    async def start(self):
+        app = web.Application(client_max_size=0)
+        app.router.add_post('/files', self._post_file)
+        self.runner, self.base_url = await _start_site(app)
+        return self
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+class StandInRedis:
+
+    """ Redis-protocol server backed by the worker's InMemoryKV, standing in for a shared Redis """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        from state import InMemoryKV, CLAIM_JOB_SCRIPT, RENEW_JOB_SCRIPT
+
+        self.host = host
+        self.port = port
+        self.kv = InMemoryKV()
+        self.claim_job_script = CLAIM_JOB_SCRIPT
+        self.renew_job_script = RENEW_JOB_SCRIPT
+        self.server = None
+        self.commands_served = 0
+        self._clients = set()
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def _read_command(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.decode().split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2].decode())
+        return args
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, bool):
+            return b'+OK\r\n' if value else b'$-1\r\n'
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, (list, tuple)):
+            return b'*%d\r\n' % len(value) + b''.join(StandInRedis._encode(item) for item in value)
+        data = str(value).encode()
+        return b'$%d\r\n%s\r\n' % (len(data), data)
+
+    async def _dispatch(self, args: list) -> bytes:
+
+        command, args = args[0].upper(), args[1:]
+
+        if command in ('PING', 'AUTH', 'SELECT'):
+            return b'+PONG\r\n' if command == 'PING' else b'+OK\r\n'
+        if command == 'GET':
+            return self._encode(await self.kv.get(args[0]))
+        if command == 'SET':
+            options = [arg.upper() for arg in args[2:]]
+            px = int(args[2 + options.index('PX') + 1]) if 'PX' in options else None
+            return self._encode(await self.kv.set(args[0], args[1], nx='NX' in options, xx='XX' in options, px=px))
+        if command == 'DEL':
+            return self._encode(sum([await self.kv.delete(key) for key in args]))
+        if command == 'RPUSH':
+            return self._encode(await self.kv.rpush(args[0], args[1]))
+        if command == 'LPOP':
+            return self._encode(await self.kv.lpop(args[0]))
+        if command == 'EVAL' and args[0] == self.claim_job_script:
+            # The worker's scripts are served by the equivalent atomic InMemoryKV steps
+            return self._encode(await self.kv.claim_job(args[2], args[3], args[4], args[5], int(args[6])))
+        if command == 'EVAL' and args[0] == self.renew_job_script:
+            return self._encode(int(await self.kv.renew_lease(args[2], args[3], int(args[4]))))
+        if command == 'HSET':
+            return self._encode(await self.kv.hset(args[0], args[1], args[2]))
+        if command == 'HDEL':
+            return self._encode(await self.kv.hdel(args[0], args[1]))
+        if command == 'HGETALL':
+            return self._encode([item for pair in (await self.kv.hgetall(args[0])).items() for item in pair])
+
+        return f"-ERR unknown command '{command}'\r\n".encode()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        try:
+            while (args := await self._read_command(reader)) is not None:
+                if args:
+                    self.commands_served += 1
+                    writer.write(await self._dispatch(args))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await asyncio.sleep(0)
+            await self.server.wait_closed()
+
+def generate_test_video(output_path: str, duration_s: float, width: int = 1280, height: int = 720, fps: int = 30, gop: int = 30) -> str:
+
+    """ Render a synthetic video with ffmpeg's testsrc pattern and a sine audio track """
+
+    if os.path.exists(output_path):
+        return output_path
+
+    ffmpeg_command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc=size={width}x{height}:rate={fps}',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+        '-t', str(duration_s),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop), '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-b:a', '96k',
+        '-shortest',
+        output_path,
+    ]
+
+    subprocess.run(ffmpeg_command, check=True)
+    return output_path
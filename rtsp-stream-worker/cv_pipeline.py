@@ -0,0 +1,482 @@
+import os
+import json
+import time
+import math
+import yaml
+import hashlib
+import cv2
+import numpy as np
+
+from ultralytics import YOLO
+from profiling import timed
+
+directory_path = os.path.dirname(__file__)
+cv_config_path = os.path.join(directory_path, 'cv_pipeline.yaml')
+
+MODEL_STRIDE = 32
+INFERENCE_MODES = ('full', 'tiled', 'cascade')
+
+def weights_digest(model_path: str) -> str:
+    """SHA-256 of a weights file, or of every file in an exported model directory."""
+
+    paths = [model_path] if os.path.isfile(model_path) else sorted(
+        os.path.join(root, name) for root, _, names in os.walk(model_path) for name in names
+    )
+
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def load_cv_config(config_path: str = None) -> dict:
+    """Load the CV pipeline settings, returning an empty config if the file is missing."""
+
+    config_path = config_path or cv_config_path
+    if not os.path.exists(config_path):
+        return {}
+
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+def empty_detections():
+    """Return an empty (boxes, scores, class_ids) tuple."""
+    return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.float32), np.zeros((0,), dtype=np.int64)
+
+def box_iou(box, boxes) -> np.ndarray:
+    """IoU of one xyxy box against an (N, 4) array of xyxy boxes."""
+
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(area + areas - intersection, 1e-9)
+
+def nms(boxes, scores, class_ids, iou_threshold: float):
+    """Class-aware non-maximum suppression over (boxes, scores, class_ids)."""
+
+    keep = []
+    for class_id in np.unique(class_ids):
+        indices = np.where(class_ids == class_id)[0]
+        indices = indices[np.argsort(-scores[indices])]
+        while len(indices):
+            best = indices[0]
+            keep.append(best)
+            if len(indices) == 1:
+                break
+            overlaps = box_iou(boxes[best], boxes[indices[1:]])
+            indices = indices[1:][overlaps < iou_threshold]
+
+    keep = np.array(sorted(keep), dtype=np.int64)
+    return boxes[keep], scores[keep], class_ids[keep]
+
+class PPE_CV_PIPELINE:
+
+    def __init__(self, model_path: str = None, config_path: str = None):
+
+        self.config = load_cv_config(config_path)
+
+        self.model_path = model_path or os.path.join(directory_path, self.config.get('model_path', 'cv_model_best.pt'))
+
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Model file not found: {self.model_path}")
+
+        # task is given explicitly so exported models (e.g. the INT8 OpenVINO directory) load without guessing
+        self.model = YOLO(self.model_path, task='detect')
+
+        self.device = self.config.get('device', 'cpu')
+        self.imgsz = int(self.config.get('imgsz', 1280))
+        self.conf = float(self.config.get('conf', 0.25))
+        self.iou = float(self.config.get('iou', 0.45))
+        self.batch = max(1, int(self.config.get('batch', 1)))
+        self.inference_mode = self.config.get('inference_mode', 'full')
+        self.tiling = self.config.get('tiling', {}) or {}
+        self.cascade = self.config.get('cascade', {}) or {}
+        self.roi_polygons = self.config.get('roi', {}) or {}
+
+        self._prefilter_model = None
+        self._weights_digest = None
+        self.cascade_stats = {"frames": 0, "escalated": 0}
+
+        # Set to a profiling.StageTimers to time analyze_video stages and the ultralytics speed split
+        self.timers = None
+
+        person_classes = [name.lower() for name in self.config.get('person_classes', ['person'])]
+        self.person_class_ids = [class_id for class_id, name in self.model.names.items() if name.lower() in person_classes]
+
+        if self.inference_mode not in INFERENCE_MODES:
+            raise ValueError(f"Invalid inference mode: {self.inference_mode}")
+
+        if self.inference_mode == 'tiled' and not self.person_class_ids:
+            raise ValueError(f"Tiled inference needs a person class, model has: {list(self.model.names.values())}")
+
+        if self.inference_mode == 'cascade':
+            # Load the prefilter now so a missing model fails at startup instead of on the first frame
+            self.prefilter_model
+
+    @property
+    def prefilter_model(self):
+
+        """ Small screening model for cascade mode, loaded on first use """
+
+        if self._prefilter_model is None:
+
+            prefilter_model_path = os.path.join(directory_path, self.cascade.get('prefilter_model_path', 'cv_model_prefilter.pt'))
+            if not os.path.exists(prefilter_model_path):
+                raise FileNotFoundError(f"Cascade prefilter model not found: {prefilter_model_path}")
+
+            self._prefilter_model = YOLO(prefilter_model_path, task='detect')
+
+            trigger_classes = [name.lower() for name in self.cascade.get('trigger_classes', ['person'])]
+            self.trigger_class_ids = [class_id for class_id, name in self._prefilter_model.names.items() if name.lower() in trigger_classes]
+
+            if not self.trigger_class_ids:
+                raise ValueError(f"Cascade trigger classes {trigger_classes} not in prefilter model: {list(self._prefilter_model.names.values())}")
+
+        return self._prefilter_model
+
+    def version(self, camera_name: str = None) -> str:
+
+        """ Hash of the weights and every setting that changes a camera's detections, for caching them """
+
+        if self._weights_digest is None:
+            self._weights_digest = weights_digest(self.model_path)
+
+        settings = {
+            'weights': self._weights_digest,
+            'imgsz': self.imgsz,
+            'conf': self.conf,
+            'iou': self.iou,
+            'inference_mode': self.inference_mode,
+            'person_classes': self.config.get('person_classes', ['person']),
+            'roi': self.roi_polygons.get(camera_name),
+        }
+        if self.inference_mode == 'tiled':
+            settings['tiling'] = self.tiling
+        if self.inference_mode == 'cascade':
+            settings['cascade'] = self.cascade
+            settings['prefilter_weights'] = weights_digest(os.path.join(directory_path, self.cascade.get('prefilter_model_path', 'cv_model_prefilter.pt')))
+
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+    def _predict(self, image: np.ndarray, imgsz: int, conf: float, iou: float = None, classes: list = None, model=None):
+
+        """ Run the model (the main one unless given) on one image and return (boxes, scores, class_ids) in image pixels """
+
+        prefix = 'yolo' if model is None or model is self.model else 'yolo_prefilter'
+        model = model or self.model
+        iou = self.iou if iou is None else iou
+        results = model.predict(image, imgsz=imgsz, conf=conf, iou=iou, max_det=1000, classes=classes, device=self.device, verbose=False)
+        if self.timers is not None:
+            self.timers.add_ultralytics_speed(results, prefix)
+        return self._result_detections(results[0])
+
+    @staticmethod
+    def _result_detections(result):
+
+        boxes = result.boxes
+
+        if boxes is None or len(boxes) == 0:
+            return empty_detections()
+
+        return (
+            boxes.xyxy.cpu().numpy().astype(np.float32),
+            boxes.conf.cpu().numpy().astype(np.float32),
+            boxes.cls.cpu().numpy().astype(np.int64),
+        )
+
+    def _scaled_imgsz(self, region_size: int, frame_size: int, imgsz: int) -> int:
+
+        """ Inference size that keeps a region at the same pixel scale the full frame gets at imgsz,
+        rounded up to the model stride so the letterbox adds no padding of its own """
+
+        scaled = imgsz * region_size / max(frame_size, 1)
+        return int(min(imgsz, max(MODEL_STRIDE, math.ceil(scaled / MODEL_STRIDE) * MODEL_STRIDE)))
+
+    def _roi_region(self, frame: np.ndarray, camera_name: str):
+
+        """ Return the pixel polygon and bounding rectangle of the camera's ROI, or (None, None) """
+
+        polygon = self.roi_polygons.get(camera_name) if camera_name else None
+        if not polygon:
+            return None, None
+
+        height, width = frame.shape[:2]
+        polygon_px = np.array([[x * width, y * height] for x, y in polygon], dtype=np.float32)
+
+        x1, y1 = np.floor(polygon_px.min(axis=0)).astype(int)
+        x2, y2 = np.ceil(polygon_px.max(axis=0)).astype(int)
+        rect = (max(0, x1), max(0, y1), min(width, x2), min(height, y2))
+
+        return polygon_px, rect
+
+    def _filter_to_roi(self, detections, polygon_px: np.ndarray):
+
+        """ Drop detections whose bottom-centre (where the worker stands) is outside the ROI polygon """
+
+        boxes, scores, class_ids = detections
+        if not len(boxes):
+            return detections
+
+        contour = polygon_px.reshape(-1, 1, 2)
+        keep = np.array([
+            cv2.pointPolygonTest(contour, (float((box[0] + box[2]) / 2), float(box[3])), False) >= 0
+            for box in boxes
+        ])
+        return boxes[keep], scores[keep], class_ids[keep]
+
+    def _crop_regions(self, person_boxes: np.ndarray, width: int, height: int, settings: dict) -> list:
+
+        """ Expand each person box with context and merge overlapping crops into a list of xyxy rectangles,
+        using the context and min_crop of the given settings (the tiling or cascade section) """
+
+        context = float(settings.get('context', 0.25))
+        min_crop = int(settings.get('min_crop', 256))
+
+        regions = []
+        for x1, y1, x2, y2 in person_boxes:
+            box_w, box_h = x2 - x1, y2 - y1
+            crop_w = max(box_w * (1 + 2 * context), min_crop)
+            crop_h = max(box_h * (1 + 2 * context), min_crop)
+            center_x, center_y = (x1 + x2) / 2, (y1 + y2) / 2
+            regions.append([
+                max(0, int(center_x - crop_w / 2)),
+                max(0, int(center_y - crop_h / 2)),
+                min(width, int(center_x + crop_w / 2)),
+                min(height, int(center_y + crop_h / 2)),
+            ])
+
+        # Union overlapping crops so nearby workers share one high-res pass
+        merged = True
+        while merged and len(regions) > 1:
+            merged = False
+            for i in range(len(regions)):
+                for j in range(i + 1, len(regions)):
+                    a, b = regions[i], regions[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del regions[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        return regions
+
+    def _detect_regions(self, image: np.ndarray, regions: list, conf: float, crop_imgsz: int):
+
+        """ Run the main model on each xyxy crop and return the detections in image pixels """
+
+        all_boxes, all_scores, all_class_ids = [], [], []
+
+        for x1, y1, x2, y2 in regions:
+            crop = image[y1:y2, x1:x2]
+            if crop.size == 0:
+                continue
+            boxes, scores, class_ids = self._predict(crop, imgsz=crop_imgsz, conf=conf)
+            all_boxes.append(boxes + np.array([x1, y1, x1, y1], dtype=np.float32))
+            all_scores.append(scores)
+            all_class_ids.append(class_ids)
+
+        if not all_boxes:
+            return empty_detections()
+
+        return np.concatenate(all_boxes), np.concatenate(all_scores), np.concatenate(all_class_ids)
+
+    def _detect_full(self, image: np.ndarray, conf: float, imgsz: int):
+        return self._predict(image, imgsz=imgsz, conf=conf)
+
+    def _detect_tiled(self, image: np.ndarray, conf: float, imgsz: int):
+
+        """ Cheap low-res person pass, then high-res passes on crops around people, merged with NMS """
+
+        # Checked here too, because detect() can switch to tiled on a pipeline built for another mode
+        if not self.person_class_ids:
+            raise ValueError(f"Tiled inference needs a person class, model has: {list(self.model.names.values())}")
+
+        height, width = image.shape[:2]
+
+        person_imgsz = min(imgsz, int(self.tiling.get('person_imgsz', 640)))
+        person_conf = float(self.tiling.get('person_conf', 0.25))
+        crop_imgsz = int(self.tiling.get('crop_imgsz', 640))
+
+        person_detections = self._predict(image, imgsz=person_imgsz, conf=min(conf, person_conf))
+        person_mask = np.isin(person_detections[2], self.person_class_ids) & (person_detections[1] >= person_conf)
+
+        if not person_mask.any():
+            keep = person_detections[1] >= conf
+            return person_detections[0][keep], person_detections[1][keep], person_detections[2][keep]
+
+        crop_detections = self._detect_regions(image, self._crop_regions(person_detections[0][person_mask], width, height, self.tiling), conf, crop_imgsz)
+
+        boxes = np.concatenate([person_detections[0], crop_detections[0]])
+        scores = np.concatenate([person_detections[1], crop_detections[1]])
+        class_ids = np.concatenate([person_detections[2], crop_detections[2]])
+
+        keep = scores >= conf
+        return nms(boxes[keep], scores[keep], class_ids[keep], float(self.tiling.get('merge_iou', 0.5)))
+
+    def _detect_cascade(self, image: np.ndarray, conf: float, imgsz: int):
+
+        """ Screen the frame with the small prefilter model and only run the main model where it
+        found people or likely violations: on crops around them, or on the whole frame """
+
+        height, width = image.shape[:2]
+
+        prefilter_imgsz = min(imgsz, int(self.cascade.get('prefilter_imgsz', 640)))
+        prefilter_conf = float(self.cascade.get('prefilter_conf', 0.2))
+
+        prefilter_model = self.prefilter_model
+        boxes, scores, class_ids = self._predict(image, imgsz=prefilter_imgsz, conf=prefilter_conf, classes=self.trigger_class_ids, model=prefilter_model)
+
+        self.cascade_stats["frames"] += 1
+
+        if not len(boxes):
+            return empty_detections()
+
+        self.cascade_stats["escalated"] += 1
+
+        if self.cascade.get('confirm', 'regions') == 'frame':
+            return self._predict(image, imgsz=imgsz, conf=conf)
+
+        regions = self._crop_regions(boxes, width, height, self.cascade)
+        crop_imgsz = int(self.cascade.get('crop_imgsz', 640))
+        boxes, scores, class_ids = self._detect_regions(image, regions, conf, crop_imgsz)
+
+        return nms(boxes, scores, class_ids, float(self.cascade.get('merge_iou', 0.5)))
+
+    def detect(self, frame: np.ndarray, conf: float = None, camera_name: str = None, inference_mode: str = None):
+
+        """ Detect PPE in a frame using the configured inference mode and the camera's ROI, if any.
+        Returns (boxes, scores, class_ids) in frame pixels """
+
+        conf = self.conf if conf is None else conf
+        inference_mode = inference_mode or self.inference_mode
+        detect_fn = {
+            'full': self._detect_full,
+            'tiled': self._detect_tiled,
+            'cascade': self._detect_cascade,
+        }[inference_mode]
+
+        polygon_px, rect = self._roi_region(frame, camera_name)
+
+        if rect is None:
+            return detect_fn(frame, conf, self.imgsz)
+
+        x1, y1, x2, y2 = rect
+        if x2 <= x1 or y2 <= y1:
+            return empty_detections()
+
+        height, width = frame.shape[:2]
+        roi_imgsz = self._scaled_imgsz(max(x2 - x1, y2 - y1), max(width, height), self.imgsz)
+
+        boxes, scores, class_ids = detect_fn(frame[y1:y2, x1:x2], conf, roi_imgsz)
+        boxes = boxes + np.array([x1, y1, x1, y1], dtype=np.float32)
+
+        return self._filter_to_roi((boxes, scores, class_ids), polygon_px)
+
+    def count_people(self, frame: np.ndarray, imgsz: int = 640, conf: float = None) -> int:
+
+        """ People in a frame from one small full-frame pass that only keeps the person classes.
+        Skips ROI, tiling and the cascade, which matter for PPE but not for a head count """
+
+        conf = self.conf if conf is None else conf
+        return len(self._predict(frame, imgsz=imgsz, conf=conf, classes=self.person_class_ids)[2])
+
+    def detect_batch(self, frames: list, conf: float = None, camera_name: str = None) -> list:
+
+        """ Detect PPE in several frames. Full-frame mode without an ROI sends them to the model as one
+        batch; other modes and ROI cameras fall back to one detect() per frame """
+
+        conf = self.conf if conf is None else conf
+
+        if self.inference_mode != 'full' or len(frames) < 2 or self.roi_polygons.get(camera_name):
+            return [self.detect(frame, conf=conf, camera_name=camera_name) for frame in frames]
+
+        results = self.model.predict(frames, imgsz=self.imgsz, conf=conf, iou=self.iou, max_det=1000, device=self.device, verbose=False)
+        if self.timers is not None:
+            self.timers.add_ultralytics_speed(results)
+        return [self._result_detections(result) for result in results]
+
+    def _draw_boxes(self, frame, detections) -> np.ndarray:
+
+        boxes, scores, class_ids = detections
+
+        for box, confidence, class_id in zip(boxes, scores, class_ids):
+            x1, y1, x2, y2 = [int(coord) for coord in box]
+            class_name = self.model.names[int(class_id)]
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, f"{class_name}: {float(confidence):.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+        return frame
+
+    def _analyze_image(self, image_frame: np.ndarray, camera_name: str = None):
+
+        detections = self.detect(image_frame, camera_name=camera_name)
+        frame = self._draw_boxes(image_frame, detections)
+        return frame
+
+    def analyze_video(self, video_source: str, camera_name: str = None):
+
+        if os.path.exists(video_source):
+
+            video_source_basename = video_source[:-4]
+            video_capture = cv2.VideoCapture(video_source)
+            new_video_source = os.path.join(os.path.dirname(video_source), f"{os.path.basename(video_source_basename)}_processed.mp4")
+
+            if not os.path.exists(new_video_source):
+                os.makedirs(os.path.dirname(new_video_source), exist_ok=True)
+
+            # Get video properties for VideoWriter
+            fps = int(video_capture.get(cv2.CAP_PROP_FPS))
+            width = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+            # Initialize VideoWriter
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            video_writer = cv2.VideoWriter(new_video_source, fourcc, fps, (width, height))
+
+            frame_count = 0
+            started_at = time.perf_counter()
+
+            while True:
+                frames = []
+                with timed(self.timers, 'decode'):
+                    while len(frames) < self.batch:
+                        ret, frame = video_capture.read()
+                        if not ret:
+                            break
+                        frames.append(frame)
+
+                if not frames:
+                    break
+
+                with timed(self.timers, 'detect'):
+                    frame_detections = self.detect_batch(frames, camera_name=camera_name)
+
+                for frame, detections in zip(frames, frame_detections):
+                    with timed(self.timers, 'draw'):
+                        processed_frame = self._draw_boxes(frame, detections)
+
+                    # Write frame to output video
+                    with timed(self.timers, 'encode'):
+                        video_writer.write(processed_frame)
+                    frame_count += 1
+
+            video_capture.release()
+            video_writer.release()
+
+            elapsed = time.perf_counter() - started_at
+            print(f"[CV] Analyzed {frame_count} frames in {elapsed:.1f}s ({frame_count / max(elapsed, 1e-9):.2f} fps, mode={self.inference_mode}, batch={self.batch})")
+
+            if self.inference_mode == 'cascade':
+                print(f"[CV] Cascade escalated {self.cascade_stats['escalated']}/{self.cascade_stats['frames']} frames to the main model")
+
+            return new_video_source
+        else:
+            raise FileNotFoundError(f"Video file not found: {video_source}")
+
@@ -1,14 +1,5 @@
 import socket
 
-async def read_stream(stream, prefix=''):
-    """Helper function to read and print lines from a subprocess stream."""
-    while True:
-        line = await stream.readline()
-        if line:
-            print(f"[{prefix}] {line.decode().strip()}")
-        else:
-            break
-
 def find_open_port():
     """Finds and returns a single open TCP port on the local machine."""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -47,4 +38,4 @@ def find_open_rtp_rtcp_ports():
             rtcp_socket.close()
             continue
 
-__all__ = ['read_stream', 'find_open_rtp_rtcp_ports', 'find_open_port']
\ No newline at end of file
+__all__ = ['find_open_rtp_rtcp_ports', 'find_open_port']
\ No newline at end of file
@@ -0,0 +1,215 @@
+import sys
+import json
+import time
+import queue
+import threading
+
+from collections import OrderedDict, deque
+
+LOG_FORMATS = ('text', 'json')
+
+class LogPipeline:
+
+    """ Subprocess output (ffmpeg, MediaMTX, cloudflared) on its way to stdout.
+
+    emit() never blocks the event loop. Identical consecutive lines from a source are collapsed
+    into a repeat count, and each source is rate limited by a token bucket. What remains goes
+    through a bounded queue to one writer thread, and lines are dropped (and counted) when it is
+    full. Every source also keeps a ring buffer of its recent lines, including rate-limited ones. """
+
+    def __init__(self, queue_size: int = 10000, rate_lines_per_second: float = 50.0, burst_lines: int = 200,
+                 ring_lines: int = 500, output_format: str = 'text', max_sources: int = 256, output=None,
+                 report_interval_s: float = 1.0):
+
+        if output_format not in LOG_FORMATS:
+            raise ValueError(f"Invalid log format: {output_format}")
+        if queue_size <= 0 or rate_lines_per_second <= 0 or burst_lines <= 0 or ring_lines <= 0:
+            raise ValueError("Log queue size, rate, burst and ring size must be positive")
+
+        self.rate_lines_per_second = rate_lines_per_second
+        self.burst_lines = burst_lines
+        self.ring_lines = ring_lines
+        self.output_format = output_format
+        self.max_sources = max_sources
+        self.report_interval_s = report_interval_s
+        self.stats = {"received": 0, "written": 0, "deduplicated": 0, "rate_limited": 0, "dropped": 0}
+
+        # None writes to whatever sys.stdout is when the batch is written
+        self._output = output
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._dropped_reported = 0
+
+    def _source(self, name: str, now: float) -> dict:
+
+        source = self._sources.get(name)
+        if source is None:
+            source = self._sources[name] = {
+                "tokens": float(self.burst_lines), "refilled_at": now, "last_line": None, "last_at": now,
+                "repeats": 0, "suppressed": 0, "lines": 0, "ring": deque(maxlen=self.ring_lines),
+            }
+            # Sources come and go with streams and jobs; forget the least recently active ones
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        else:
+            self._sources.move_to_end(name)
+        return source
+
+    def _take_token(self, source: dict, now: float) -> bool:
+        source["tokens"] = min(self.burst_lines, source["tokens"] + (now - source["refilled_at"]) * self.rate_lines_per_second)
+        source["refilled_at"] = now
+        if source["tokens"] < 1:
+            return False
+        source["tokens"] -= 1
+        return True
+
+    def _enqueue(self, record: tuple):
+
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._writer.start()
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _summaries(self, name: str, source: dict, now: float, idle_only: bool = False) -> list:
+
+        """ Pending "repeated" and "suppressed" notices of a source; call with the lock held """
+
+        records = []
+        if source["repeats"] and (not idle_only or now - source["last_at"] >= self.report_interval_s):
+            records.append((now, name, 'meta', f"last message repeated {source['repeats']} times"))
+            source["repeats"] = 0
+        if source["suppressed"] and self._take_token(source, now):
+            records.append((now, name, 'meta', f"{source['suppressed']} lines suppressed by rate limit"))
+            source["suppressed"] = 0
+        return records
+
+    def emit(self, name: str, line: str, fd: str = 'stdout'):
+
+        """ Hand one line of output from source `name` to the pipeline """
+
+        now = time.time()
+
+        with self._lock:
+            self.stats["received"] += 1
+            source = self._source(name, now)
+            source["lines"] += 1
+
+            if line == source["last_line"]:
+                source["repeats"] += 1
+                source["last_at"] = now
+                source["ring"][-1]["repeats"] += 1
+                self.stats["deduplicated"] += 1
+                return
+
+            for record in self._summaries(name, source, now):
+                self._enqueue(record)
+
+            source["last_line"] = line
+            source["last_at"] = now
+            source["ring"].append({"ts": now, "fd": fd, "line": line, "repeats": 0})
+
+            if not self._take_token(source, now):
+                source["suppressed"] += 1
+                self.stats["rate_limited"] += 1
+                return
+
+            self._enqueue((now, name, fd, line))
+
+    async def pump(self, reader, name: str, fd: str = 'stdout'):
+
+        """ Feed every line of an asyncio subprocess stream into the pipeline until it closes """
+
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # Longer than the stream's buffer limit; asyncio has already discarded it
+                self.emit(name, '<line over buffer limit dropped>', fd)
+                continue
+            if not line:
+                break
+            self.emit(name, line.decode(errors='ignore').rstrip(), fd)
+
+        with self._lock:
+            source = self._sources.get(name)
+            if source is not None:
+                for record in self._summaries(name, source, time.time()):
+                    self._enqueue(record)
+
+    def _format(self, record: tuple) -> str:
+        ts, name, fd, line = record
+        if self.output_format == 'json':
+            return json.dumps({"ts": round(ts, 3), "source": name, "fd": fd, "line": line}) + '\n'
+        return f"[{name}] {line}\n"
+
+    def _run(self):
+
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.report_interval_s)]
+            except queue.Empty:
+                batch = []
+
+            while len(batch) < 1024:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = None in batch
+            batch = [record for record in batch if record is not None]
+
+            now = time.time()
+            with self._lock:
+                for name, source in self._sources.items():
+                    batch.extend(self._summaries(name, source, now, idle_only=True))
+                if self.stats["dropped"] > self._dropped_reported:
+                    batch.append((now, 'logs', 'meta', f"{self.stats['dropped'] - self._dropped_reported} lines dropped, log queue full"))
+                    self._dropped_reported = self.stats["dropped"]
+
+            if batch:
+                output = self._output or sys.stdout
+                try:
+                    output.write(''.join(self._format(record) for record in batch))
+                    output.flush()
+                except (OSError, ValueError):
+                    pass
+                self.stats["written"] += len(batch)
+
+            if stopping:
+                return
+
+    def close(self, timeout: float = 5.0):
+        """Write out everything queued so far and stop the writer thread."""
+
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join(timeout=timeout)
+            self._writer = None
+
+    def sources(self) -> dict:
+
+        """ Per-source line counts and pending suppression, most recently active last """
+
+        with self._lock:
+            return {
+                name: {"lines": source["lines"], "suppressed": source["suppressed"], "last_at": source["last_at"], "buffered": len(source["ring"])}
+                for name, source in self._sources.items()
+            }
+
+    def tail(self, name: str, limit: int = 100, contains: str = None):
+
+        """ Most recent ring buffer lines of a source, oldest first, or None for an unknown source """
+
+        with self._lock:
+            source = self._sources.get(name)
+            if source is None:
+                return None
+            records = [dict(record) for record in source["ring"] if contains is None or contains in record["line"]]
+        return records[-limit:] if limit > 0 else []
@@ -1,24 +1,37 @@
+import time
+
+# Start of the startup timeline reported by /ready
+import_started_at = time.perf_counter()
+
 import asyncio
 import os
+import re
+import math
 import yaml
 import signal
+import shutil
 import sys
 import fastapi
 import uvicorn
 import uuid
 import secrets
-import requests
-import cv2
-import boto3
-import numpy as np
 import aiohttp
 
-from PIL import Image
-from ultralytics import YOLO
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
-from helpers import read_stream, find_open_port, find_open_rtp_rtcp_ports
+from fastapi.responses import JSONResponse, FileResponse
+from starlette.background import BackgroundTask
+from urllib.parse import urljoin
+from collections import OrderedDict
+from datetime import datetime
+from helpers import find_open_port, find_open_rtp_rtcp_ports
+from scratch import ScratchSpace
+from preset_tracks import PresetTrackCache
+from media_cache import MediaCache
+from log_pipeline import LogPipeline
+from profiling import JobProfile, timed
+from activity import ACTIVITY_POLICIES, ACTIVITY_SIGNALS, ACTIVITY_THRESHOLDS, activity_timeline, score_segments, read_segment_list, plan_uploads
+from state import create_state_store, run_job_worker
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,8 +40,11 @@ config_lock = asyncio.Lock()
 # Container Variables
 central_server = None
 directory_path = os.path.dirname(__file__)
-stream_mappings = {}
-processing_status = {}  
+state_store = create_state_store()
+owned_streams = set()
+job_concurrency = int(os.getenv('WORKER_JOB_CONCURRENCY', '2').strip('"'))
+job_lease_ms = int(float(os.getenv('JOB_LEASE_SECONDS', '30').strip('"')) * 1000)
+stream_owner_ttl_ms = int(float(os.getenv('STREAM_OWNER_TTL_SECONDS', '30').strip('"')) * 1000)
 preset_video_files = {
     "TextileFactory": [
         (os.path.join(directory_path, "preset", "textile1.mp4"), "Sewing-Machine-1"),
@@ -54,14 +70,164 @@ preset_video_files = {
     ]
 }
 temp_video_folder_path = os.path.join(directory_path, 'temp')
+temp_disk_budget_bytes = int(os.getenv('TEMP_DISK_BUDGET_BYTES', str(20 * 1024 ** 3)).strip('"'))
+scratch_space = ScratchSpace(temp_video_folder_path, temp_disk_budget_bytes)
+
+# Idle-segment skipping before VSS upload (off | drop | merge)
+idle_segment_policy = os.getenv('IDLE_SEGMENT_POLICY', 'off').strip('"').lower()
+activity_signal = os.getenv('ACTIVITY_SIGNAL', 'motion').strip('"').lower()
+activity_window_seconds = float(os.getenv('ACTIVITY_WINDOW_SECONDS', '10').strip('"'))
+activity_sample_fps = float(os.getenv('ACTIVITY_SAMPLE_FPS', '1').strip('"'))
+activity_threshold = float(os.getenv('ACTIVITY_THRESHOLD', str(ACTIVITY_THRESHOLDS.get(activity_signal, 0))).strip('"'))
+# Person counting only needs a coarse pass; the sampled frames are 640x360
+activity_person_imgsz = int(os.getenv('ACTIVITY_PERSON_IMGSZ', '640').strip('"'))
+idle_min_run_seconds = float(os.getenv('IDLE_MIN_RUN_SECONDS', '60').strip('"'))
+
+if idle_segment_policy not in ACTIVITY_POLICIES:
+    raise ValueError(f"Invalid IDLE_SEGMENT_POLICY: {idle_segment_policy}")
+if activity_signal not in ACTIVITY_SIGNALS:
+    raise ValueError(f"Invalid ACTIVITY_SIGNAL: {activity_signal}")
+
+# Detections of the looping preset videos, computed once and replayed by loop position
+preset_video_paths = {video_name: video_file_path for file_urls in preset_video_files.values() for video_file_path, video_name in file_urls}
+# Off by default: the first load of a preset stream would otherwise run the full model over every video on this node
+preset_tracks_enabled = os.getenv('PRESET_DETECTION_TRACKS', 'false').strip('"').lower() == 'true'
+preset_track_cache = PresetTrackCache(
+    os.getenv('PRESET_TRACKS_DIR', os.path.join(directory_path, 'preset', 'tracks')).strip('"'), lambda: load_cv_pipeline(),
+    failure_ttl_s=float(os.getenv('PRESET_TRACKS_FAILURE_TTL_SECONDS', '300').strip('"')),
+)
 
-# API Setup
-s3_client = boto3.client('s3',
-    region_name=os.getenv('AWS_REGION', '').strip('"'),
-    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', '').strip('"'),
-    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', '').strip('"')
+# Clips and thumbnails cut from stored videos, kept in a size-bounded LRU disk cache
+media_cache_budget_bytes = int(os.getenv('MEDIA_CACHE_BUDGET_BYTES', str(2 * 1024 ** 3)).strip('"'))
+media_cache = MediaCache(os.getenv('MEDIA_CACHE_DIR', os.path.join(directory_path, 'media_cache')).strip('"'), media_cache_budget_bytes)
+clip_max_seconds = float(os.getenv('CLIP_MAX_SECONDS', '120').strip('"'))
+
+# Version of each S3 key /clip and /thumbnail read, so cache hits do not wait on a HEAD request;
+# an overwritten key is picked up once its entry is older than the TTL
+s3_versions = OrderedDict()
+s3_versions_max_entries = 1024
+s3_version_ttl_seconds = float(os.getenv('S3_VERSION_TTL_SECONDS', '30').strip('"'))
+
+# Per-job profiles (stage timers and sampled stacks), requested with "profile": true on /add_stream once PROFILING_ENABLED is set
+profiling_enabled = os.getenv('PROFILING_ENABLED', 'false').strip('"').lower() == 'true'
+profile_dir = os.getenv('PROFILE_DIR', os.path.join(directory_path, 'profiles')).strip('"')
+profile_sample_interval_s = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5').strip('"')) / 1000
+profile_max_count = int(os.getenv('PROFILE_MAX_COUNT', '50').strip('"'))
+
+# Readiness: MediaMTX answering on its API port, the tunnel URL captured, and each preset path published
+mediamtx_api_address = os.getenv('MEDIAMTX_API_ADDRESS', '127.0.0.1:9997').strip('"')
+mediamtx_ready_timeout_seconds = float(os.getenv('MEDIAMTX_READY_TIMEOUT_SECONDS', '30').strip('"'))
+tunnel_ready_timeout_seconds = float(os.getenv('TUNNEL_READY_TIMEOUT_SECONDS', '60').strip('"'))
+stream_ready_timeout_seconds = float(os.getenv('STREAM_READY_TIMEOUT_SECONDS', '10').strip('"'))
+startup_timings = {}
+
+# Subprocess output goes through a bounded, rate-limited queue instead of synchronous prints
+log_pipeline = LogPipeline(
+    queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000').strip('"')),
+    rate_lines_per_second=float(os.getenv('LOG_RATE_LINES_PER_SECOND', '50').strip('"')),
+    burst_lines=int(os.getenv('LOG_BURST_LINES', '200').strip('"')),
+    ring_lines=int(os.getenv('LOG_RING_LINES', '500').strip('"')),
+    output_format=os.getenv('LOG_FORMAT', 'text').strip('"').lower(),
 )
 
+def parse_hls_renditions(spec: str) -> list:
+    """Parse an HLS ladder like "720p:1280x720:1000k,360p:640x360:400k" into renditions, highest rung first"""
+
+    renditions = []
+    for item in spec.split(','):
+        name, size, bitrate = item.strip().split(':')
+        width, height = [int(value) for value in size.lower().split('x')]
+        renditions.append({"name": name, "width": width, "height": height, "bitrate_k": int(bitrate.lower().rstrip('k'))})
+
+    if not renditions:
+        raise ValueError(f"Invalid HLS rendition ladder: {spec}")
+
+    return sorted(renditions, key=lambda rendition: rendition["height"], reverse=True)
+
+hls_renditions = parse_hls_renditions(os.getenv('HLS_RENDITIONS', '720p:1280x720:1000k,360p:640x360:400k').strip('"'))
+
+# MediaMTX's HLS server: the tunnel forwards to it, and the master playlist reads this node's playlists from it directly
+mediamtx_hls_url = 'http://localhost:8888'
+
+def build_ladder_ffmpeg_args(renditions: list, outputs: list) -> list:
+
+    """ FFmpeg filter graph and per-output encoder options for a rendition ladder.
+
+    The source is decoded and scaled to the top rung once; lower rungs are downscaled from that
+    frame instead of the source, so each extra rung only costs a small scale and encode.
+    outputs is one list of muxer arguments (format and URL/path) per rendition. """
+
+    top = renditions[0]
+    labels = [f"v{i}" for i in range(len(renditions))]
+
+    filter_graph = f"[0:v]scale={top['width']}:{top['height']},fps=30"
+    if len(renditions) == 1:
+        filter_graph += f"[{labels[0]}]"
+    else:
+        filter_graph += f",split={len(renditions)}[{labels[0]}]" + "".join(f"[{label}_in]" for label in labels[1:])
+        for rendition, label in zip(renditions[1:], labels[1:]):
+            filter_graph += f";[{label}_in]scale={rendition['width']}:{rendition['height']}[{label}]"
+
+    ffmpeg_args = ['-filter_complex', filter_graph]
+
+    for i, (rendition, label, output) in enumerate(zip(renditions, labels, outputs)):
+        bitrate_k = rendition['bitrate_k']
+        ffmpeg_args += [
+            '-map', f'[{label}]',
+            '-map', '0:a?',                                 # Audio is optional in preset files
+            '-vsync', 'cfr',                                # Constant frame rate (FFmpeg 4.x compatible)
+            '-c:v', 'libx264',                              # Video codec (Section 5.4)
+
+            # --- libx264 Options (Section 9.19.2 of ffmpeg-codecs) ---
+            '-preset', 'ultrafast',                         # Encoding preset (9.19.2)
+            '-tune', 'zerolatency',                         # Tuning for low latency (9.19.2)
+            '-profile:v', 'baseline',                       # Profile restrictions (9.19.2)
+            '-level', '3.1',                                # Level (9.19.2)
+            '-g', '30',                                     # GOP size (9.19.2: g/keyint)
+            '-keyint_min', '30',                            # Min GOP size (9.19.2)
+            '-bf', '0',                                     # No B-frames for low latency (9.19.2)
+            '-x264-params', 'scenecut=0',                   # Disable scene change detection
+
+            # --- Codec Options (Section 2 of ffmpeg-codecs) ---
+            '-b:v', f'{bitrate_k}k',                        # Video bitrate (Section 2: b)
+            '-maxrate', f'{int(bitrate_k * 1.2)}k',         # Max bitrate (Section 2: maxrate)
+            '-bufsize', f'{bitrate_k * 2}k',                # Buffer size (Section 2: bufsize)
+            '-pix_fmt', 'yuv420p',                          # Pixel format (Section 5.6)
+
+            # --- Audio Output Options (Section 5.7/8.1 of ffmpeg-codecs) ---
+            '-c:a', 'aac',                                  # AAC encoder (Section 8.1)
+            '-b:a', '96k' if i == 0 else '64k',             # Lower rungs get cheaper audio
+            '-ar', '44100',                                 # Sample rate (Section 5.7)
+            '-ac', '2',                                     # Channels (Section 5.7)
+        ] + output
+
+    return ffmpeg_args
+
+# API Setup
+s3_client = None
+
+def get_s3_client():
+
+    """ S3 client, created on first use so importing boto3 stays off the startup path """
+
+    global s3_client
+
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client('s3',
+            region_name=os.getenv('AWS_REGION', '').strip('"'),
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', '').strip('"'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', '').strip('"')
+        )
+
+    return s3_client
+
+def load_cv_pipeline():
+    """Build a PPE_CV_PIPELINE, importing ultralytics and cv2 only when CV work actually runs."""
+
+    from cv_pipeline import PPE_CV_PIPELINE
+    return PPE_CV_PIPELINE()
+
 class RemuxServer:
 
     def __init__(self, config_path: str):
@@ -91,6 +257,67 @@ class RemuxServer:
         self.hls_public_url = None
         self._shutdown = False
 
+        self.api_url = f"http://{mediamtx_api_address}"
+        self.mediamtx_ready = asyncio.Event()
+        self.tunnel_ready = asyncio.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.mediamtx_ready.is_set() and self.tunnel_ready.is_set()
+
+    async def wait_ready(self, timeout: float) -> bool:
+
+        """ Wait up to timeout seconds for MediaMTX and the tunnel, returning whether both are up """
+
+        try:
+            await asyncio.wait_for(asyncio.gather(self.mediamtx_ready.wait(), self.tunnel_ready.wait()), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    async def _api_get(self, path: str):
+
+        """ GET a MediaMTX control API path, returning (status, JSON body) or (None, None) when it is not listening """
+
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+                async with session.get(f"{self.api_url}{path}") as response:
+                    return response.status, (await response.json() if response.status == 200 else None)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None, None
+
+    async def path_ready_at(self, path_name: str):
+        """Wall clock time a MediaMTX path was first published, or None while it has no publisher."""
+
+        status, body = await self._api_get(f"/v3/paths/get/{path_name}")
+        if status != 200 or not body.get('ready'):
+            return None
+        try:
+            return datetime.fromisoformat(body['readyTime'].replace('Z', '+00:00')).timestamp()
+        except (KeyError, TypeError, ValueError):
+            # Older MediaMTX versions do not report readyTime; the poll is within 0.1s of it
+            return time.time()
+
+    async def _wait_for_mediamtx(self):
+
+        """ Poll the MediaMTX API until it answers; its listeners are up once it does """
+
+        deadline = time.monotonic() + mediamtx_ready_timeout_seconds
+
+        while True:
+            if self.mediamtx_process.returncode is not None:
+                raise Exception(f"MediaMTX exited with code {self.mediamtx_process.returncode} during startup")
+            status, _ = await self._api_get("/v3/paths/list")
+            if status == 200:
+                break
+            if time.monotonic() > deadline:
+                raise Exception(f"MediaMTX API did not answer on {self.api_url} within {mediamtx_ready_timeout_seconds}s")
+            await asyncio.sleep(0.05)
+
+        startup_timings['mediamtx_ready_s'] = time.perf_counter() - import_started_at
+        self.mediamtx_ready.set()
+        print(f"[SERVER] MediaMTX ready after {startup_timings['mediamtx_ready_s']:.2f}s")
+
     async def _start_cloudflare_tunnel(self):
 
         """ Initiate a Cloudflare tunnel into container for reverse SSH tunneling """
@@ -98,7 +325,7 @@ class RemuxServer:
         self.cloudflared_process = await asyncio.create_subprocess_exec(
             "cloudflared",
             "tunnel",
-            "--url", "http://localhost:8888",
+            "--url", mediamtx_hls_url,
             "--no-autoupdate",
             "--no-tls-verify",
             stdout=asyncio.subprocess.PIPE,
@@ -110,7 +337,7 @@ class RemuxServer:
             if not line:
                 break
             line_str = line.decode('utf-8').strip()
-            print(f"[cloudflared] {line_str}") # Print logs for debugging
+            log_pipeline.emit('cloudflared', line_str, 'stderr')
 
             # Use regex to find the temporary cloudflare URL
             if '.trycloudflare.com' in line_str:
@@ -123,7 +350,14 @@ class RemuxServer:
         
         if self.hls_public_url is None:
             raise Exception('Failed to capture Cloudflare URL')
-        
+
+        # Keep draining cloudflared's output so a full pipe never stalls the tunnel
+        asyncio.create_task(log_pipeline.pump(self.cloudflared_process.stdout, 'cloudflared'))
+        asyncio.create_task(log_pipeline.pump(self.cloudflared_process.stderr, 'cloudflared', 'stderr'))
+
+        startup_timings['tunnel_ready_s'] = time.perf_counter() - import_started_at
+        self.tunnel_ready.set()
+
     async def start(self):
 
         """ Launches MediaMTX remuxing server """
@@ -139,6 +373,8 @@ class RemuxServer:
                 'hlsSegmentMaxSize': '50M',      # Max segment size
                 'hlsAllowOrigin': '*',           # Allow CORS
                 'hlsAlwaysRemux': True,          # Keep HLS muxer alive even with no clients (prevents gap.mp4)
+                'api': True,                     # Control API, polled for readiness instead of sleeping
+                'apiAddress': mediamtx_api_address,
                 'paths': {},
             }
 
@@ -152,14 +388,27 @@ class RemuxServer:
                 stderr=asyncio.subprocess.PIPE,
             )
 
-            asyncio.create_task(read_stream(self.mediamtx_process.stdout, '[MEDIAMTX]'))
-            asyncio.create_task(read_stream(self.mediamtx_process.stderr, '[MEDIAMTX]'))
-
-            await asyncio.sleep(2)
+            asyncio.create_task(log_pipeline.pump(self.mediamtx_process.stdout, 'mediamtx'))
+            asyncio.create_task(log_pipeline.pump(self.mediamtx_process.stderr, 'mediamtx', 'stderr'))
 
             print('[SERVER] Opening Cloudflare tunnel...')
 
-            await self._start_cloudflare_tunnel()
+            # The tunnel only forwards to the HLS port, so it can come up while MediaMTX is still starting.
+            # If either fails, the other is cancelled rather than left running in the background.
+            startup_tasks = [
+                asyncio.create_task(self._wait_for_mediamtx()),
+                asyncio.create_task(asyncio.wait_for(self._start_cloudflare_tunnel(), timeout=tunnel_ready_timeout_seconds)),
+            ]
+            try:
+                done, pending = await asyncio.wait(startup_tasks, return_when=asyncio.FIRST_EXCEPTION)
+            finally:
+                for task in startup_tasks:
+                    task.cancel()
+                await asyncio.gather(*startup_tasks, return_exceptions=True)
+
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
 
         print("[SERVER] MediaMTX remuxing server started with Cloudflare tunnel: ", self.hls_public_url)
 
@@ -187,7 +436,9 @@ class RemuxServer:
                 self.mediamtx_process.kill()
             except Exception as e:
                 print(f"[SERVER] Error cleaning up mediamtx: {e}")
-        
+
+        media_playlists.clear()
+        log_pipeline.close()
         print("[SERVER] Cleanup complete")
 
     def signal_handler(self, signum, frame):
@@ -197,9 +448,9 @@ class RemuxServer:
         print(f"\n[SERVER] Received signal {signum}, shutting down...")
         asyncio.create_task(self.cleanup())
 
-    async def add_stream(self, public_rtsp_url: str, stream_name: str):
+    async def add_stream(self, public_rtsp_url: str, stream_name: str, variant_paths: list = None):
 
-        """ Given public video URL, add it to the MediaMTX config """
+        """ Given public video URL, add it to the MediaMTX config, along with any lower-rung variant paths """
 
         print(f"[SERVER] Adding stream {stream_name} with public URL {public_rtsp_url}")
 
@@ -216,6 +467,13 @@ class RemuxServer:
                 'rtspTransport': 'tcp',
             }
 
+            for variant_path in variant_paths or []:
+                if variant_path != stream_name:
+                    config['paths'][variant_path] = {
+                        'source': public_rtsp_url,
+                        'rtspTransport': 'tcp',
+                    }
+
             with open(self.config_path, 'w') as f:
                 yaml.dump(config, f)
 
@@ -233,9 +491,10 @@ class RemuxServer:
 
 class RTSPStreamManager:
 
-    def __init__(self, video_file_path: str, stream_name: str = None):
+    def __init__(self, video_file_path: str, stream_name: str = None, renditions: list = None):
 
         self.video_file_path = video_file_path
+        self.renditions = renditions or hls_renditions
         self.local_rtsp_port = find_open_port()
         self.local_udp_rtp_port, self.local_udp_rtcp_port = find_open_rtp_rtcp_ports()
 
@@ -246,7 +505,14 @@ class RTSPStreamManager:
         
         self.config_path = f"mediamtx_cam_{self.serial_number}.yml"
 
+        # The top rung keeps the plain stream path so existing HLS URLs are unchanged
+        self.variant_paths = {
+            rendition['name']: self.serial_number if i == 0 else f"{self.serial_number}_{rendition['name']}"
+            for i, rendition in enumerate(self.renditions)
+        }
+
         self.rtsp_url = None
+        self.started_at = None
         
         self.mediamtx_process = None
         self.ffmpeg_process = None
@@ -254,14 +520,20 @@ class RTSPStreamManager:
 
         print(f"Initialized RTSP Stream Manager with ports: {self.local_rtsp_port}, {self.local_udp_rtp_port}, and {self.local_udp_rtcp_port} ")
 
-    async def _log_stream(self, stream, prefix):
-        """Helper function to read and print stream output."""
-        while True:
-            chunk = await stream.read(1024)
-            if chunk:
-                print(f"{prefix} {chunk.decode(errors='ignore').rstrip()}")
-            else:
-                break
+    def variant_urls(self, hls_public_url: str) -> list:
+
+        """ Public HLS URL and encoding of every rendition of this stream, highest rung first """
+
+        return [
+            {
+                "name": rendition['name'],
+                "url": f"{hls_public_url}/{self.variant_paths[rendition['name']]}/index.m3u8",
+                "width": rendition['width'],
+                "height": rendition['height'],
+                "bandwidth": (rendition['bitrate_k'] + (96 if i == 0 else 64)) * 1000,
+            }
+            for i, rendition in enumerate(self.renditions)
+        ]
 
     async def start(self):
 
@@ -282,39 +554,11 @@ class RTSPStreamManager:
                 '-stream_loop', '-1',                    # Loop input infinitely
                 '-i', self.video_file_path,
 
-                # --- Video Output Options ---
-                '-vf', 'scale=1280:720',                 # Scale filter (Section 3.3.1)
-                '-r', '30',                              # Output frame rate (Section 5.5)
-                '-vsync', 'cfr',                         # Constant frame rate (FFmpeg 4.x compatible)
-                '-c:v', 'libx264',                       # Video codec (Section 5.4)
-
-                # --- libx264 Options (Section 9.19.2 of ffmpeg-codecs) ---
-                '-preset', 'ultrafast',                  # Encoding preset (9.19.2)
-                '-tune', 'zerolatency',                  # Tuning for low latency (9.19.2)
-                '-profile:v', 'baseline',                # Profile restrictions (9.19.2)
-                '-level', '3.1',                         # Level (9.19.2)
-                '-g', '30',                              # GOP size (9.19.2: g/keyint)
-                '-keyint_min', '30',                     # Min GOP size (9.19.2)
-                '-bf', '0',                              # No B-frames for low latency (9.19.2)
-
-                # --- x264-params for x264-specific options (9.19.2) ---
-                '-x264-params', 'scenecut=0',            # Disable scene change detection
-
-                # --- Codec Options (Section 2 of ffmpeg-codecs) ---
-                '-b:v', '1000k',                         # Video bitrate (Section 2: b)
-                '-maxrate', '1200k',                     # Max bitrate (Section 2: maxrate)
-                '-bufsize', '2000k',                     # Buffer size (Section 2: bufsize)
-                '-pix_fmt', 'yuv420p',                   # Pixel format (Section 5.6)
-
-                # --- Audio Output Options (Section 5.7/8.1 of ffmpeg-codecs) ---
-                '-c:a', 'aac',                           # AAC encoder (Section 8.1)
-                '-b:a', '96k',                           # Audio bitrate (Section 8.1.1)
-                '-ar', '44100',                          # Sample rate (Section 5.7)
-                '-ac', '2',                              # Channels (Section 5.7)
-
-                # --- Output (Section 5.4) ---
-                '-f', 'rtsp',
-                mediamtx_url
+                # --- Rendition ladder, one RTSP output per rung ---
+                *build_ladder_ffmpeg_args(self.renditions, [
+                    ['-f', 'rtsp', f"rtsp://127.0.0.1:8554/{self.variant_paths[rendition['name']]}"]
+                    for rendition in self.renditions
+                ]),
             ]
 
             self.ffmpeg_process = await asyncio.create_subprocess_exec(
@@ -324,14 +568,29 @@ class RTSPStreamManager:
                 limit=1024 * 1024  # 1 MB buffer limit
             )
 
-            asyncio.create_task(self._log_stream(self.ffmpeg_process.stdout, '[FFMPEG]'))
-            asyncio.create_task(self._log_stream(self.ffmpeg_process.stderr, '[FFMPEG]'))
+            # Until the path is published, the spawn time stands in for when loop position 0 went out
+            self.started_at = time.time()
 
-            await asyncio.sleep(2)
+            asyncio.create_task(log_pipeline.pump(self.ffmpeg_process.stdout, f'ffmpeg/{self.serial_number}'))
+            asyncio.create_task(log_pipeline.pump(self.ffmpeg_process.stderr, f'ffmpeg/{self.serial_number}', 'stderr'))
+
+            # Ready as soon as MediaMTX reports the top rung published, rather than after a fixed delay
+            deadline = time.monotonic() + stream_ready_timeout_seconds
+            while self.ffmpeg_process.returncode is None:
+                ready_at = await central_server.path_ready_at(self.serial_number) if central_server is not None else None
+                if ready_at is not None:
+                    # Wall clock time of loop position 0, so any node can map "now" to a frame of the file (-re keeps real time).
+                    # Taken from MediaMTX rather than the spawn, so ffmpeg's probing and connect time do not offset every loop
+                    self.started_at = ready_at
+                    break
+                if time.monotonic() > deadline:
+                    print(f"[FFMPEG] {self.serial_number} not published after {stream_ready_timeout_seconds}s, continuing")
+                    break
+                await asyncio.sleep(0.1)
 
             if self.ffmpeg_process.returncode is not None:
                 print(f"FFmpeg process exited prematurely with code: {self.ffmpeg_process.returncode}")
-                print("Check the [FFMPEG_ERROR] logs above for the reason.")
+                print(f"Check GET /logs?source=ffmpeg/{self.serial_number} for the reason.")
                 return
 
             self.rtsp_url = mediamtx_url
@@ -346,6 +605,10 @@ class RTSPStreamManager:
 
         """ Clean up subprocesses """
 
+        if central_server is not None and central_server.hls_public_url:
+            for variant in self.variant_urls(central_server.hls_public_url):
+                media_playlists.pop(variant['url'], None)
+
         if self.ffmpeg_process:
             self.ffmpeg_process.terminate()
             try:
@@ -355,74 +618,6 @@ class RTSPStreamManager:
                 await self.ffmpeg_process.wait()
             self.ffmpeg_process = None
 
-class PPE_CV_PIPELINE:
-
-    def __init__(self):
-
-        self.model_path = os.path.join(directory_path, "cv_model_best.pt")
-
-        if not os.path.exists(self.model_path):
-            raise FileNotFoundError(f"Model file not found: {self.model_path}")
-
-        self.model = YOLO(self.model_path)
-
-    def _draw_boxes(self, frame, results) -> np.ndarray:
-
-        results_list = results[0]
-
-        for box in results_list.boxes:
-            x1, y1, x2, y2 = [int(coord) for coord in box.xyxy[0]]
-            confidence = float(box.conf[0])
-            class_id = int(box.cls[0])
-            class_name = self.model.model.names[class_id]
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(frame, f"{class_name}: {confidence:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-        return frame
-
-
-    def _analyze_image(self, image_frame: np.ndarray):
-
-        results = self.model.predict(image_frame, conf=0.4, iou=0.45, max_det=1000, device=0)
-        frame = self._draw_boxes(image_frame, results)
-        return frame
-
-    def analyze_video(self, video_source: str):
-        
-        if os.path.exists(video_source):
-            
-            video_source_basename = video_source[:-4]
-            video_capture = cv2.VideoCapture(video_source)
-            new_video_source = os.path.join(os.path.dirname(video_source), f"{os.path.basename(video_source_basename)}_processed.mp4")
-
-            if not os.path.exists(new_video_source):
-                os.makedirs(os.path.dirname(new_video_source), exist_ok=True)
-
-            # Get video properties for VideoWriter
-            fps = int(video_capture.get(cv2.CAP_PROP_FPS))
-            width = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            # Initialize VideoWriter
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            video_writer = cv2.VideoWriter(new_video_source, fourcc, fps, (width, height))
-
-            while True:
-                ret, frame = video_capture.read()
-                if not ret:
-                    break
-                results = self.model.predict(frame, conf=0.25, iou=0.45, max_det=1000, device=0)
-                processed_frame = self._draw_boxes(frame, results)
-                
-                # Write frame to output video
-                video_writer.write(processed_frame)
-
-            video_capture.release()
-            video_writer.release()
-            return new_video_source
-        else:
-            raise FileNotFoundError(f"Video file not found: {video_source}")
-
 async def main():
 
     global central_server
@@ -438,11 +633,11 @@ async def main():
     try:
 
         await central_server.start()
-        
-        while central_server.hls_public_url is None:
-            await asyncio.sleep(1)
-        
+
+        startup_timings['ready_s'] = time.perf_counter() - import_started_at
         print(f"[SERVER] Server ready! Cloudflare tunnel: {central_server.hls_public_url}")
+        print(f"[SERVER] Startup: imports {startup_timings['imports_s']:.2f}s, MediaMTX {startup_timings['mediamtx_ready_s']:.2f}s, "
+              f"tunnel {startup_timings['tunnel_ready_s']:.2f}s, ready {startup_timings['ready_s']:.2f}s")
 
         # Keep the server running
         while not central_server._shutdown:
@@ -458,37 +653,69 @@ async def main():
 async def load_stream(request: fastapi.Request):
     global central_server
 
-    if central_server is None:
+    # The API is served while MediaMTX and the tunnel are still starting; hold early requests briefly
+    if central_server is None or not await central_server.wait_ready(mediamtx_ready_timeout_seconds):
         return fastapi.Response(status_code=503, content="Server not initialized yet")
 
     data = await request.json()
 
     stream_name, public_file_url = data.get('stream_name'), data.get('public_file_url')
 
-    if stream_name in stream_mappings:
-        return JSONResponse(status_code=200, content=stream_mappings[stream_name])
+    existing_stream = await state_store.get_stream(stream_name)
+    if existing_stream is not None:
+        return JSONResponse(status_code=200, content=jsonable_encoder(existing_stream['urls']))
 
     if stream_name in preset_video_files:
 
+        # Only one node runs a preset's encoders; the others serve its URLs from the registry
+        if not await state_store.claim_stream(stream_name, stream_owner_ttl_ms):
+            print(f"[SERVER] Stream {stream_name} is being started by node {await state_store.get_stream_owner(stream_name)}")
+            return JSONResponse(status_code=200, content=[])
+
+        owned_streams.add(stream_name)
+
         file_urls = preset_video_files[stream_name]
+        stream_urls = []
+        stream_variants = {}
+        stream_started_at = {}
+        stream_managers = []
 
-        if not stream_name in stream_mappings:
-            stream_mappings[stream_name] = []
+        try:
 
-        for video_file_path, video_name in file_urls:
-            print(f"[SERVER] Adding stream {stream_name} with video file path {video_name}")
-            local_rtsp = RTSPStreamManager(video_file_path=video_file_path, stream_name=video_name)
+            for video_file_path, video_name in file_urls:
+                print(f"[SERVER] Adding stream {stream_name} with video file path {video_name}")
+                local_rtsp = RTSPStreamManager(video_file_path=video_file_path, stream_name=video_name)
 
-            await central_server.add_stream(local_rtsp.rtsp_url, video_name)
-            await local_rtsp.start()
-            
-            stream_mappings[stream_name].append(f'{central_server.hls_public_url}/{video_name}/index.m3u8')
+                await central_server.add_stream(local_rtsp.rtsp_url, video_name, variant_paths=list(local_rtsp.variant_paths.values()))
+                stream_managers.append(local_rtsp)
+
+            # Start every encoder at once, so the per-video readiness waits overlap instead of adding up,
+            # and every start has finished before any failure is handled, so none is left spawning ffmpeg
+            for result in await asyncio.gather(*[local_rtsp.start() for local_rtsp in stream_managers], return_exceptions=True):
+                if isinstance(result, Exception):
+                    raise result
+
+            for (video_file_path, video_name), local_rtsp in zip(file_urls, stream_managers):
+                stream_urls.append(f'{central_server.hls_public_url}/{video_name}/index.m3u8')
+                stream_variants[video_name] = local_rtsp.variant_urls(central_server.hls_public_url)
+                stream_started_at[video_name] = local_rtsp.started_at
+
+                if preset_tracks_enabled:
+                    asyncio.create_task(build_preset_tracks(video_file_path, video_name))
         
-        print(f"[SERVER] Stream mappings: {stream_mappings}")
+            print(f"[SERVER] Stream mappings for {stream_name}: {stream_urls}")
+
+            await state_store.set_stream(stream_name, stream_urls, variants=stream_variants, started_at=stream_started_at)
 
-        stream_mappings[stream_name] = jsonable_encoder(stream_mappings[stream_name])
+        except Exception as e:
+            # Without this the renew loop would keep the claim alive with nothing registered, wedging the preset
+            print(f"[SERVER] Error starting stream {stream_name}: {e}")
+            owned_streams.discard(stream_name)
+            await asyncio.gather(*[local_rtsp.cleanup() for local_rtsp in stream_managers], return_exceptions=True)
+            await state_store.release_stream(stream_name)
+            return JSONResponse(status_code=500, content={"error": str(e)})
 
-        return JSONResponse(status_code=200, content=stream_mappings[stream_name])
+        return JSONResponse(status_code=200, content=jsonable_encoder(stream_urls))
 
     else: 
 
@@ -504,10 +731,275 @@ async def get_stream(request: fastapi.Request):
     data = await request.json()
     stream_name = data.get('stream_name')
 
-    if stream_name not in stream_mappings:
+    existing_stream = await state_store.get_stream(stream_name)
+
+    if existing_stream is None:
         return JSONResponse(status_code=200, content=jsonable_encoder([]))
     
-    return JSONResponse(status_code=200, content=jsonable_encoder(stream_mappings[stream_name]))
+    return JSONResponse(status_code=200, content=jsonable_encoder(existing_stream['urls']))
+
+async def get_stream_variants(request: fastapi.Request):
+    """Every rendition of each video in a stream, so clients can pick a rung per tile size"""
+
+    data = await request.json()
+    stream_name = data.get('stream_name')
+
+    existing_stream = await state_store.get_stream(stream_name)
+
+    if existing_stream is None:
+        return JSONResponse(status_code=200, content=jsonable_encoder({}))
+
+    return JSONResponse(status_code=200, content=jsonable_encoder(existing_stream.get('variants', {})))
+
+# Media playlist URL and codecs behind each rendition's index.m3u8, least recently used first
+media_playlists = OrderedDict()
+media_playlists_max_entries = 256
+
+def _codecs_attribute(stream_inf: str):
+    """CODECS value of an #EXT-X-STREAM-INF line, or None if it has none"""
+    match = re.search(r'CODECS="([^"]*)"', stream_inf)
+    return match.group(1) if match else None
+
+async def _media_playlist(index_url: str) -> dict:
+    """MediaMTX serves index.m3u8 as a multivariant playlist; resolve the media playlist it points to and the codecs it declares"""
+
+    if index_url in media_playlists:
+        media_playlists.move_to_end(index_url)
+        return media_playlists[index_url]
+
+    # Playlists of streams this node runs are read from MediaMTX directly instead of through the tunnel
+    fetch_url = index_url
+    if central_server is not None and central_server.hls_public_url and index_url.startswith(central_server.hls_public_url + '/'):
+        fetch_url = mediamtx_hls_url + index_url[len(central_server.hls_public_url):]
+
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(fetch_url) as response:
+            response.raise_for_status()
+            playlist = await response.text()
+
+    media = {"url": index_url, "codecs": None}
+    if '#EXT-X-STREAM-INF' in playlist:
+        lines = playlist.splitlines()
+        for i, line in enumerate(lines):
+            if line.startswith('#EXT-X-STREAM-INF') and i + 1 < len(lines):
+                # Resolved against the public URL, which is what players fetch
+                media = {"url": urljoin(index_url, lines[i + 1].strip()), "codecs": _codecs_attribute(line)}
+                break
+
+    media_playlists[index_url] = media
+    while len(media_playlists) > media_playlists_max_entries:
+        media_playlists.popitem(last=False)
+    return media
+
+async def get_master_playlist(stream_name: str, video_name: str):
+    """Multivariant HLS playlist over a video's renditions, for players with adaptive bitrate (hls.js)"""
+
+    existing_stream = await state_store.get_stream(stream_name)
+    variants = (existing_stream or {}).get('variants', {}).get(video_name)
+
+    if not variants:
+        return fastapi.Response(status_code=404, content="Stream not found")
+
+    playlist = ['#EXTM3U', '#EXT-X-INDEPENDENT-SEGMENTS']
+    for variant in variants:
+        try:
+            media = await _media_playlist(variant['url'])
+        except Exception as e:
+            print(f"[SERVER] Skipping variant {variant['url']}: {e}")
+            continue
+        # Only the codecs MediaMTX reports for the rendition, so a video-only rendition declares no audio
+        codecs = f',CODECS="{media["codecs"]}"' if media['codecs'] else ''
+        playlist.append(f'#EXT-X-STREAM-INF:BANDWIDTH={variant["bandwidth"]},RESOLUTION={variant["width"]}x{variant["height"]}{codecs}')
+        playlist.append(media['url'])
+
+    return fastapi.Response(content='\n'.join(playlist) + '\n', media_type='application/vnd.apple.mpegurl')
+
+async def build_preset_tracks(video_file_path: str, video_name: str):
+    try:
+        await preset_track_cache.ensure(video_file_path, video_name)
+    except Exception as e:
+        print(f"[TRACKS] Error building detection tracks for {video_name}: {e}")
+
+async def get_stream_detections(request: fastapi.Request):
+    """PPE detections on the frame a preset video is showing, replayed from its precomputed tracks.
+
+    The frame is the one at the client's `position_s` in the loop, or at its `program_date_time`
+    (the EXT-X-PROGRAM-DATE-TIME of the frame on screen), and otherwise the live edge by wall clock."""
+
+    data = await request.json()
+    stream_name, video_name = data.get('stream_name'), data.get('video_name')
+
+    existing_stream = await state_store.get_stream(stream_name)
+    started_at = (existing_stream or {}).get('started_at', {}).get(video_name)
+
+    if started_at is None or video_name not in preset_video_paths:
+        return fastapi.Response(status_code=404, content="Stream not found")
+
+    if not preset_tracks_enabled:
+        return fastapi.Response(status_code=404, content="Preset detection tracks are disabled")
+
+    try:
+        if data.get('position_s') is not None:
+            position_s = float(data['position_s'])
+        elif data.get('program_date_time'):
+            position_s = datetime.fromisoformat(data['program_date_time'].replace('Z', '+00:00')).timestamp() - started_at
+        else:
+            position_s = time.time() - started_at
+    except (TypeError, ValueError):
+        return fastapi.Response(status_code=400, content="Invalid position_s or program_date_time")
+
+    tracks = preset_track_cache.get(video_name)
+    if tracks is None:
+        failure = preset_track_cache.failure(video_name)
+        if failure is not None:
+            return JSONResponse(
+                status_code=503, headers={"Retry-After": str(math.ceil(failure['retry_after_s']))},
+                content={"status": "failed", "error": failure['error'], "retry_after_s": failure['retry_after_s']},
+            )
+        if not preset_track_cache.building(video_name):
+            asyncio.create_task(build_preset_tracks(preset_video_paths[video_name], video_name))
+        return JSONResponse(status_code=202, content={"status": "building"})
+
+    lookup_started_at = time.perf_counter()
+    frame_index, boxes, scores, class_ids = tracks.at(position_s)
+    lookup_ms = (time.perf_counter() - lookup_started_at) * 1000
+
+    return JSONResponse(status_code=200, content={
+        "video_name": video_name,
+        "position_s": position_s % tracks.duration,
+        "frame_index": frame_index,
+        "fps": tracks.fps,
+        "detections": [
+            {"box": [float(v) for v in box], "score": float(score), "class_name": tracks.class_names.get(int(class_id), str(class_id))}
+            for box, score, class_id in zip(boxes, scores, class_ids)
+        ],
+        "build_seconds": tracks.meta.get('build_seconds'),
+        "lookup_ms": lookup_ms,
+    })
+
+async def _media_source(s3_video_key: str = None, video_name: str = None):
+    """Cache key prefix and a function returning what ffmpeg reads: a preset file, or a presigned S3 URL it seeks with range requests"""
+
+    if video_name:
+        if video_name not in preset_video_paths:
+            return None, None
+        return f"preset:{video_name}", lambda: preset_video_paths[video_name]
+
+    if s3_video_key:
+        s3_bucket = os.getenv('AWS_SOURCE_S3_BUCKET', '').strip('"')
+        cached = s3_versions.get((s3_bucket, s3_video_key))
+        if cached is not None and cached[0] > time.monotonic():
+            s3_versions.move_to_end((s3_bucket, s3_video_key))
+            s3_object = cached[1]
+        else:
+            try:
+                s3_object = await asyncio.get_event_loop().run_in_executor(None, lambda: get_s3_client().head_object(Bucket=s3_bucket, Key=s3_video_key))
+            except Exception as e:
+                if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                    return None, None
+                raise
+            s3_versions[(s3_bucket, s3_video_key)] = (time.monotonic() + s3_version_ttl_seconds, s3_object)
+            while len(s3_versions) > s3_versions_max_entries:
+                s3_versions.popitem(last=False)
+
+        # Keyed on the object's version so an overwritten key never serves clips of the old video
+        params = {'Bucket': s3_bucket, 'Key': s3_video_key}
+        if s3_object.get('VersionId'):
+            params['VersionId'] = s3_object['VersionId']
+        version = s3_object.get('VersionId') or s3_object.get('ETag', '').strip('"')
+        return f"s3:{s3_bucket}/{s3_video_key}@{version}", lambda: get_s3_client().generate_presigned_url('get_object', Params=params, ExpiresIn=3600)
+
+    return None, None
+
+async def _run_ffmpeg(args: list):
+
+    ffmpeg_process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await asyncio.wait_for(ffmpeg_process.communicate(), timeout=120)
+
+    if ffmpeg_process.returncode != 0:
+        raise Exception(f"FFmpeg exited with code {ffmpeg_process.returncode}: {stderr.decode(errors='ignore').strip()}")
+
+async def get_clip(start: float, duration: float = 10.0, s3_video_key: str = None, video_name: str = None):
+    """Short MP4 clip of a stored or preset video, cut with stream copy from the keyframe at or before start"""
+
+    if start < 0 or not 0 < duration <= clip_max_seconds:
+        return JSONResponse(status_code=400, content={"error": f"start must be >= 0 and duration in (0, {clip_max_seconds}]"})
+
+    try:
+        source_key, source = await _media_source(s3_video_key, video_name)
+    except Exception as e:
+        print(f"[SERVER] Error looking up {s3_video_key}: {e}")
+        return JSONResponse(status_code=502, content={"error": str(e)})
+    if source is None:
+        return JSONResponse(status_code=404, content={"error": "Video not found"})
+
+    async def cut_clip(output_path: str):
+        await _run_ffmpeg([
+            '-ss', f'{start:.3f}',                   # Input seek: lands on the keyframe at or before start
+            '-i', source(),
+            '-t', f'{duration:.3f}',
+            '-map', '0:v:0', '-map', '0:a?',
+            '-c', 'copy',                            # No re-encode, so a clip costs about as much as reading it
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart',
+            output_path,
+        ])
+
+    try:
+        clip_path, outcome = await media_cache.get(f"clip|{source_key}|{start:.3f}|{duration:.3f}", 'mp4', cut_clip)
+    except Exception as e:
+        print(f"[SERVER] Error cutting clip from {source_key}: {e}")
+        return JSONResponse(status_code=502, content={"error": str(e)})
+
+    # Unpinned once the response has been sent, so the file cannot be evicted mid-download
+    return FileResponse(clip_path, media_type='video/mp4', headers={"X-Cache": outcome}, background=BackgroundTask(media_cache.release, clip_path))
+
+async def get_thumbnail(t: float, width: int = 320, s3_video_key: str = None, video_name: str = None):
+    """JPEG poster frame of a stored or preset video at t seconds"""
+
+    if t < 0 or not 16 <= width <= 1920:
+        return JSONResponse(status_code=400, content={"error": "t must be >= 0 and width in [16, 1920]"})
+
+    try:
+        source_key, source = await _media_source(s3_video_key, video_name)
+    except Exception as e:
+        print(f"[SERVER] Error looking up {s3_video_key}: {e}")
+        return JSONResponse(status_code=502, content={"error": str(e)})
+    if source is None:
+        return JSONResponse(status_code=404, content={"error": "Video not found"})
+
+    async def extract_thumbnail(output_path: str):
+        await _run_ffmpeg([
+            '-ss', f'{t:.3f}',
+            '-i', source(),
+            '-frames:v', '1',
+            '-vf', f'scale={width}:-2',
+            '-q:v', '3',
+            output_path,
+        ])
+
+    try:
+        thumbnail_path, outcome = await media_cache.get(f"thumbnail|{source_key}|{t:.3f}|{width}", 'jpg', extract_thumbnail)
+    except Exception as e:
+        print(f"[SERVER] Error extracting thumbnail from {source_key}: {e}")
+        return JSONResponse(status_code=502, content={"error": str(e)})
+
+    return FileResponse(thumbnail_path, media_type='image/jpeg', headers={"X-Cache": outcome}, background=BackgroundTask(media_cache.release, thumbnail_path))
+
+async def renew_stream_ownership():
+    """Keep this node's claim on the preset streams whose encoders it runs"""
+
+    while True:
+        await asyncio.sleep(stream_owner_ttl_ms / 3000)
+        try:
+            await state_store.renew_streams(owned_streams, stream_owner_ttl_ms)
+        except Exception as e:
+            print(f"[SERVER] Error renewing stream ownership: {e}")
 
 async def _upload_chunk(chunk_file_path: str):
     """Upload a single chunk file to NVIDIA VSS asynchronously"""
@@ -571,86 +1063,128 @@ async def add_stream(request: fastapi.Request):
     data = await request.json()
     stream_name = data.get('stream_name')
     s3_video_key = data.get('s3_video_key')
+    # Ignored unless profiling is enabled on this deployment
+    profile = bool(data.get('profile', False)) and profiling_enabled
 
     if not stream_name or not s3_video_key:
         return JSONResponse(status_code=400, content=jsonable_encoder({"error": "Missing stream name or S3 video URL"}))
 
-    # Start the processing task in the background
-    asyncio.create_task(process_video_background(stream_name, s3_video_key))
+    # Queue the job in the shared state store; any worker node may claim it
+    await state_store.set_status(stream_name, {
+        "status": "queued",
+        "progress": 0,
+        "message": "Waiting for a worker node...",
+        "queued_at": time.time()
+    })
+    job_id = await state_store.enqueue_job({"stream_name": stream_name, "s3_video_key": s3_video_key, "profile": profile})
+    print(f"[SERVER] Queued job {job_id} for {stream_name}")
     
     # Return immediately to avoid blocking FastAPI
     return JSONResponse(status_code=202, content=jsonable_encoder({
         "message": "Video processing started", 
         "stream_name": stream_name,
-        "status": "processing"
+        "status": "processing",
+        "profile": profile
     }))
 
-async def process_video_background(stream_name: str, s3_video_key: str):
+async def process_video_background(stream_name: str, s3_video_key: str, profile: bool = False):
     """Process video in the background without blocking FastAPI"""
+
+    job_profile = JobProfile(profile_dir, stream_name, profile_sample_interval_s, profile_max_count) if profile and profiling_enabled else None
+    timers = job_profile.timers if job_profile is not None else None
+    if job_profile is not None:
+        job_profile.start()
     
     try:
         # Initialize processing status
-        processing_status[stream_name] = {
-            "status": "downloading",
-            "progress": 0,
-            "message": "Starting video download...",
-            "started_at": asyncio.get_event_loop().time()
-        }
+        await state_store.update_status(
+            stream_name,
+            status="queued",
+            progress=0,
+            message="Waiting for scratch disk space...",
+            node_id=state_store.node_id,
+            started_at=time.time()
+        )
         
         print(f"[BACKGROUND] Starting video processing for {stream_name}")
+
+        s3_bucket = os.getenv('AWS_SOURCE_S3_BUCKET', '').strip('"')
+
+        # Reserve scratch space for the download plus its stream-copied chunks before touching disk
+        loop = asyncio.get_event_loop()
+        with timed(timers, 'head_object'):
+            s3_object = await loop.run_in_executor(None, lambda: get_s3_client().head_object(Bucket=s3_bucket, Key=s3_video_key))
+        video_size = s3_object['ContentLength']
+        # Idle skipping keeps the short activity windows on disk while it builds the upload chunks
+        reserve_bytes = (3 if idle_segment_policy != 'off' else 2) * video_size
+        print(f"[BACKGROUND] Reserving {reserve_bytes} bytes of scratch space for {stream_name}")
+
+        reserve_started_at = time.perf_counter()
+        async with scratch_space.reserve(reserve_bytes), scratch_space.workspace(stream_name) as workspace_path:
+
+            if timers is not None:
+                timers.add('scratch_wait', time.perf_counter() - reserve_started_at)
+
+            # Fetch S3 video URL
+            s3_video_url = get_s3_client().generate_presigned_url('get_object', Params={'Bucket': s3_bucket, 'Key': s3_video_key}, ExpiresIn=3600)
+            print(f"[BACKGROUND] S3 video URL: {s3_video_url}")
+
+            # Download the video file asynchronously
+            await state_store.update_status(stream_name, status="downloading", message="Downloading video from S3...")
+            with timed(timers, 'download'):
+                video_file_path = await download_video_async(s3_video_url, stream_name, output_dir=workspace_path)
+            print(f"[BACKGROUND] Downloaded video file to {video_file_path}")
+
+            # Process video with CV pipeline in thread pool to avoid blocking
+            # await state_store.update_status(stream_name, status="processing", message="Running computer vision analysis...")
+            # processed_video_file_path = await process_video_cv_async(video_file_path, timers=timers)
+            # print(f"[BACKGROUND] Processed video file to {processed_video_file_path}")
+
+            # Chunk the video file, leaving out idle stretches if configured
+            if idle_segment_policy == 'off':
+                await state_store.update_status(stream_name, status="chunking", message="Chunking video into segments...")
+                chunk_output_folder = await chunk_video_async(video_file_path, stream_name, output_dir=workspace_path, timers=timers)
+            else:
+                await state_store.update_status(stream_name, status="scoring", message="Scoring segments for activity...")
+                chunk_output_folder, activity_report = await chunk_active_video_async(video_file_path, stream_name, output_dir=workspace_path, timers=timers)
+                await state_store.update_status(stream_name, **activity_report)
+            print(f"[BACKGROUND] Chunked video into {chunk_output_folder}")
+
+            # Upload chunks to NVIDIA VSS
+            await state_store.update_status(stream_name, status="uploading", message="Uploading chunks to NVIDIA VSS...")
+            with timed(timers, 'upload'):
+                await upload_chunks_async(chunk_output_folder)
+            print(f"[BACKGROUND] Uploaded all chunks for {stream_name}")
         
-        # Fetch S3 video URL
-        s3_video_url = s3_client.generate_presigned_url('get_object', Params={'Bucket': os.getenv('AWS_SOURCE_S3_BUCKET', '').strip('"'), 'Key': s3_video_key}, ExpiresIn=3600)
-        print(f"[BACKGROUND] S3 video URL: {s3_video_url}")
-
-        # Download the video file asynchronously
-        processing_status[stream_name]["status"] = "downloading"
-        processing_status[stream_name]["message"] = "Downloading video from S3..."
-        video_file_path = await download_video_async(s3_video_url, stream_name)
-        print(f"[BACKGROUND] Downloaded video file to {video_file_path}")
-
-        # Process video with CV pipeline in thread pool to avoid blocking
-        # processing_status[stream_name]["status"] = "processing"
-        # processing_status[stream_name]["message"] = "Running computer vision analysis..."
-        # processed_video_file_path = await process_video_cv_async(video_file_path)
-        # print(f"[BACKGROUND] Processed video file to {processed_video_file_path}")
-
-        # Chunk the video file
-        processing_status[stream_name]["status"] = "chunking"
-        processing_status[stream_name]["message"] = "Chunking video into segments..."
-        chunk_output_folder = await chunk_video_async(video_file_path, stream_name)
-        print(f"[BACKGROUND] Chunked video into {chunk_output_folder}")
-
-        # Upload chunks to NVIDIA VSS
-        processing_status[stream_name]["status"] = "uploading"
-        processing_status[stream_name]["message"] = "Uploading chunks to NVIDIA VSS..."
-        await upload_chunks_async(chunk_output_folder)
-        print(f"[BACKGROUND] Uploaded all chunks for {stream_name}")
-        
-        # Mark as completed
-        processing_status[stream_name]["status"] = "completed"
-        processing_status[stream_name]["message"] = "Video processing completed successfully"
-        processing_status[stream_name]["progress"] = 100
-        processing_status[stream_name]["completed_at"] = asyncio.get_event_loop().time()
-
-        # Clean up temporary files
-        os.remove(video_file_path)
-        os.remove(processed_video_file_path)
-        for chunk_file in os.listdir(chunk_output_folder):
-            os.remove(os.path.join(chunk_output_folder, chunk_file))
-        os.rmdir(chunk_output_folder)
+        # Mark as completed once the workspace has been cleaned up
+        await state_store.update_status(
+            stream_name,
+            status="completed",
+            message="Video processing completed successfully",
+            progress=100,
+            completed_at=time.time()
+        )
         
         print(f"[BACKGROUND] Video processing completed successfully for {stream_name}")
         
     except Exception as e:
-        processing_status[stream_name]["status"] = "error"
-        processing_status[stream_name]["message"] = f"Error: {str(e)}"
+        await state_store.update_status(stream_name, status="error", message=f"Error: {str(e)}")
         print(f"[BACKGROUND] Error processing video {stream_name}: {e}")
 
-async def download_video_async(s3_video_url: str, stream_name: str) -> str:
+    finally:
+        if job_profile is not None:
+            status = await state_store.get_status(stream_name) or {}
+            await asyncio.get_event_loop().run_in_executor(None, job_profile.finish, {"status": status.get("status"), "s3_video_key": s3_video_key})
+            await state_store.update_status(stream_name, profile={
+                "profile_id": job_profile.profile_id,
+                "node_id": state_store.node_id,
+                **{file_name.replace('.', '_'): f"/profiles/{job_profile.profile_id}/{file_name}" for file_name in JobProfile.FILES},
+            })
+
+async def download_video_async(s3_video_url: str, stream_name: str, output_dir: str = None) -> str:
     """Download video file asynchronously"""
     
-    video_file_path = os.path.join(temp_video_folder_path, f"{stream_name}.mp4")
+    video_file_path = os.path.join(output_dir or temp_video_folder_path, f"{stream_name}.mp4")
     
     # Use aiohttp for async HTTP requests
     import aiohttp
@@ -663,12 +1197,14 @@ async def download_video_async(s3_video_url: str, stream_name: str) -> str:
     
     return video_file_path
 
-async def process_video_cv_async(video_file_path: str) -> str:
+async def process_video_cv_async(video_file_path: str, camera_name: str = None, timers=None) -> str:
     """Process video with CV pipeline in thread pool"""
     
     def run_cv_processing():
-        ppe_cv_pipeline = PPE_CV_PIPELINE()
-        return ppe_cv_pipeline.analyze_video(video_file_path)
+        with timed(timers, 'cv_model_load'):
+            ppe_cv_pipeline = load_cv_pipeline()
+        ppe_cv_pipeline.timers = timers
+        return ppe_cv_pipeline.analyze_video(video_file_path, camera_name=camera_name)
     
     # Run CPU-intensive CV processing in thread pool
     loop = asyncio.get_event_loop()
@@ -676,22 +1212,25 @@ async def process_video_cv_async(video_file_path: str) -> str:
     
     return processed_video_file_path
 
-async def chunk_video_async(processed_video_file_path: str, stream_name: str) -> str:
+async def chunk_video_async(processed_video_file_path: str, stream_name: str, output_dir: str = None, timers=None) -> str:
     """Chunk video file asynchronously"""
     
+    import cv2
+
     # Get video duration
-    video_capture = cv2.VideoCapture(processed_video_file_path)
-    frame_count = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = video_capture.get(cv2.CAP_PROP_FPS)
-    video_duration = frame_count / fps
-    video_capture.release()
+    with timed(timers, 'probe'):
+        video_capture = cv2.VideoCapture(processed_video_file_path)
+        frame_count = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = video_capture.get(cv2.CAP_PROP_FPS)
+        video_duration = frame_count / fps
+        video_capture.release()
 
     if video_duration < 60:
         chunk_duration = video_duration
     else:
         chunk_duration = video_duration / 4
 
-    chunk_output_folder = os.path.join(temp_video_folder_path, f"{stream_name}_chunks")
+    chunk_output_folder = os.path.join(output_dir or temp_video_folder_path, f"{stream_name}_chunks")
     os.makedirs(chunk_output_folder, exist_ok=True)
 
     output_pattern = os.path.join(chunk_output_folder, f"{stream_name}_chunk_%04d.mp4".replace(" ", "_"))
@@ -715,10 +1254,11 @@ async def chunk_video_async(processed_video_file_path: str, stream_name: str) ->
         stderr=asyncio.subprocess.PIPE,
     )
 
-    asyncio.create_task(_log_stream(ffmpeg_chunk_process.stdout, '[FFMPEG_CHUNK]'))
-    asyncio.create_task(_log_stream(ffmpeg_chunk_process.stderr, '[FFMPEG_CHUNK_ERROR]'))
+    asyncio.create_task(log_pipeline.pump(ffmpeg_chunk_process.stdout, f'ffmpeg_chunk/{stream_name}'))
+    asyncio.create_task(log_pipeline.pump(ffmpeg_chunk_process.stderr, f'ffmpeg_chunk/{stream_name}', 'stderr'))
 
-    await asyncio.wait_for(ffmpeg_chunk_process.wait(), timeout=3600)
+    with timed(timers, 'segment'):
+        await asyncio.wait_for(ffmpeg_chunk_process.wait(), timeout=3600)
     if ffmpeg_chunk_process.returncode != 0:
         raise Exception(f"Error chunking video file: {ffmpeg_chunk_process.returncode}")
 
@@ -735,6 +1275,103 @@ async def chunk_video_async(processed_video_file_path: str, stream_name: str) ->
 
     return chunk_output_folder
 
+activity_pipeline = None
+
+async def chunk_active_video_async(video_file_path: str, stream_name: str, output_dir: str = None, timers=None) -> tuple:
+    """Split the video into short windows, score each for activity and join the ones kept by the idle policy into upload chunks"""
+
+    global activity_pipeline
+
+    work_dir = output_dir or temp_video_folder_path
+    segment_folder = os.path.join(work_dir, f"{stream_name}_segments")
+    chunk_output_folder = os.path.join(work_dir, f"{stream_name}_chunks")
+    os.makedirs(segment_folder, exist_ok=True)
+    os.makedirs(chunk_output_folder, exist_ok=True)
+
+    segment_list_path = os.path.join(segment_folder, 'segments.csv')
+    ffmpeg_segment_command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-i', video_file_path,
+        '-c', 'copy',
+        '-map', '0',
+        '-segment_time', str(activity_window_seconds),
+        '-f', 'segment',
+        '-reset_timestamps', '1',
+        '-segment_list', segment_list_path,
+        '-segment_list_type', 'csv',
+        os.path.join(segment_folder, 'segment_%05d.mp4'),
+    ]
+
+    with timed(timers, 'segment'):
+        ffmpeg_segment_process = await asyncio.create_subprocess_exec(*ffmpeg_segment_command, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+        _, stderr = await asyncio.wait_for(ffmpeg_segment_process.communicate(), timeout=3600)
+    if ffmpeg_segment_process.returncode != 0:
+        raise Exception(f"Error segmenting video file: {stderr.decode(errors='ignore').strip()}")
+
+    segments = read_segment_list(segment_list_path)
+    if not segments:
+        raise Exception(f"No segments were created in {segment_folder}")
+
+    # One low-fps decode pass over the whole video, binned into the segments
+    activity_kind, threshold, pipeline = activity_signal, activity_threshold, None
+    if activity_signal == 'person':
+        if activity_pipeline is None:
+            activity_pipeline = await asyncio.get_event_loop().run_in_executor(None, load_cv_pipeline)
+        if activity_pipeline.person_class_ids:
+            pipeline = activity_pipeline
+        else:
+            print(f"[BACKGROUND] Model has no person class ({', '.join(activity_pipeline.model.names.values())}), scoring activity by motion instead")
+            activity_kind, threshold = 'motion', ACTIVITY_THRESHOLDS['motion']
+
+    started_at = time.perf_counter()
+    timeline = await activity_timeline(video_file_path, activity_kind, activity_sample_fps, pipeline=pipeline, person_imgsz=activity_person_imgsz)
+    score_segments(segments, timeline, threshold)
+    scoring_seconds = time.perf_counter() - started_at
+    if timers is not None:
+        timers.add('scoring', scoring_seconds)
+
+    video_duration = segments[-1]['end']
+    chunk_duration = video_duration if video_duration < 60 else video_duration / 4
+    chunks, skipped = plan_uploads(segments, idle_segment_policy, chunk_duration, idle_min_run_seconds)
+
+    for i, chunk in enumerate(chunks):
+        chunk_file_path = os.path.join(chunk_output_folder, f"{stream_name}_chunk_{i:04d}.mp4".replace(" ", "_"))
+
+        if len(chunk) == 1:
+            os.replace(chunk[0]['path'], chunk_file_path)
+            continue
+
+        concat_list_path = os.path.join(segment_folder, f"concat_{i:04d}.txt")
+        with open(concat_list_path, 'w') as f:
+            # The concat demuxer quotes paths like a shell: close, escape and reopen around any '
+            f.writelines("file '%s'\n" % segment['path'].replace("'", "'\\''") for segment in chunk)
+
+        with timed(timers, 'concat'):
+            ffmpeg_concat_process = await asyncio.create_subprocess_exec(
+                'ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', concat_list_path, '-c', 'copy', chunk_file_path,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await ffmpeg_concat_process.communicate()
+        if ffmpeg_concat_process.returncode != 0:
+            raise Exception(f"Error joining segments into {chunk_file_path}: {stderr.decode(errors='ignore').strip()}")
+
+    shutil.rmtree(segment_folder, ignore_errors=True)
+
+    report = {
+        "activity_signal": activity_kind,
+        "activity_segments": len(segments),
+        "idle_segments_skipped": skipped['segments'],
+        "idle_skipped_seconds": round(skipped['seconds'], 3),
+        "idle_skipped_bytes": skipped['bytes'],
+        "upload_seconds": round(video_duration - skipped['seconds'], 3),
+        "activity_scoring_seconds": round(scoring_seconds, 3),
+    }
+
+    print(f"[BACKGROUND] Activity ({activity_kind}, {idle_segment_policy}): skipped {skipped['segments']}/{len(segments)} segments, "
+          f"{skipped['seconds']:.0f}s and {skipped['bytes']} bytes; {len(chunks)} chunks to upload")
+
+    return chunk_output_folder, report
+
 async def upload_chunks_async(chunk_output_folder: str):
     """Upload all chunks asynchronously"""
     
@@ -778,6 +1415,30 @@ async def upload_chunks_async(chunk_output_folder: str):
         for chunk_file, error in failed_uploads:
             print(f"  - {chunk_file}: {error}")
 
+async def get_logs(source: str = None, limit: int = 100, contains: str = None):
+    """Recent subprocess output kept in memory: mediamtx, cloudflared, ffmpeg/<video_name> or ffmpeg_chunk/<stream_name>"""
+
+    if source is None:
+        return JSONResponse(status_code=200, content=jsonable_encoder({"stats": log_pipeline.stats, "sources": log_pipeline.sources()}))
+
+    lines = log_pipeline.tail(source, limit, contains)
+    if lines is None:
+        return JSONResponse(status_code=404, content=jsonable_encoder({"error": "Log source not found"}))
+
+    return JSONResponse(status_code=200, content=jsonable_encoder({"source": source, "lines": lines}))
+
+async def get_profile(profile_id: str, file_name: str):
+    """A job profile written on this node: profile.json (stage timings, top functions) or profile.collapsed (flame graph input)"""
+
+    if file_name not in JobProfile.FILES or os.path.basename(profile_id) != profile_id or profile_id in ('', '.', '..'):
+        return JSONResponse(status_code=404, content=jsonable_encoder({"error": "Profile not found"}))
+
+    file_path = os.path.join(profile_dir, profile_id, file_name)
+    if not os.path.exists(file_path):
+        return JSONResponse(status_code=404, content=jsonable_encoder({"error": "Profile not found"}))
+
+    return FileResponse(file_path, media_type='application/json' if file_name.endswith('.json') else 'text/plain')
+
 async def get_processing_status(request: fastapi.Request):
     """Get the processing status of a video"""
     
@@ -787,20 +1448,31 @@ async def get_processing_status(request: fastapi.Request):
     if not stream_name:
         return JSONResponse(status_code=400, content=jsonable_encoder({"error": "Missing stream name"}))
     
-    if stream_name not in processing_status:
+    status = await state_store.get_status(stream_name)
+
+    if status is None:
         return JSONResponse(status_code=404, content=jsonable_encoder({"error": "Stream not found"}))
     
-    return JSONResponse(status_code=200, content=jsonable_encoder(processing_status[stream_name]))
+    return JSONResponse(status_code=200, content=jsonable_encoder(status))
 
 async def run_server():
 
     """Run both the MediaMTX server and FastAPI concurrently"""
     
+    # Remove downloads and chunks leaked by a previous run before accepting jobs
+    scratch_space.sweep_orphans()
+
     # Start the MediaMTX server in the background
     server_task = asyncio.create_task(main())
-    
-    # Wait a bit for the server to initialize
-    await asyncio.sleep(5)
+
+    # Claim queued video jobs from the shared state store
+    async def handle_job(job_id: str, payload: dict):
+        print(f"[BACKGROUND] Node {state_store.node_id} claimed job {job_id}")
+        await process_video_background(payload['stream_name'], payload['s3_video_key'], profile=payload.get('profile', False))
+
+    for _ in range(job_concurrency):
+        asyncio.create_task(run_job_worker(state_store, handle_job, lease_ms=job_lease_ms))
+    asyncio.create_task(renew_stream_ownership())
     
     # Create FastAPI app
 
@@ -814,10 +1486,28 @@ async def run_server():
     )
     @app.get("/health")
     async def health_check():
-        return {"status": "healthy", "service": "rtsp-stream-worker"}
+        return {"status": "healthy", "service": "rtsp-stream-worker", "node_id": state_store.node_id, "scratch": scratch_space.usage(), "media_cache": media_cache.usage(), "logs": log_pipeline.stats}
+
+    @app.get("/ready")
+    async def ready_check():
+        ready = central_server is not None and central_server.ready
+        return JSONResponse(status_code=200 if ready else 503, content={
+            "ready": ready,
+            "mediamtx": central_server is not None and central_server.mediamtx_ready.is_set(),
+            "tunnel": central_server is not None and central_server.tunnel_ready.is_set(),
+            "hls_public_url": central_server.hls_public_url if central_server is not None else None,
+            "startup": startup_timings,
+        })
     
     app.post("/load_stream")(load_stream)
     app.post("/get_stream")(get_stream)
+    app.post("/get_stream_variants")(get_stream_variants)
+    app.post("/get_stream_detections")(get_stream_detections)
+    app.get("/hls/{stream_name}/{video_name}/master.m3u8")(get_master_playlist)
+    app.get("/clip")(get_clip)
+    app.get("/thumbnail")(get_thumbnail)
+    app.get("/logs")(get_logs)
+    app.get("/profiles/{profile_id}/{file_name}")(get_profile)
     app.post("/add_stream")(add_stream)
     app.post("/get_processing_status")(get_processing_status)
 
@@ -828,14 +1518,8 @@ async def run_server():
     # Run both concurrently
     await asyncio.gather(server_task, server.serve())
 
-async def _log_stream(stream, prefix):
-    """Helper function to read and print stream output."""
-    while True:
-        line = await stream.readline()
-        if line:
-            print(f"{prefix} {line.decode().strip()}")
-        else:
-            break
+# Everything above runs at import time; the rest of startup is MediaMTX and the tunnel
+startup_timings['imports_s'] = time.perf_counter() - import_started_at
 
 if __name__ == "__main__":  
     asyncio.run(run_server())
\ No newline at end of file
@@ -0,0 +1,159 @@
+import os
+import asyncio
+import hashlib
+
+from collections import OrderedDict
+
+class MediaCache:
+
+    """ Size-bounded LRU cache of generated media files (clips, thumbnails) on disk.
+
+    Concurrent requests for the same key share one producer run instead of each cutting
+    the file, and a waiter takes over if the request running the producer is cancelled.
+    Every get() pins its entry until release(), so a file is never evicted while it is
+    being served. Entries left by a previous process are adopted on startup, oldest first. """
+
+    def __init__(self, root_dir: str, budget_bytes: int):
+
+        if budget_bytes <= 0:
+            raise ValueError(f"Invalid media cache budget: {budget_bytes}")
+
+        self.root_dir = root_dir
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._pins = {}
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._adopt_existing()
+
+    def _adopt_existing(self):
+
+        files = []
+        for file_name in os.listdir(self.root_dir):
+            file_path = os.path.join(self.root_dir, file_name)
+            if '.tmp' in file_name:
+                # Left behind by a producer that was interrupted
+                os.remove(file_path)
+                continue
+            stat = os.stat(file_path)
+            files.append((stat.st_mtime, file_name, stat.st_size))
+
+        for _, file_name, size in sorted(files):
+            self._entries[file_name] = size
+            self.used_bytes += size
+
+        self._evict()
+
+    def _evict(self):
+        # Least recently used first, skipping pinned entries; the cache may run over budget until they are released
+        for file_name in list(self._entries):
+            if self.used_bytes <= self.budget_bytes or len(self._entries) <= 1:
+                break
+            if self._pins.get(file_name):
+                continue
+            size = self._entries.pop(file_name)
+            try:
+                os.remove(os.path.join(self.root_dir, file_name))
+            except OSError:
+                pass
+            self.used_bytes -= size
+            self.stats["evictions"] += 1
+
+    def _pin(self, file_name: str):
+        self._pins[file_name] = self._pins.get(file_name, 0) + 1
+
+    def release(self, file_path: str):
+        """Unpin a path returned by get() once it has been served."""
+
+        file_name = os.path.basename(file_path)
+        self._pins[file_name] -= 1
+        if not self._pins[file_name]:
+            del self._pins[file_name]
+            self._evict()
+
+    @staticmethod
+    def file_name(key: str, extension: str) -> str:
+        return f"{hashlib.sha256(key.encode()).hexdigest()[:32]}.{extension}"
+
+    async def get(self, key: str, extension: str, producer) -> tuple:
+
+        """ Path of the cached file for key, calling `await producer(output_path)` to create it on a miss.
+        Returns (path, outcome) with outcome 'hit', 'miss' or 'coalesced'. The path stays pinned until
+        release(path) is called """
+
+        file_name = self.file_name(key, extension)
+        file_path = os.path.join(self.root_dir, file_name)
+
+        # Pinned before the file exists, so the eviction a producer triggers cannot remove it
+        self._pin(file_name)
+        coalesced = False
+
+        while True:
+
+            if file_name in self._entries and os.path.exists(file_path):
+                self._entries.move_to_end(file_name)
+                if coalesced:
+                    return file_path, 'coalesced'
+                self.stats["hits"] += 1
+                return file_path, 'hit'
+
+            pending = self._pending.get(file_name)
+            if pending is None:
+                break
+
+            if not coalesced:
+                self.stats["coalesced"] += 1
+                coalesced = True
+            try:
+                await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The request producing the file went away, not this one: take over as producer
+                if pending.cancelled():
+                    continue
+                self.release(file_path)
+                raise
+            except BaseException:
+                self.release(file_path)
+                raise
+            return file_path, 'coalesced'
+
+        self.stats["misses"] += 1
+        future = asyncio.get_event_loop().create_future()
+        self._pending[file_name] = future
+
+        temp_path = os.path.join(self.root_dir, f"{file_name}.tmp.{extension}")
+
+        try:
+            await producer(temp_path)
+            os.replace(temp_path, file_path)
+
+            size = os.path.getsize(file_path)
+            self.used_bytes -= self._entries.pop(file_name, 0)
+            self._entries[file_name] = size
+            self.used_bytes += size
+            self._evict()
+
+            future.set_result(file_path)
+            return file_path, 'miss'
+
+        except BaseException as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            self.release(file_path)
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Waiters see the error; mark it retrieved so a future nobody awaits does not warn
+                future.exception()
+            else:
+                future.cancel()
+            raise
+
+        finally:
+            self._pending.pop(file_name, None)
+
+    def usage(self) -> dict:
+        return {"used_bytes": self.used_bytes, "budget_bytes": self.budget_bytes, "entries": len(self._entries), "pinned": len(self._pins), **self.stats}
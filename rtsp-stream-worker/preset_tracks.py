@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+
+# No module-level numpy: the worker builds a PresetTrackCache at import time, before any tracks are needed
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's contents, read in 1 MB blocks."""
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def loop_duration(video_file_path: str):
+    """Container duration ffprobe reports, which is the period `-stream_loop -1` loops on, or None if it cannot be read."""
+
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', video_file_path],
+            capture_output=True, text=True, timeout=30, check=True,
+        )
+        return float(result.stdout.strip())
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        print(f"[TRACKS] Could not read the duration of {video_file_path}, looping on the frame count: {e}")
+        return None
+
+class PresetTracks:
+
+    """ Per-frame detections of one preset video, looked up by position in the looping stream.
+
+    The loop period is the container duration, which can run past the last video frame when the
+    audio is longer; positions in that tail show the last frame, as the stream does. """
+
+    def __init__(self, tracks_path: str, loop_duration_s: float = None):
+
+        import numpy as np
+
+        with np.load(tracks_path) as data:
+            # Detections of frame i are rows offsets[i]:offsets[i + 1]
+            self.offsets = data['offsets']
+            self.boxes = data['boxes']
+            self.scores = data['scores']
+            self.class_ids = data['class_ids']
+            self.meta = json.loads(str(data['meta']))
+
+        self.fps = float(self.meta['fps'])
+        self.frame_count = len(self.offsets) - 1
+        self.duration = loop_duration_s or self.frame_count / self.fps
+        self.class_names = {int(class_id): name for class_id, name in self.meta['class_names'].items()}
+
+    def frame_index(self, position_s: float) -> int:
+        return min(int((position_s % self.duration) * self.fps), self.frame_count - 1)
+
+    def at(self, position_s: float):
+
+        """ (frame_index, boxes, scores, class_ids) of the frame shown position_s seconds into the loop """
+
+        frame_index = self.frame_index(position_s)
+        start, end = self.offsets[frame_index], self.offsets[frame_index + 1]
+        return frame_index, self.boxes[start:end], self.scores[start:end], self.class_ids[start:end]
+
+def build_tracks(pipeline, video_file_path: str, camera_name: str, tracks_path: str, loop_duration_s: float = None) -> PresetTracks:
+
+    """ Run the pipeline over every frame of a preset video once and save the detections to tracks_path """
+
+    import cv2
+    import numpy as np
+
+    started_at = time.perf_counter()
+
+    video_capture = cv2.VideoCapture(video_file_path)
+    fps = video_capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    offsets, boxes, scores, class_ids = [0], [], [], []
+
+    while True:
+        ret, frame = video_capture.read()
+        if not ret:
+            break
+        frame_boxes, frame_scores, frame_class_ids = pipeline.detect(frame, camera_name=camera_name)
+        boxes.append(frame_boxes)
+        scores.append(frame_scores)
+        class_ids.append(frame_class_ids)
+        offsets.append(offsets[-1] + len(frame_boxes))
+
+    video_capture.release()
+
+    if len(offsets) == 1:
+        raise ValueError(f"No frames decoded from {video_file_path}")
+
+    build_seconds = time.perf_counter() - started_at
+    meta = {
+        'video_file_path': video_file_path,
+        'camera_name': camera_name,
+        'fps': fps,
+        'model_path': pipeline.model_path,
+        'class_names': {str(class_id): name for class_id, name in pipeline.model.names.items()},
+        'build_seconds': build_seconds,
+    }
+
+    # Written under a temporary name first so a crashed build never leaves a truncated cache behind
+    temp_path = f"{tracks_path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        temp_path,
+        offsets=np.array(offsets, dtype=np.int64),
+        boxes=np.concatenate(boxes).astype(np.float32),
+        scores=np.concatenate(scores).astype(np.float32),
+        class_ids=np.concatenate(class_ids).astype(np.int16),
+        meta=np.array(json.dumps(meta)),
+    )
+    os.replace(temp_path, tracks_path)
+
+    print(f"[TRACKS] Built {os.path.basename(tracks_path)} for {camera_name}: {len(offsets) - 1} frames in {build_seconds:.1f}s "
+          f"({(len(offsets) - 1) / max(build_seconds, 1e-9):.1f} fps)")
+    return PresetTracks(tracks_path, loop_duration_s)
+
+class PresetTrackCache:
+
+    """ Detection tracks of the looping preset videos, built once per (video file hash, model version).
+
+    Builds run one at a time on a background thread, so the model is loaded lazily and the event
+    loop never blocks on inference. Concurrent requests for the same video share one build, and a
+    failed build is not retried until failure_ttl_s has passed. """
+
+    def __init__(self, cache_dir: str, pipeline_factory, failure_ttl_s: float = 300.0):
+
+        self.cache_dir = cache_dir
+        self.pipeline_factory = pipeline_factory
+        self.failure_ttl_s = failure_ttl_s
+
+        self._pipeline = None
+        self._file_hashes = {}
+        self._tracks = {}
+        self._builds = {}
+        self._failures = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='preset-tracks')
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _file_hash(self, video_file_path: str) -> str:
+        stat = os.stat(video_file_path)
+        cache_key = (video_file_path, stat.st_size, stat.st_mtime_ns)
+        if cache_key not in self._file_hashes:
+            self._file_hashes[cache_key] = file_sha256(video_file_path)
+        return self._file_hashes[cache_key]
+
+    def _load_or_build(self, video_file_path: str, camera_name: str) -> PresetTracks:
+
+        if self._pipeline is None:
+            self._pipeline = self.pipeline_factory()
+
+        key = f"{self._file_hash(video_file_path)[:16]}_{self._pipeline.version(camera_name)[:16]}"
+        tracks_path = os.path.join(self.cache_dir, f"{key}.npz")
+
+        if os.path.exists(tracks_path):
+            return PresetTracks(tracks_path, loop_duration(video_file_path))
+        return build_tracks(self._pipeline, video_file_path, camera_name, tracks_path, loop_duration(video_file_path))
+
+    async def ensure(self, video_file_path: str, camera_name: str) -> PresetTracks:
+
+        """ Tracks for a preset video, loading them from disk or building them if needed """
+
+        if camera_name in self._tracks:
+            return self._tracks[camera_name]
+
+        failure = self.failure(camera_name)
+        if failure is not None:
+            raise RuntimeError(f"Detection track build failed, retrying in {failure['retry_after_s']:.0f}s: {failure['error']}")
+
+        if camera_name not in self._builds:
+            loop = asyncio.get_event_loop()
+            self._builds[camera_name] = loop.run_in_executor(self._executor, self._load_or_build, video_file_path, camera_name)
+
+        try:
+            self._tracks[camera_name] = await self._builds[camera_name]
+        except Exception as e:
+            self._failures[camera_name] = (time.monotonic(), str(e))
+            raise
+        finally:
+            self._builds.pop(camera_name, None)
+
+        return self._tracks[camera_name]
+
+    def failure(self, camera_name: str):
+        """Error of the camera's last build and seconds until it may be retried, or None if there is none pending."""
+
+        if camera_name not in self._failures:
+            return None
+        failed_at, error = self._failures[camera_name]
+        retry_after_s = failed_at + self.failure_ttl_s - time.monotonic()
+        if retry_after_s <= 0:
+            del self._failures[camera_name]
+            return None
+        return {"error": error, "retry_after_s": retry_after_s}
+
+    def get(self, camera_name: str):
+        """Tracks for a camera if they are already loaded, else None."""
+        return self._tracks.get(camera_name)
+
+    def building(self, camera_name: str) -> bool:
+        return camera_name in self._builds
+
+def main():
+
+    """ Build the tracks of preset videos offline, to copy into preset/tracks/ instead of building on a serving node """
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Precompute preset detection tracks.')
+    parser.add_argument('videos', nargs='+', metavar='VIDEO_PATH=CAMERA_NAME', help='e.g. preset/textile1.mp4=Sewing-Machine-1')
+    parser.add_argument('--tracks-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preset', 'tracks'))
+    args = parser.parse_args()
+
+    from cv_pipeline import PPE_CV_PIPELINE
+
+    cache = PresetTrackCache(args.tracks_dir, PPE_CV_PIPELINE)
+    for video in args.videos:
+        video_file_path, camera_name = video.rsplit('=', 1)
+        cache._load_or_build(video_file_path, camera_name)
+
+if __name__ == '__main__':
+    main()
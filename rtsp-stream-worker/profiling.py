@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import secrets
+import threading
+
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Leaf frames of threads that are parked rather than working (event loop select, idle pool workers)
+IDLE_LEAVES = {('select', 'selectors.py'), ('wait', 'threading.py'), ('_worker', 'thread.py'), ('get', 'queue.py')}
+
+# Keys of an ultralytics Results.speed dict, in milliseconds per image: letterbox/normalize, forward, NMS
+ULTRALYTICS_SPEED_KEYS = ('preprocess', 'inference', 'postprocess')
+
+class StageTimers:
+
+    """ Wall-clock time per named stage, summed over every time the stage runs. Thread-safe. """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, count: int = 1):
+
+        """ Record `count` runs of a stage that took `seconds` in total. Batched adds (count > 1) only
+        know their mean, so max_s is the longest single add and max_mean_s the highest per-run mean """
+
+        with self._lock:
+            stage = self._stages.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0, "max_mean_s": 0.0})
+            stage["count"] += count
+            stage["total_s"] += seconds
+            if count == 1:
+                stage["max_s"] = max(stage["max_s"], seconds)
+            stage["max_mean_s"] = max(stage["max_mean_s"], seconds / max(count, 1))
+
+    @contextmanager
+    def stage(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started_at)
+
+    def add_ultralytics_speed(self, results, prefix: str = 'yolo'):
+
+        """ Record the preprocess/inference/postprocess split ultralytics measured for each result """
+
+        for result in results:
+            for key in ULTRALYTICS_SPEED_KEYS:
+                milliseconds = (getattr(result, 'speed', None) or {}).get(key)
+                if milliseconds is not None:
+                    self.add(f"{prefix}_{key}", milliseconds / 1000)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                name: {**stage, "mean_s": stage["total_s"] / max(stage["count"], 1)}
+                for name, stage in sorted(self._stages.items(), key=lambda item: -item[1]["total_s"])
+            }
+
+def timed(timers, name: str):
+    """timers.stage(name), or a no-op when profiling is off (timers is None)."""
+    return timers.stage(name) if timers is not None else nullcontext()
+
+class SamplingProfiler:
+
+    """ Samples the Python stack of every thread at a fixed interval from a background thread.
+
+    Stacks are counted in collapsed form ("thread;outer;...;leaf"), which flamegraph.pl,
+    speedscope and inferno read directly. Samples of idle threads are counted separately. """
+
+    def __init__(self, interval_s: float = 0.005, max_depth: int = 128):
+
+        if interval_s <= 0:
+            raise ValueError(f"Invalid sampling interval: {interval_s}")
+
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+
+        own_thread_id = threading.get_ident()
+
+        while not self._stop.wait(self.interval_s):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+
+                code = frame.f_code
+                if (code.co_name, os.path.basename(code.co_filename)) in IDLE_LEAVES:
+                    self.idle_samples += 1
+                    continue
+
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)).replace(';', '_'))
+
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 25) -> dict:
+
+        """ Functions by samples spent in them (self) and anywhere under them (total) """
+
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]
+            if frames:
+                own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+
+        def ranked(counter):
+            return [{"function": name, "samples": count, "share": count / max(self.samples, 1)} for name, count in counter.most_common(limit)]
+
+        return {"self": ranked(own), "total": ranked(total)}
+
+def prune_profiles(root_dir: str, max_profiles: int) -> int:
+
+    """ Delete the oldest profile directories beyond max_profiles, returning how many were removed """
+
+    try:
+        entries = [entry for entry in os.scandir(root_dir) if entry.is_dir()]
+    except FileNotFoundError:
+        return 0
+
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    removed = entries[:max(0, len(entries) - max_profiles)]
+    for entry in removed:
+        shutil.rmtree(entry.path, ignore_errors=True)
+    return len(removed)
+
+class JobProfile:
+
+    """ Stage timers and a sampling profile of one job, written to <root_dir>/<profile_id>/.
+
+    The sampler sees the whole process, so work of other jobs running at the same time shows up
+    in the stacks too; the stage timers only cover this job. Only the newest max_profiles
+    profiles in root_dir are kept. """
+
+    FILES = ('profile.json', 'profile.collapsed')
+
+    def __init__(self, root_dir: str, job_name: str, interval_s: float = 0.005, max_profiles: int = 50):
+
+        if max_profiles < 1:
+            raise ValueError(f"Invalid profile retention: {max_profiles}")
+
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', job_name)
+        self.profile_id = f"{safe_name}_{time.strftime('%Y%m%d-%H%M%S')}_{secrets.token_hex(3)}"
+        self.root_dir = root_dir
+        self.profile_dir = os.path.join(root_dir, self.profile_id)
+        self.job_name = job_name
+        self.max_profiles = max_profiles
+
+        self.timers = StageTimers()
+        self.sampler = SamplingProfiler(interval_s)
+        self.started_at = None
+        self._cpu_started_at = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._cpu_started_at = time.process_time()
+        self.sampler.start()
+
+    def finish(self, extra: dict = None) -> str:
+
+        """ Stop sampling and write profile.json and profile.collapsed, returning the profile directory """
+
+        self.sampler.stop()
+        wall_seconds = time.time() - self.started_at
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+        stages = self.timers.summary()
+        for stage in stages.values():
+            stage["share_of_wall"] = stage["total_s"] / max(wall_seconds, 1e-9)
+
+        profile = {
+            "profile_id": self.profile_id,
+            "job": self.job_name,
+            "started_at": self.started_at,
+            "wall_s": wall_seconds,
+            "process_cpu_s": time.process_time() - self._cpu_started_at,
+            "stages": stages,
+            "sampler": {
+                "interval_s": self.sampler.interval_s,
+                "samples": self.sampler.samples,
+                "idle_samples": self.sampler.idle_samples,
+                "top_functions": self.sampler.top_functions(),
+            },
+            **(extra or {}),
+        }
+
+        with open(os.path.join(self.profile_dir, 'profile.json'), 'w') as f:
+            json.dump(profile, f, indent=2)
+        self.sampler.write_collapsed(os.path.join(self.profile_dir, 'profile.collapsed'))
+
+        removed = prune_profiles(self.root_dir, self.max_profiles)
+        print(f"[PROFILE] Wrote {self.profile_dir} ({self.sampler.samples} samples over {wall_seconds:.1f}s)"
+              + (f", removed {removed} old profiles" if removed else ''))
+        return self.profile_dir
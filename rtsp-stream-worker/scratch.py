@@ -0,0 +1,112 @@
+import os
+import shutil
+import asyncio
+import secrets
+
+from contextlib import asynccontextmanager
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of all files under a directory."""
+
+    total = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+    return total
+
+class ScratchSpace:
+
+    """ Byte-budgeted scratch space for job files under a single temp directory.
+
+    Jobs reserve the bytes they expect to write before touching disk and wait while the
+    budget is exhausted. Each job works in its own directory that is removed when the job
+    ends, whether it succeeded or failed. """
+
+    def __init__(self, root_dir: str, budget_bytes: int):
+
+        if budget_bytes <= 0:
+            raise ValueError(f"Invalid scratch budget: {budget_bytes}")
+
+        self.root_dir = root_dir
+        self.budget_bytes = budget_bytes
+        self.reserved_bytes = 0
+        self.waiting_jobs = 0
+        self._condition = asyncio.Condition()
+
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def sweep_orphans(self) -> int:
+
+        """ Remove everything left in the scratch directory by a previous process, returning bytes freed """
+
+        freed_bytes = 0
+        for entry in os.listdir(self.root_dir):
+            entry_path = os.path.join(self.root_dir, entry)
+            try:
+                if os.path.isdir(entry_path) and not os.path.islink(entry_path):
+                    freed_bytes += directory_size(entry_path)
+                    shutil.rmtree(entry_path)
+                else:
+                    freed_bytes += os.path.getsize(entry_path)
+                    os.remove(entry_path)
+            except OSError as e:
+                print(f"[SCRATCH] Error removing orphaned {entry_path}: {e}")
+
+        print(f"[SCRATCH] Swept orphaned scratch files, freed {freed_bytes} bytes")
+        return freed_bytes
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+
+        """ Hold nbytes of the budget for the duration of the block, waiting while it is over budget """
+
+        if nbytes > self.budget_bytes:
+            raise ValueError(f"Job needs {nbytes} bytes of scratch space but the budget is {self.budget_bytes} bytes")
+
+        async with self._condition:
+            self.waiting_jobs += 1
+            try:
+                await self._condition.wait_for(lambda: self.reserved_bytes + nbytes <= self.budget_bytes)
+            finally:
+                self.waiting_jobs -= 1
+            self.reserved_bytes += nbytes
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.reserved_bytes -= nbytes
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def workspace(self, job_name: str):
+
+        """ Create a private directory for a job and always remove it afterwards """
+
+        safe_name = "".join(c if c.isalnum() or c in '-_' else '_' for c in job_name)
+        workspace_path = os.path.join(self.root_dir, f"{safe_name}-{secrets.token_hex(4)}")
+        os.makedirs(workspace_path)
+
+        try:
+            yield workspace_path
+        finally:
+            shutil.rmtree(workspace_path, ignore_errors=True)
+            print(f"[SCRATCH] Removed workspace {workspace_path}")
+
+    def usage(self) -> dict:
+
+        """ Current scratch usage for /health """
+
+        disk = shutil.disk_usage(self.root_dir)
+
+        return {
+            "used_bytes": directory_size(self.root_dir),
+            "reserved_bytes": self.reserved_bytes,
+            "budget_bytes": self.budget_bytes,
+            "waiting_jobs": self.waiting_jobs,
+            "disk_free_bytes": disk.free,
+            "disk_total_bytes": disk.total,
+        }
@@ -0,0 +1,409 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import secrets
+
+from collections import deque
+from urllib.parse import urlparse
+
+# Pops the next job, leases it and marks it active in one atomic step, so a node dying mid-claim
+# leaves the job either still queued or leased (and requeued once the lease expires), never lost.
+# KEYS: queue, active hash. ARGV: lease key prefix, node id, lease milliseconds.
+CLAIM_JOB_SCRIPT = """
+local job_id = redis.call('LPOP', KEYS[1])
+if not job_id then return false end
+redis.call('SET', ARGV[1] .. job_id, ARGV[2], 'PX', ARGV[3])
+redis.call('HSET', KEYS[2], job_id, ARGV[2])
+return job_id
+"""
+
+# Extends a lease only if this node still holds it; a separate GET and SET could overwrite the
+# lease of a node that claimed the job in between. KEYS: lease key. ARGV: node id, lease milliseconds.
+RENEW_JOB_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+class InMemoryKV:
+
+    """ Process-local key/value store with the subset of Redis semantics the worker uses """
+
+    def __init__(self):
+        self._data = {}
+        self._expiry = {}
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expiry.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return key in self._data
+
+    async def get(self, key: str):
+        return self._data[key] if self._alive(key) and isinstance(self._data[key], str) else None
+
+    async def set(self, key: str, value: str, nx: bool = False, xx: bool = False, px: int = None) -> bool:
+        exists = self._alive(key)
+        if (nx and exists) or (xx and not exists):
+            return False
+        self._data[key] = value
+        if px:
+            self._expiry[key] = time.monotonic() + px / 1000
+        else:
+            self._expiry.pop(key, None)
+        return True
+
+    async def delete(self, key: str) -> int:
+        exists = self._alive(key)
+        self._data.pop(key, None)
+        self._expiry.pop(key, None)
+        return int(exists)
+
+    async def rpush(self, key: str, value: str) -> int:
+        if not self._alive(key):
+            self._data[key] = deque()
+        self._data[key].append(value)
+        return len(self._data[key])
+
+    async def lpop(self, key: str):
+        if not self._alive(key) or not self._data[key]:
+            return None
+        value = self._data[key].popleft()
+        if not self._data[key]:
+            await self.delete(key)
+        return value
+
+    async def claim_job(self, queue_key: str, active_key: str, lease_prefix: str, node_id: str, lease_ms: int):
+        # Nothing below awaits, so no other coroutine sees the job half claimed
+        job_id = await self.lpop(queue_key)
+        if job_id is None:
+            return None
+        await self.set(lease_prefix + job_id, node_id, px=lease_ms)
+        await self.hset(active_key, job_id, node_id)
+        return job_id
+
+    async def renew_lease(self, lease_key: str, node_id: str, lease_ms: int) -> bool:
+        # As in claim_job, nothing here awaits anything that yields, so the check and extend are atomic
+        if await self.get(lease_key) != node_id:
+            return False
+        return await self.set(lease_key, node_id, xx=True, px=lease_ms)
+
+    async def hset(self, key: str, field: str, value: str) -> int:
+        if not self._alive(key):
+            self._data[key] = {}
+        added = field not in self._data[key]
+        self._data[key][field] = value
+        return int(added)
+
+    async def hdel(self, key: str, field: str) -> int:
+        if not self._alive(key) or field not in self._data[key]:
+            return 0
+        del self._data[key][field]
+        if not self._data[key]:
+            await self.delete(key)
+        return 1
+
+    async def hgetall(self, key: str) -> dict:
+        return dict(self._data[key]) if self._alive(key) else {}
+
+    async def close(self):
+        pass
+
+class RedisError(Exception):
+    pass
+
+class RedisKV:
+
+    """ Minimal RESP2 client for Redis or any Redis-protocol store, over one pipelined connection """
+
+    def __init__(self, url: str):
+
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"Invalid Redis URL: {url}")
+
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        if self.password:
+            await self._send('AUTH', self.password)
+        if self.db:
+            await self._send('SELECT', self.db)
+
+    async def _read_reply(self):
+
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+
+        prefix, payload = line[:1], line[1:-2]
+
+        if prefix == b'+':
+            return payload.decode()
+        if prefix == b'-':
+            raise RedisError(payload.decode())
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if prefix == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    async def _send(self, *args):
+
+        encoded = [str(arg).encode() for arg in args]
+        self._writer.write(b''.join([f'*{len(encoded)}\r\n'.encode()] + [b'$%d\r\n%s\r\n' % (len(arg), arg) for arg in encoded]))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def execute(self, *args):
+
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._send(*args)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    # Reconnect once, e.g. after the store restarted
+                    self._reader = self._writer = None
+                    if attempt:
+                        raise
+                except BaseException:
+                    # Cancelled or timed out with the reply still in flight: it would be read as the
+                    # reply to the next command, so drop the connection and start the next one clean
+                    await self.close()
+                    raise
+
+    async def get(self, key: str):
+        return await self.execute('GET', key)
+
+    async def set(self, key: str, value: str, nx: bool = False, xx: bool = False, px: int = None) -> bool:
+        args = ['SET', key, value]
+        if nx:
+            args.append('NX')
+        if xx:
+            args.append('XX')
+        if px:
+            args += ['PX', int(px)]
+        return await self.execute(*args) == 'OK'
+
+    async def delete(self, key: str) -> int:
+        return await self.execute('DEL', key)
+
+    async def rpush(self, key: str, value: str) -> int:
+        return await self.execute('RPUSH', key, value)
+
+    async def lpop(self, key: str):
+        return await self.execute('LPOP', key)
+
+    async def claim_job(self, queue_key: str, active_key: str, lease_prefix: str, node_id: str, lease_ms: int):
+        return await self.execute('EVAL', CLAIM_JOB_SCRIPT, 2, queue_key, active_key, lease_prefix, node_id, int(lease_ms))
+
+    async def renew_lease(self, lease_key: str, node_id: str, lease_ms: int) -> bool:
+        return await self.execute('EVAL', RENEW_JOB_SCRIPT, 1, lease_key, node_id, int(lease_ms)) == 1
+
+    async def hset(self, key: str, field: str, value: str) -> int:
+        return await self.execute('HSET', key, field, value)
+
+    async def hdel(self, key: str, field: str) -> int:
+        return await self.execute('HDEL', key, field)
+
+    async def hgetall(self, key: str) -> dict:
+        values = await self.execute('HGETALL', key) or []
+        return dict(zip(values[0::2], values[1::2]))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+class StateStore:
+
+    """ Stream registry, processing status and leased job queue shared by every worker node """
+
+    def __init__(self, kv, node_id: str, prefix: str = 'rtsp-stream-worker'):
+        self.kv = kv
+        self.node_id = node_id
+        self.prefix = prefix
+
+    def _key(self, *parts) -> str:
+        return ':'.join((self.prefix,) + parts)
+
+    # --- Processing status ---
+
+    async def get_status(self, stream_name: str):
+        value = await self.kv.get(self._key('status', stream_name))
+        return json.loads(value) if value else None
+
+    async def set_status(self, stream_name: str, status: dict):
+        await self.kv.set(self._key('status', stream_name), json.dumps(status))
+
+    async def update_status(self, stream_name: str, **fields):
+        """Merge fields into a stream's status. Only the node running the job writes it."""
+        status = await self.get_status(stream_name) or {}
+        status.update(fields)
+        await self.set_status(stream_name, status)
+
+    # --- Stream registry ---
+
+    async def get_stream(self, stream_name: str):
+        """HLS URLs of a stream, or None if it is not registered or its owner node is gone."""
+        if await self.kv.get(self._key('stream_owner', stream_name)) is None:
+            return None
+        value = await self.kv.get(self._key('stream', stream_name))
+        return json.loads(value) if value else None
+
+    async def claim_stream(self, stream_name: str, ttl_ms: int) -> bool:
+        """Become the node that runs a stream's encoders. False if any node (including this one) already does."""
+        return await self.kv.set(self._key('stream_owner', stream_name), self.node_id, nx=True, px=ttl_ms)
+
+    async def release_stream(self, stream_name: str):
+        """Give up running a stream's encoders, so another request or node can claim it again."""
+        if await self.kv.get(self._key('stream_owner', stream_name)) == self.node_id:
+            await self.kv.delete(self._key('stream_owner', stream_name))
+
+    async def set_stream(self, stream_name: str, urls: list, variants: dict = None, started_at: dict = None):
+        """Register a stream's HLS URLs and, per video, the URLs of every rendition and when its loop started."""
+        await self.kv.set(self._key('stream', stream_name), json.dumps({
+            'urls': urls, 'variants': variants or {}, 'started_at': started_at or {}, 'node_id': self.node_id,
+        }))
+
+    async def get_stream_owner(self, stream_name: str):
+        return await self.kv.get(self._key('stream_owner', stream_name))
+
+    async def renew_streams(self, stream_names, ttl_ms: int):
+        for stream_name in stream_names:
+            if not await self.kv.set(self._key('stream_owner', stream_name), self.node_id, xx=True, px=ttl_ms):
+                await self.kv.set(self._key('stream_owner', stream_name), self.node_id, nx=True, px=ttl_ms)
+
+    # --- Job queue ---
+
+    async def enqueue_job(self, payload: dict) -> str:
+        job_id = str(uuid.uuid4())
+        await self.kv.set(self._key('job', job_id), json.dumps(payload))
+        await self.kv.rpush(self._key('jobs', 'queue'), job_id)
+        return job_id
+
+    async def claim_job(self, lease_ms: int):
+        """Pop the next job and take a lease on it. Returns (job_id, payload) or None."""
+        job_id = await self.kv.claim_job(self._key('jobs', 'queue'), self._key('jobs', 'active'), self._key('lease', ''), self.node_id, lease_ms)
+        if job_id is None:
+            return None
+        payload = await self.kv.get(self._key('job', job_id))
+        return job_id, json.loads(payload) if payload else {}
+
+    async def renew_job(self, job_id: str, lease_ms: int) -> bool:
+        """Extend this node's lease on a job. False if the lease was lost to another node."""
+        return await self.kv.renew_lease(self._key('lease', job_id), self.node_id, lease_ms)
+
+    async def complete_job(self, job_id: str):
+        await self.kv.hdel(self._key('jobs', 'active'), job_id)
+        await self.kv.delete(self._key('lease', job_id))
+        await self.kv.delete(self._key('job', job_id))
+
+    async def requeue_expired_jobs(self) -> int:
+        """Put jobs whose lease expired (their node died) back on the queue."""
+        requeued = 0
+        for job_id in await self.kv.hgetall(self._key('jobs', 'active')):
+            if await self.kv.get(self._key('lease', job_id)) is not None:
+                continue
+            # HDEL is atomic, so only one node requeues a given job
+            if await self.kv.hdel(self._key('jobs', 'active'), job_id):
+                await self.kv.rpush(self._key('jobs', 'queue'), job_id)
+                requeued += 1
+        return requeued
+
+    async def close(self):
+        await self.kv.close()
+
+async def run_job_worker(store: StateStore, handler, lease_ms: int = 30000, poll_interval: float = 1.0, stop_when_idle: bool = False):
+
+    """ Claim jobs from the shared queue and run handler(job_id, payload), renewing the lease while it runs """
+
+    while True:
+
+        claimed = await store.claim_job(lease_ms)
+
+        if claimed is None:
+            if await store.requeue_expired_jobs():
+                continue
+            if stop_when_idle:
+                return
+            await asyncio.sleep(poll_interval)
+            continue
+
+        job_id, payload = claimed
+        handler_task = asyncio.create_task(handler(job_id, payload))
+        lease_lost = False
+
+        async def renew_lease():
+            nonlocal lease_lost
+            while True:
+                await asyncio.sleep(lease_ms / 3000)
+                try:
+                    renewed = await store.renew_job(job_id, lease_ms)
+                except Exception as e:
+                    # Keep trying; if the store stays unreachable the lease expires and the next renew reports it lost
+                    print(f"[STATE] Error renewing lease on job {job_id}: {e}")
+                    continue
+                if not renewed:
+                    # Another node may already be running the job again; stop this copy
+                    print(f"[STATE] Lost lease on job {job_id}, cancelling it")
+                    lease_lost = True
+                    handler_task.cancel()
+                    return
+
+        renew_task = asyncio.create_task(renew_lease())
+        try:
+            await handler_task
+        except asyncio.CancelledError:
+            if not lease_lost:
+                raise
+        except Exception as e:
+            print(f"[STATE] Job {job_id} failed: {e}")
+        finally:
+            renew_task.cancel()
+            # After a lost lease the job belongs to whichever node requeued or reclaimed it
+            if not lease_lost:
+                await store.complete_job(job_id)
+
+def create_state_store() -> StateStore:
+
+    """ Build the state store from STATE_BACKEND (memory | redis), STATE_REDIS_URL and NODE_ID """
+
+    backend = os.getenv('STATE_BACKEND', 'memory').strip('"').lower()
+    node_id = os.getenv('NODE_ID', '').strip('"') or f"{socket.gethostname()}-{secrets.token_hex(3)}"
+
+    if backend == 'memory':
+        kv = InMemoryKV()
+    elif backend == 'redis':
+        kv = RedisKV(os.getenv('STATE_REDIS_URL', 'redis://127.0.0.1:6379/0').strip('"'))
+    else:
+        raise ValueError(f"Invalid state backend: {backend}")
+
+    print(f"[STATE] Using {backend} state backend as node {node_id}")
+    return StateStore(kv, node_id)
@@ -0,0 +1,71 @@
+import pytest
+
+from activity import plan_uploads, read_segment_list, score_segments
+
+def make_segments(pattern: str, duration: float = 10.0) -> list:
+
+    """ One segment per character of pattern, A for active and . for idle """
+
+    return [
+        {'name': str(i), 'start': i * duration, 'end': (i + 1) * duration, 'duration': duration, 'bytes': 100, 'active': flag == 'A'}
+        for i, flag in enumerate(pattern)
+    ]
+
+def chunk_names(chunks: list) -> list:
+    return [''.join(segment['name'] for segment in chunk) for chunk in chunks]
+
+def test_score_segments_takes_the_peak_inside_each_segment():
+
+    pytest.importorskip('numpy')
+
+    segments = [{'start': 0.0, 'end': 10.0}, {'start': 10.0, 'end': 20.0}, {'start': 20.0, 'end': 30.0}]
+    timeline = [(2.0, 0.002), (9.0, 0.05), (10.0, 0.004), (19.0, 0.008)]
+
+    score_segments(segments, timeline, threshold=0.01)
+
+    assert [segment['score'] for segment in segments] == [0.05, 0.008, 0.0]
+    assert [segment['active'] for segment in segments] == [True, False, False]
+
+def test_read_segment_list(tmp_path):
+
+    (tmp_path / 'seg000.mp4').write_bytes(b'x' * 5)
+    (tmp_path / 'segments.csv').write_text('seg000.mp4,0.000000,10.010000\n')
+
+    assert read_segment_list(str(tmp_path / 'segments.csv')) == [
+        {'path': str(tmp_path / 'seg000.mp4'), 'start': 0.0, 'end': 10.01, 'duration': 10.01, 'bytes': 5},
+    ]
+
+def test_off_keeps_everything_split_at_the_chunk_length():
+
+    chunks, skipped = plan_uploads(make_segments('A..A.'), 'off', max_chunk_seconds=20)
+
+    assert chunk_names(chunks) == ['01', '23', '4']
+    assert skipped == {'segments': 0, 'seconds': 0.0, 'bytes': 0}
+
+def test_drop_skips_every_idle_segment_and_never_splices_across_a_gap():
+
+    chunks, skipped = plan_uploads(make_segments('AA.AAA..'), 'drop', max_chunk_seconds=20)
+
+    assert chunk_names(chunks) == ['01', '34', '5']
+    assert skipped == {'segments': 3, 'seconds': 30.0, 'bytes': 300}
+
+def test_merge_bridges_only_short_gaps_between_active_footage():
+
+    # Leading and trailing idle footage is skipped, the 20s gap is bridged, the 60s gap is not
+    chunks, skipped = plan_uploads(make_segments('.A..A......A.'), 'merge', max_chunk_seconds=100, min_idle_run_seconds=60)
+
+    assert chunk_names(chunks) == ['1234', '11']
+    assert skipped == {'segments': 8, 'seconds': 80.0, 'bytes': 800}
+
+def test_a_segment_longer_than_the_chunk_length_gets_its_own_chunk():
+
+    segments = make_segments('AAA')
+    segments[1]['duration'] = 50.0
+
+    chunks, _ = plan_uploads(segments, 'drop', max_chunk_seconds=20)
+
+    assert chunk_names(chunks) == ['0', '1', '2']
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        plan_uploads(make_segments('A'), 'keep', max_chunk_seconds=20)
@@ -0,0 +1,232 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('ultralytics')
+yaml = pytest.importorskip('yaml')
+
+import cv_pipeline
+from cv_pipeline import PPE_CV_PIPELINE, box_iou, nms, empty_detections
+
+class StubArray:
+
+    def __init__(self, values):
+        self.values = np.array(values)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+class StubBoxes:
+
+    def __init__(self, detections):
+        self.xyxy = StubArray([box for box, _, _ in detections])
+        self.conf = StubArray([score for _, score, _ in detections])
+        self.cls = StubArray([class_id for _, _, class_id in detections])
+
+    def __len__(self):
+        return len(self.xyxy.values)
+
+class StubYOLO:
+
+    """ Stands in for ultralytics.YOLO: answers predict() with respond(image, imgsz) and records each call """
+
+    def __init__(self, names: dict, respond):
+        self.names = names
+        self.respond = respond
+        self.calls = []
+
+    def predict(self, image, imgsz, conf, iou, max_det, classes, device, verbose):
+        self.calls.append({'shape': image.shape[:2], 'imgsz': imgsz, 'classes': classes})
+        detections = [d for d in self.respond(image, imgsz) if d[1] >= conf and (classes is None or d[2] in classes)]
+        return [type('Result', (), {'boxes': StubBoxes(detections) if detections else None})()]
+
+def make_pipeline(tmp_path, monkeypatch, config: dict, models: dict):
+
+    """ PPE_CV_PIPELINE over stub models, keyed by weights file name """
+
+    for name in models:
+        (tmp_path / name).write_bytes(b'weights')
+    monkeypatch.setattr(cv_pipeline, 'YOLO', lambda path, task: models[os.path.basename(path)])
+
+    config_path = tmp_path / 'cv_pipeline.yaml'
+    config_path.write_text(yaml.safe_dump({'model_path': str(tmp_path / 'main.pt'), 'imgsz': 1280, 'conf': 0.25, **config}))
+    return PPE_CV_PIPELINE(config_path=str(config_path))
+
+NAMES = {0: 'person', 1: 'helmet'}
+
+def test_box_iou():
+
+    boxes = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32)
+
+    assert np.allclose(box_iou(boxes[0], boxes), [1.0, 50 / 150, 0.0])
+
+def test_nms_keeps_the_best_of_overlapping_boxes_per_class():
+
+    boxes = np.array([
+        [0, 0, 10, 10],      # class 0, best
+        [1, 0, 11, 10],      # class 0, overlaps the best one
+        [1, 0, 11, 10],      # class 1, same place but another class
+        [50, 50, 60, 60],    # class 0, far away
+    ], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+    class_ids = np.array([0, 0, 1, 0])
+
+    kept_boxes, kept_scores, kept_class_ids = nms(boxes, scores, class_ids, iou_threshold=0.5)
+
+    # Kept detections come back in their original order
+    assert kept_scores.tolist() == pytest.approx([0.9, 0.7, 0.6])
+    assert kept_class_ids.tolist() == [0, 1, 0]
+    assert np.array_equal(kept_boxes, boxes[[0, 2, 3]])
+
+def test_nms_keeps_boxes_below_the_iou_threshold():
+
+    boxes = np.array([[0, 0, 10, 10], [5, 0, 15, 10]], dtype=np.float32)
+    scores = np.array([0.5, 0.9], dtype=np.float32)
+
+    assert len(nms(boxes, scores, np.array([0, 0]), iou_threshold=0.5)[0]) == 2
+    assert nms(boxes, scores, np.array([0, 0]), iou_threshold=0.3)[1].tolist() == pytest.approx([0.9])
+
+def test_nms_of_no_detections():
+    assert all(len(array) == 0 for array in nms(*empty_detections(), iou_threshold=0.5))
+
+def test_scaled_imgsz_keeps_the_full_frame_pixel_scale(tmp_path, monkeypatch):
+
+    pipeline = make_pipeline(tmp_path, monkeypatch, {}, {'main.pt': StubYOLO(NAMES, lambda image, imgsz: [])})
+
+    assert pipeline._scaled_imgsz(1000, 2000, 1280) == 640
+    # Rounded up to the model stride, and never above imgsz or below one stride
+    assert pipeline._scaled_imgsz(701, 2000, 1280) == 480
+    assert pipeline._scaled_imgsz(3000, 2000, 1280) == 1280
+    assert pipeline._scaled_imgsz(10, 2000, 1280) == 32
+
+def test_roi_crop_is_detected_at_scale_and_mapped_back_to_frame_pixels(tmp_path, monkeypatch):
+
+    def respond(image, imgsz):
+        return [
+            ([10, 10, 50, 100], 0.9, 1),       # Bottom-centre inside the triangle
+            ([900, 400, 980, 490], 0.9, 1),    # Inside the bounding rectangle, outside the triangle
+        ]
+
+    model = StubYOLO(NAMES, respond)
+    # Triangle over the lower right quarter of the frame
+    pipeline = make_pipeline(tmp_path, monkeypatch, {'roi': {'Cam-1': [[0.5, 0.5], [1.0, 0.5], [0.5, 1.0]]}}, {'main.pt': model})
+
+    frame = np.zeros((1000, 2000, 3), dtype=np.uint8)
+    polygon_px, rect = pipeline._roi_region(frame, 'Cam-1')
+    boxes, scores, class_ids = pipeline.detect(frame, camera_name='Cam-1')
+
+    assert rect == (1000, 500, 2000, 1000)
+    assert polygon_px.tolist() == [[1000, 500], [2000, 500], [1000, 1000]]
+    assert model.calls == [{'shape': (500, 1000), 'imgsz': 640, 'classes': None}]
+    assert boxes.tolist() == [[1010, 510, 1050, 600]]
+    assert scores.tolist() == pytest.approx([0.9]) and class_ids.tolist() == [1]
+
+    # Other cameras get the whole frame
+    pipeline.detect(frame, camera_name='Cam-2')
+    assert model.calls[-1]['shape'] == (1000, 2000)
+
+def test_tiled_crops_around_people_and_merges_with_the_low_res_pass(tmp_path, monkeypatch):
+
+    def respond(image, imgsz):
+        if image.shape[:2] == (1000, 2000):
+            # Low-res pass: a person and a weak helmet
+            return [([100, 100, 200, 300], 0.9, 0), ([120, 100, 160, 130], 0.3, 1)]
+        # High-res crop: the same person and helmet, in crop pixels
+        return [([0, 0, 100, 200], 0.95, 0), ([20, 0, 60, 30], 0.8, 1)]
+
+    model = StubYOLO(NAMES, respond)
+    pipeline = make_pipeline(tmp_path, monkeypatch, {
+        'inference_mode': 'tiled',
+        'tiling': {'person_imgsz': 640, 'person_conf': 0.25, 'crop_imgsz': 320, 'context': 0.0, 'min_crop': 100, 'merge_iou': 0.5},
+    }, {'main.pt': model})
+
+    boxes, scores, class_ids = pipeline.detect(np.zeros((1000, 2000, 3), dtype=np.uint8))
+
+    assert [call['imgsz'] for call in model.calls] == [640, 320]
+    # Crop is the person box itself: no context, and larger than min_crop
+    assert model.calls[1]['shape'] == (200, 100)
+    assert boxes.tolist() == [[100, 100, 200, 300], [120, 100, 160, 130]]
+    assert scores.tolist() == pytest.approx([0.95, 0.8])
+    assert class_ids.tolist() == [0, 1]
+
+def test_tiled_without_people_keeps_the_low_res_detections(tmp_path, monkeypatch):
+
+    model = StubYOLO(NAMES, lambda image, imgsz: [([10, 10, 50, 50], 0.6, 1), ([60, 10, 90, 50], 0.1, 1)])
+    pipeline = make_pipeline(tmp_path, monkeypatch, {'inference_mode': 'tiled'}, {'main.pt': model})
+
+    boxes, scores, _ = pipeline.detect(np.zeros((720, 1280, 3), dtype=np.uint8))
+
+    assert len(model.calls) == 1
+    assert boxes.tolist() == [[10, 10, 50, 50]] and scores.tolist() == pytest.approx([0.6])
+
+def test_tiled_needs_a_person_class(tmp_path, monkeypatch):
+
+    pipeline = make_pipeline(tmp_path, monkeypatch, {}, {'main.pt': StubYOLO({0: 'helmet'}, lambda image, imgsz: [])})
+
+    with pytest.raises(ValueError, match='person class'):
+        pipeline.detect(np.zeros((720, 1280, 3), dtype=np.uint8), inference_mode='tiled')
+
+CASCADE_CONFIG = {
+    'inference_mode': 'cascade',
+    'cascade': {'prefilter_model_path': 'prefilter.pt', 'prefilter_imgsz': 320, 'crop_imgsz': 320, 'context': 0.0, 'min_crop': 100, 'merge_iou': 0.5},
+    # Tiling settings that would change every crop and merge if the cascade read them
+    'tiling': {'context': 5.0, 'min_crop': 900, 'merge_iou': 0.01},
+}
+
+def make_cascade(tmp_path, monkeypatch, config: dict = None):
+
+    """ Cascade over a prefilter that sees a person only in frames whose first pixel is set """
+
+    def prefilter_respond(image, imgsz):
+        return [([100, 100, 200, 300], 0.9, 0)] if image[0, 0, 0] else []
+
+    def main_respond(image, imgsz):
+        # Two helmets overlapping at IoU 1/3, in crop pixels
+        return [([0, 0, 30, 30], 0.9, 1), ([15, 0, 45, 30], 0.8, 1)]
+
+    prefilter, model = StubYOLO(NAMES, prefilter_respond), StubYOLO(NAMES, main_respond)
+    config = {**CASCADE_CONFIG, 'cascade': {**CASCADE_CONFIG['cascade'], 'prefilter_model_path': str(tmp_path / 'prefilter.pt'), **(config or {})}}
+    pipeline = make_pipeline(tmp_path, monkeypatch, config, {'main.pt': model, 'prefilter.pt': prefilter})
+    return pipeline, prefilter, model
+
+def test_cascade_escalates_only_frames_the_prefilter_fires_on(tmp_path, monkeypatch):
+
+    pipeline, prefilter, model = make_cascade(tmp_path, monkeypatch)
+
+    idle, busy = np.zeros((1000, 2000, 3), dtype=np.uint8), np.zeros((1000, 2000, 3), dtype=np.uint8)
+    busy[0, 0, 0] = 1
+
+    assert all(len(array) == 0 for array in pipeline.detect(idle))
+    assert model.calls == []
+
+    boxes, scores, _ = pipeline.detect(busy)
+
+    assert [call['classes'] for call in prefilter.calls] == [[0], [0]]
+    # The crop follows the cascade's context and min_crop, and the merge its merge_iou
+    assert model.calls == [{'shape': (200, 100), 'imgsz': 320, 'classes': None}]
+    assert boxes.tolist() == [[100, 100, 130, 130], [115, 100, 145, 130]]
+    assert scores.tolist() == pytest.approx([0.9, 0.8])
+    assert pipeline.cascade_stats == {'frames': 2, 'escalated': 1}
+
+def test_cascade_confirms_on_the_whole_frame(tmp_path, monkeypatch):
+
+    pipeline, _, model = make_cascade(tmp_path, monkeypatch, {'confirm': 'frame'})
+
+    frame = np.zeros((1000, 2000, 3), dtype=np.uint8)
+    frame[0, 0, 0] = 1
+    pipeline.detect(frame)
+
+    assert model.calls == [{'shape': (1000, 2000), 'imgsz': 1280, 'classes': None}]
+    assert pipeline.cascade_stats == {'frames': 1, 'escalated': 1}
+
+def test_cascade_version_ignores_the_tiling_settings(tmp_path, monkeypatch):
+
+    pipeline, _, _ = make_cascade(tmp_path, monkeypatch)
+    version = pipeline.version()
+    pipeline.tiling = {'context': 0.1}
+
+    assert pipeline.version() == version
@@ -0,0 +1,84 @@
+import io
+import json
+import types
+
+import pytest
+
+import log_pipeline
+from log_pipeline import LogPipeline
+
+@pytest.fixture
+def clock(monkeypatch):
+
+    """ Frozen time.time() for the pipeline, advanced by hand """
+
+    now = [1000.0]
+    monkeypatch.setattr(log_pipeline, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+def test_identical_consecutive_lines_are_collapsed_into_a_repeat_count(clock):
+
+    output = io.StringIO()
+    logs = LogPipeline(output=output)
+
+    for line in ['frame=1', 'dup', 'dup', 'dup', 'frame=2']:
+        logs.emit('ffmpeg', line)
+    logs.close()
+
+    assert output.getvalue().splitlines() == ['[ffmpeg] frame=1', '[ffmpeg] dup', '[ffmpeg] last message repeated 2 times', '[ffmpeg] frame=2']
+    assert logs.stats['deduplicated'] == 2 and logs.stats['received'] == 5
+    assert [(record['line'], record['repeats']) for record in logs.tail('ffmpeg')] == [('frame=1', 0), ('dup', 2), ('frame=2', 0)]
+
+def test_token_bucket_passes_a_burst_then_reports_what_it_suppressed(clock):
+
+    output = io.StringIO()
+    logs = LogPipeline(rate_lines_per_second=1.0, burst_lines=2, output=output)
+
+    for i in range(4):
+        logs.emit('mediamtx', f'line {i}')
+    assert logs.stats['rate_limited'] == 2
+    assert logs.sources()['mediamtx']['suppressed'] == 2
+
+    clock[0] += 10
+    logs.emit('mediamtx', 'line 4')
+    logs.close()
+
+    assert output.getvalue().splitlines() == ['[mediamtx] line 0', '[mediamtx] line 1', '[mediamtx] 2 lines suppressed by rate limit', '[mediamtx] line 4']
+    # Rate-limited lines are still kept for /logs
+    assert [record['line'] for record in logs.tail('mediamtx')] == [f'line {i}' for i in range(5)]
+
+def test_sources_are_rate_limited_independently(clock):
+
+    output = io.StringIO()
+    logs = LogPipeline(rate_lines_per_second=1.0, burst_lines=1, output=output)
+
+    for name, line in [('a', 'first'), ('a', 'second'), ('b', 'first')]:
+        logs.emit(name, line, 'stderr')
+    logs.close()
+
+    assert output.getvalue().splitlines() == ['[a] first', '[b] first']
+    assert logs.sources()['a']['suppressed'] == 1 and logs.sources()['b']['suppressed'] == 0
+
+def test_json_output_and_tail_filter(clock):
+
+    output = io.StringIO()
+    logs = LogPipeline(output_format='json', output=output)
+
+    logs.emit('cloudflared', 'connected to edge', 'stderr')
+    logs.emit('cloudflared', 'registered tunnel')
+    logs.close()
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert records[0] == {'ts': 1000.0, 'source': 'cloudflared', 'fd': 'stderr', 'line': 'connected to edge'}
+    assert [record['line'] for record in logs.tail('cloudflared', contains='tunnel')] == ['registered tunnel']
+    assert logs.tail('unknown') is None
+
+def test_least_recently_active_sources_are_forgotten(clock):
+
+    logs = LogPipeline(max_sources=2, output=io.StringIO())
+
+    for name in ['a', 'b', 'a', 'c']:
+        logs.emit(name, 'line')
+    logs.close()
+
+    assert list(logs.sources()) == ['a', 'c']
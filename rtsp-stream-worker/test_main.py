@@ -0,0 +1,208 @@
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip('fastapi')
+aiohttp_web = pytest.importorskip('aiohttp.web')
+
+import main
+
+def test_parse_hls_renditions_sorts_highest_rung_first():
+
+    renditions = main.parse_hls_renditions('360p:640x360:400k, 1080p:1920X1080:3000K,720p:1280x720:1000k')
+
+    assert [rendition['name'] for rendition in renditions] == ['1080p', '720p', '360p']
+    assert renditions[0] == {'name': '1080p', 'width': 1920, 'height': 1080, 'bitrate_k': 3000}
+
+@pytest.mark.parametrize('spec', ['720p:1280x720', '720p:1280:1000k', '720p:1280x720:fast'])
+def test_parse_hls_renditions_rejects_malformed_rungs(spec):
+    with pytest.raises(ValueError):
+        main.parse_hls_renditions(spec)
+
+async def serve_mediamtx_playlists(playlists: dict):
+
+    """ Local stand-in for MediaMTX's HLS server, recording which paths were requested """
+
+    requested = []
+
+    async def handle(request):
+        requested.append(request.path)
+        if request.path not in playlists:
+            return aiohttp_web.Response(status=404)
+        return aiohttp_web.Response(text=playlists[request.path], content_type='application/vnd.apple.mpegurl')
+
+    app = aiohttp_web.Application()
+    app.router.add_get('/{tail:.*}', handle)
+    runner = aiohttp_web.AppRunner(app)
+    await runner.setup()
+    site = aiohttp_web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}", requested
+
+def test_master_playlist_reads_mediamtx_locally_and_declares_only_present_codecs(monkeypatch):
+
+    public_url = 'https://example.trycloudflare.com'
+    playlists = {
+        '/Cam-1/index.m3u8': '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1096000,CODECS="avc1.64001f,mp4a.40.2",RESOLUTION=1280x720\nvideo1_stream.m3u8\n',
+        '/Cam-1_360p/index.m3u8': '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=464000,CODECS="avc1.64001e",RESOLUTION=640x360\nvideo1_stream.m3u8\n',
+    }
+
+    async def run():
+        runner, local_url, requested = await serve_mediamtx_playlists(playlists)
+        monkeypatch.setattr(main, 'mediamtx_hls_url', local_url)
+        monkeypatch.setattr(main, 'central_server', types.SimpleNamespace(hls_public_url=public_url))
+        monkeypatch.setattr(main, 'media_playlists', main.OrderedDict())
+
+        await main.state_store.set_stream('Factory', [f'{public_url}/Cam-1/index.m3u8'], variants={'Cam-1': [
+            {'name': '720p', 'url': f'{public_url}/Cam-1/index.m3u8', 'width': 1280, 'height': 720, 'bandwidth': 1096000},
+            {'name': '360p', 'url': f'{public_url}/Cam-1_360p/index.m3u8', 'width': 640, 'height': 360, 'bandwidth': 464000},
+        ]})
+        await main.state_store.claim_stream('Factory', 10000)
+
+        response = await main.get_master_playlist('Factory', 'Cam-1')
+        # Served from the cache the second time
+        await main.get_master_playlist('Factory', 'Cam-1')
+        await runner.cleanup()
+        return response.body.decode().splitlines(), requested
+
+    lines, requested = asyncio.run(run())
+
+    assert requested == ['/Cam-1/index.m3u8', '/Cam-1_360p/index.m3u8']
+    assert lines[2:] == [
+        '#EXT-X-STREAM-INF:BANDWIDTH=1096000,RESOLUTION=1280x720,CODECS="avc1.64001f,mp4a.40.2"',
+        f'{public_url}/Cam-1/video1_stream.m3u8',
+        '#EXT-X-STREAM-INF:BANDWIDTH=464000,RESOLUTION=640x360,CODECS="avc1.64001e"',
+        f'{public_url}/Cam-1_360p/video1_stream.m3u8',
+    ]
+
+def test_media_playlist_cache_is_bounded(monkeypatch):
+
+    monkeypatch.setattr(main, 'media_playlists', main.OrderedDict())
+    monkeypatch.setattr(main, 'media_playlists_max_entries', 2)
+    monkeypatch.setattr(main, 'central_server', None)
+
+    async def run():
+        runner, local_url, _ = await serve_mediamtx_playlists({f'/{i}/index.m3u8': '#EXTM3U\n' for i in range(3)})
+        for i in range(3):
+            await main._media_playlist(f'{local_url}/{i}/index.m3u8')
+        await runner.cleanup()
+        return [url.split('/')[-2] for url in main.media_playlists]
+
+    assert asyncio.run(run()) == ['1', '2']
+
+def test_remux_server_start_cancels_the_tunnel_when_mediamtx_fails(tmp_path, monkeypatch):
+
+    class FakeProcess:
+        def __init__(self):
+            self.returncode = None
+            self.stdout, self.stderr = asyncio.StreamReader(), asyncio.StreamReader()
+            self.stdout.feed_eof()
+            self.stderr.feed_eof()
+
+    async def create_subprocess_exec(*args, **kwargs):
+        return FakeProcess()
+
+    async def run():
+        tunnel_cancelled = asyncio.Event()
+
+        async def wait_for_mediamtx():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('MediaMTX exited')
+
+        async def start_tunnel():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                tunnel_cancelled.set()
+                raise
+
+        server = object.__new__(main.RemuxServer)
+        server.MEDIAMTX_PATH, server.config_path = 'mediamtx', str(tmp_path / 'mediamtx.yml')
+        server._wait_for_mediamtx, server._start_cloudflare_tunnel = wait_for_mediamtx, start_tunnel
+        monkeypatch.setattr(main.asyncio, 'create_subprocess_exec', create_subprocess_exec)
+
+        with pytest.raises(RuntimeError, match='MediaMTX exited'):
+            await asyncio.wait_for(server.start(), timeout=5)
+        return tunnel_cancelled.is_set()
+
+    assert asyncio.run(run())
+
+def test_failed_preset_start_releases_the_claim(monkeypatch):
+
+    from state import InMemoryKV, StateStore
+
+    class FailingServer:
+        hls_public_url = 'https://example.trycloudflare.com'
+
+        async def wait_ready(self, timeout):
+            return True
+
+        async def add_stream(self, *args, **kwargs):
+            raise RuntimeError('config not writable')
+
+    class Request:
+        async def json(self):
+            return {'stream_name': 'Factory'}
+
+    store = StateStore(InMemoryKV(), 'node-a', prefix='test')
+    monkeypatch.setattr(main, 'state_store', store)
+    monkeypatch.setattr(main, 'central_server', FailingServer())
+    monkeypatch.setattr(main, 'owned_streams', set())
+    monkeypatch.setattr(main, 'preset_video_files', {'Factory': [('factory.mp4', 'Cam-1')]})
+
+    async def run():
+        response = await main.load_stream(Request())
+        return response.status_code, await store.get_stream_owner('Factory'), await store.claim_stream('Factory', 10000)
+
+    assert asyncio.run(run()) == (500, None, True)
+    assert main.owned_streams == set()
+
+def test_s3_version_is_looked_up_once_per_ttl(monkeypatch):
+
+    head_calls = []
+
+    class FakeS3:
+        def head_object(self, Bucket, Key):
+            head_calls.append(Key)
+            return {'ETag': f'"etag-{len(head_calls)}"'}
+
+        def generate_presigned_url(self, operation, Params, ExpiresIn):
+            return f"https://s3.example/{Params['Key']}"
+
+    monkeypatch.setenv('AWS_SOURCE_S3_BUCKET', 'videos')
+    monkeypatch.setattr(main, 'get_s3_client', lambda: FakeS3())
+    monkeypatch.setattr(main, 's3_versions', main.OrderedDict())
+
+    async def run():
+        first, _ = await main._media_source(s3_video_key='cam.mp4')
+        second, source = await main._media_source(s3_video_key='cam.mp4')
+        # Once the entry is older than the TTL the key is checked again
+        main.s3_versions[('videos', 'cam.mp4')] = (0, main.s3_versions[('videos', 'cam.mp4')][1])
+        third, _ = await main._media_source(s3_video_key='cam.mp4')
+        return first, second, third, source()
+
+    first, second, third, url = asyncio.run(run())
+
+    assert first == second == 's3:videos/cam.mp4@etag-1'
+    assert third == 's3:videos/cam.mp4@etag-2' and len(head_calls) == 2
+    assert url == 'https://s3.example/cam.mp4'
+
+def test_path_ready_at_reads_the_publish_time_from_mediamtx():
+
+    responses = {
+        '/v3/paths/get/Cam-1': (200, {'ready': True, 'readyTime': '2026-01-02T03:04:05.5Z'}),
+        '/v3/paths/get/Cam-2': (200, {'ready': False, 'readyTime': None}),
+        '/v3/paths/get/Cam-3': (404, None),
+    }
+
+    async def api_get(path):
+        return responses[path]
+
+    server = object.__new__(main.RemuxServer)
+    server._api_get = api_get
+
+    async def run():
+        return [await server.path_ready_at(name) for name in ('Cam-1', 'Cam-2', 'Cam-3')]
+
+    assert asyncio.run(run()) == [1767323045.5, None, None]
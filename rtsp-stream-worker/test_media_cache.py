@@ -0,0 +1,117 @@
+import os
+import asyncio
+
+import pytest
+
+from media_cache import MediaCache
+
+def write_bytes(size: int):
+    async def producer(output_path: str):
+        await asyncio.sleep(0.01)
+        with open(output_path, 'wb') as f:
+            f.write(b'x' * size)
+    return producer
+
+def test_concurrent_misses_share_one_producer_run(tmp_path):
+
+    runs = []
+
+    async def producer(output_path: str):
+        runs.append(output_path)
+        await write_bytes(10)(output_path)
+
+    async def run():
+        cache = MediaCache(str(tmp_path), budget_bytes=1000)
+        results = await asyncio.gather(*[cache.get('clip|a', 'mp4', producer) for _ in range(5)])
+        return cache, results
+
+    cache, results = asyncio.run(run())
+
+    assert len(runs) == 1
+    assert sorted(outcome for _, outcome in results) == ['coalesced'] * 4 + ['miss']
+    assert len({path for path, _ in results}) == 1
+    assert cache.stats['misses'] == 1 and cache.stats['coalesced'] == 4
+
+def test_failed_producer_fails_every_waiter_and_leaves_nothing_behind(tmp_path):
+
+    async def producer(output_path: str):
+        await asyncio.sleep(0.01)
+        open(output_path, 'wb').close()
+        raise RuntimeError('ffmpeg failed')
+
+    async def run():
+        cache = MediaCache(str(tmp_path), budget_bytes=1000)
+        results = await asyncio.gather(*[cache.get('clip|a', 'mp4', producer) for _ in range(3)], return_exceptions=True)
+        return cache, results
+
+    cache, results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert os.listdir(tmp_path) == []
+    assert cache.usage()['pinned'] == 0
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+
+    async def run():
+        cache = MediaCache(str(tmp_path), budget_bytes=25)
+        for key in ('a', 'b'):
+            path, _ = await cache.get(key, 'jpg', write_bytes(10))
+            cache.release(path)
+        # Touch a, so b is the least recently used
+        cache.release((await cache.get('a', 'jpg', write_bytes(10)))[0])
+        path, _ = await cache.get('c', 'jpg', write_bytes(10))
+        cache.release(path)
+
+        return [outcome for _, outcome in [await cache.get(key, 'jpg', write_bytes(10)) for key in ('a', 'c', 'b')]]
+
+    assert asyncio.run(run()) == ['hit', 'hit', 'miss']
+
+def test_pinned_entry_is_not_evicted_until_released(tmp_path):
+
+    async def run():
+        cache = MediaCache(str(tmp_path), budget_bytes=15)
+        served_path, _ = await cache.get('a', 'mp4', write_bytes(10))
+
+        # Over budget, but both files are still being served
+        other_path, _ = await cache.get('b', 'mp4', write_bytes(10))
+        assert os.path.exists(served_path) and cache.used_bytes == 20
+
+        cache.release(served_path)
+        assert not os.path.exists(served_path) and os.path.exists(other_path)
+        assert cache.used_bytes == 10
+
+        cache.release(other_path)
+        assert cache.usage()['pinned'] == 0
+
+    asyncio.run(run())
+
+def test_waiters_take_over_when_the_producing_request_is_cancelled(tmp_path):
+
+    runs = []
+
+    async def producer(output_path: str):
+        runs.append(output_path)
+        await write_bytes(10)(output_path)
+
+    async def run():
+        cache = MediaCache(str(tmp_path), budget_bytes=1000)
+        owner = asyncio.create_task(cache.get('clip|a', 'mp4', producer))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get('clip|a', 'mp4', producer)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        # The client that triggered the cut disconnects mid-build
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+
+        results = await asyncio.gather(*waiters)
+        for path, _ in results:
+            cache.release(path)
+        return cache, results
+
+    cache, results = asyncio.run(run())
+
+    assert len(runs) == 2
+    assert sorted(outcome for _, outcome in results) == ['coalesced', 'coalesced', 'miss']
+    assert cache.usage()['pinned'] == 0 and cache.used_bytes == 10
@@ -0,0 +1,73 @@
+import json
+import asyncio
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from preset_tracks import PresetTracks, PresetTrackCache
+
+def write_tracks(tracks_path, frame_count: int, fps: float):
+
+    """ Tracks with one detection per frame, whose score is the frame index """
+
+    np.savez(
+        tracks_path,
+        offsets=np.arange(frame_count + 1, dtype=np.int64),
+        boxes=np.zeros((frame_count, 4), dtype=np.float32),
+        scores=np.arange(frame_count, dtype=np.float32),
+        class_ids=np.zeros(frame_count, dtype=np.int16),
+        meta=np.array(json.dumps({'fps': fps, 'class_names': {'0': 'person'}})),
+    )
+    return str(tracks_path)
+
+def test_frame_index_wraps_on_the_container_duration(tmp_path):
+
+    # 10 frames at 10 fps, in a file whose audio runs to 1.5s
+    tracks = PresetTracks(write_tracks(tmp_path / 'tracks.npz', 10, 10.0), loop_duration_s=1.5)
+
+    assert tracks.duration == 1.5
+    assert [tracks.frame_index(t) for t in (0.0, 0.55, 0.99)] == [0, 5, 9]
+    # The last frame stays on screen until the audio ends and the loop restarts
+    assert [tracks.frame_index(t) for t in (1.2, 1.49)] == [9, 9]
+    assert [tracks.frame_index(t) for t in (1.5, 1.65, 15.05, 3000.25)] == [0, 1, 0, 2]
+
+    frame_index, _, scores, _ = tracks.at(1.65)
+    assert frame_index == 1 and scores.tolist() == [1.0]
+
+def test_frame_index_falls_back_to_the_frame_count(tmp_path):
+
+    tracks = PresetTracks(write_tracks(tmp_path / 'tracks.npz', 10, 10.0))
+
+    assert tracks.duration == 1.0
+    assert [tracks.frame_index(t) for t in (0.95, 1.0, 1.25)] == [9, 0, 2]
+
+def test_failed_build_is_cached_until_the_ttl_expires(tmp_path):
+
+    builds = []
+
+    def failing_pipeline():
+        builds.append(1)
+        raise RuntimeError('weights missing')
+
+    async def run():
+        cache = PresetTrackCache(str(tmp_path), failing_pipeline, failure_ttl_s=0.05)
+        video_path = tmp_path / 'preset.mp4'
+        video_path.write_bytes(b'not a video')
+
+        with pytest.raises(RuntimeError, match='weights missing'):
+            await cache.ensure(str(video_path), 'Camera-1')
+        assert cache.failure('Camera-1')['error'] == 'weights missing'
+
+        # Within the TTL the failure is returned without another build
+        with pytest.raises(RuntimeError, match='retrying in'):
+            await cache.ensure(str(video_path), 'Camera-1')
+        assert len(builds) == 1
+
+        await asyncio.sleep(0.06)
+        assert cache.failure('Camera-1') is None
+        with pytest.raises(RuntimeError, match='weights missing'):
+            await cache.ensure(str(video_path), 'Camera-1')
+        assert len(builds) == 2
+
+    asyncio.run(run())
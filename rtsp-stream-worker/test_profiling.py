@@ -0,0 +1,39 @@
+import os
+import time
+
+from profiling import StageTimers, JobProfile, prune_profiles
+
+def test_max_is_the_longest_single_run_not_a_batch_mean():
+
+    timers = StageTimers()
+    timers.add('detect', 0.2)
+    timers.add('detect', 0.9, count=3)
+    timers.add('detect', 0.1)
+
+    stage = timers.summary()['detect']
+    assert stage['count'] == 5
+    assert abs(stage['total_s'] - 1.2) < 1e-9
+    assert stage['max_s'] == 0.2
+    assert abs(stage['max_mean_s'] - 0.3) < 1e-9
+
+def test_prune_profiles_keeps_the_newest(tmp_path):
+
+    for i in range(4):
+        (tmp_path / f'job_{i}').mkdir()
+        os.utime(tmp_path / f'job_{i}', (time.time() - 100 + i, time.time() - 100 + i))
+
+    assert prune_profiles(str(tmp_path), 2) == 2
+    assert sorted(os.listdir(tmp_path)) == ['job_2', 'job_3']
+    assert prune_profiles(str(tmp_path / 'missing'), 2) == 0
+
+def test_job_profile_writes_its_files_within_the_retention_cap(tmp_path):
+
+    for i in range(3):
+        profile = JobProfile(str(tmp_path), f'stream {i}', interval_s=0.001, max_profiles=2)
+        profile.start()
+        with profile.timers.stage('download'):
+            time.sleep(0.005)
+        profile_dir = profile.finish()
+
+    assert sorted(os.listdir(profile_dir)) == sorted(JobProfile.FILES)
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,81 @@
+import os
+import asyncio
+
+import pytest
+
+from scratch import ScratchSpace
+
+def test_reserve_waits_while_over_budget_and_resumes_on_release(tmp_path):
+
+    async def run():
+        scratch = ScratchSpace(str(tmp_path), budget_bytes=100)
+        first_released = asyncio.Event()
+        order = []
+
+        async def first():
+            async with scratch.reserve(70):
+                order.append('first')
+                await asyncio.sleep(0.02)
+            first_released.set()
+
+        async def second():
+            await asyncio.sleep(0.005)
+            async with scratch.reserve(50):
+                # Only admitted once the first job has given its bytes back
+                assert first_released.is_set()
+                order.append('second')
+                assert scratch.reserved_bytes == 50
+
+        async def watch():
+            await asyncio.sleep(0.01)
+            return scratch.waiting_jobs, scratch.reserved_bytes
+
+        _, _, waiting = await asyncio.gather(first(), second(), watch())
+        return scratch, order, waiting
+
+    scratch, order, waiting = asyncio.run(run())
+
+    assert order == ['first', 'second']
+    assert waiting == (1, 70)
+    assert scratch.reserved_bytes == 0 and scratch.waiting_jobs == 0
+
+def test_reservations_that_fit_run_together(tmp_path):
+
+    async def run():
+        scratch = ScratchSpace(str(tmp_path), budget_bytes=100)
+        async with scratch.reserve(40), scratch.reserve(60):
+            return scratch.reserved_bytes
+
+    assert asyncio.run(run()) == 100
+
+def test_reserve_is_released_when_the_job_fails(tmp_path):
+
+    async def run():
+        scratch = ScratchSpace(str(tmp_path), budget_bytes=100)
+        with pytest.raises(RuntimeError):
+            async with scratch.reserve(80):
+                raise RuntimeError('ffmpeg failed')
+        return scratch.reserved_bytes
+
+    assert asyncio.run(run()) == 0
+
+def test_reserve_rejects_jobs_larger_than_the_budget(tmp_path):
+
+    async def run():
+        scratch = ScratchSpace(str(tmp_path), budget_bytes=100)
+        async with scratch.reserve(101):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+def test_workspace_is_removed_afterwards(tmp_path):
+
+    async def run():
+        scratch = ScratchSpace(str(tmp_path), budget_bytes=100)
+        async with scratch.workspace('Cam 1/clip') as workspace_path:
+            assert os.path.isdir(workspace_path)
+            assert os.path.basename(workspace_path).startswith('Cam_1_clip-')
+        return workspace_path
+
+    assert not os.path.exists(asyncio.run(run()))
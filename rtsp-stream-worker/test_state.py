@@ -0,0 +1,193 @@
+import json
+import asyncio
+
+import pytest
+
+from state import InMemoryKV, RedisKV, StateStore, run_job_worker
+
+def make_store(node_id='node-a', kv=None):
+    return StateStore(kv or InMemoryKV(), node_id, prefix='test')
+
+def test_claim_leases_the_job_and_marks_it_active():
+
+    async def run():
+        store = make_store()
+        job_id = await store.enqueue_job({'stream_name': 's1'})
+
+        assert await store.claim_job(lease_ms=1000) == (job_id, {'stream_name': 's1'})
+        assert await store.kv.get(store._key('lease', job_id)) == 'node-a'
+        assert await store.kv.hgetall(store._key('jobs', 'active')) == {job_id: 'node-a'}
+        assert await store.claim_job(lease_ms=1000) is None
+
+    asyncio.run(run())
+
+def test_renew_only_succeeds_for_the_lease_holder():
+
+    async def run():
+        kv = InMemoryKV()
+        store, other = make_store('node-a', kv), make_store('node-b', kv)
+        job_id = await store.enqueue_job({})
+        await store.claim_job(lease_ms=1000)
+
+        assert await store.renew_job(job_id, 1000)
+        assert not await other.renew_job(job_id, 1000)
+
+    asyncio.run(run())
+
+def test_expired_lease_is_requeued_once_and_claimable_again():
+
+    async def run():
+        kv = InMemoryKV()
+        dead, alive = make_store('node-a', kv), make_store('node-b', kv)
+        job_id = await dead.enqueue_job({'stream_name': 's1'})
+        await dead.claim_job(lease_ms=20)
+
+        assert await alive.requeue_expired_jobs() == 0
+        await asyncio.sleep(0.05)
+
+        assert not await dead.renew_job(job_id, 1000)
+        assert await alive.requeue_expired_jobs() == 1
+        assert await alive.requeue_expired_jobs() == 0
+        assert await alive.claim_job(lease_ms=1000) == (job_id, {'stream_name': 's1'})
+
+    asyncio.run(run())
+
+def test_worker_completes_the_job_after_the_handler_finishes():
+
+    async def run():
+        store = make_store()
+        job_id = await store.enqueue_job({'stream_name': 's1'})
+        handled = []
+
+        async def handler(job_id, payload):
+            handled.append((job_id, payload))
+
+        await run_job_worker(store, handler, lease_ms=1000, stop_when_idle=True)
+
+        assert handled == [(job_id, {'stream_name': 's1'})]
+        assert await store.kv.get(store._key('job', job_id)) is None
+        assert await store.kv.hgetall(store._key('jobs', 'active')) == {}
+
+    asyncio.run(run())
+
+def test_worker_cancels_the_handler_when_the_lease_is_lost():
+
+    async def run():
+        store = make_store()
+        job_id = await store.enqueue_job({'stream_name': 's1'})
+        cancelled = asyncio.Event()
+
+        async def handler(job_id, payload):
+            # Another node takes the job over while this one is still running it
+            await store.kv.set(store._key('lease', job_id), 'node-b', px=10000)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        await asyncio.wait_for(run_job_worker(store, handler, lease_ms=30, stop_when_idle=True), timeout=5)
+
+        assert cancelled.is_set()
+        # The job is left to its new owner rather than completed
+        assert await store.kv.get(store._key('lease', job_id)) == 'node-b'
+        assert json.loads(await store.kv.get(store._key('job', job_id))) == {'stream_name': 's1'}
+
+    asyncio.run(run())
+
+async def start_slow_redis(delay_s: float):
+
+    """ Answers every command with a bulk string of its last argument, after delay_s """
+
+    async def handle(reader, writer):
+        while line := await reader.readline():
+            args = []
+            for _ in range(int(line[1:-2])):
+                await reader.readline()
+                args.append((await reader.readline())[:-2])
+            await asyncio.sleep(delay_s)
+            writer.write(b'$%d\r\n%s\r\n' % (len(args[-1]), args[-1]))
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+def test_redis_command_timeout_does_not_leave_a_stale_reply():
+
+    async def run():
+        server = await start_slow_redis(0.1)
+        kv = RedisKV(f"redis://127.0.0.1:{server.sockets[0].getsockname()[1]}/0")
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(kv.get('first'), timeout=0.02)
+        assert await kv.get('second') == 'second'
+
+        await kv.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+
+def test_redis_claim_runs_as_one_script():
+
+    pytest.importorskip('aiohttp')
+    from benchmarks.stand_ins import StandInRedis
+
+    async def run():
+        redis = await StandInRedis().start()
+        store = make_store(kv=RedisKV(redis.url))
+        job_id = await store.enqueue_job({'stream_name': 's1'})
+
+        assert await store.claim_job(lease_ms=1000) == (job_id, {'stream_name': 's1'})
+        assert await redis.kv.get(store._key('lease', job_id)) == 'node-a'
+        assert await store.claim_job(lease_ms=1000) is None
+
+        await store.close()
+        await redis.stop()
+
+    asyncio.run(run())
+
+def test_redis_renew_only_extends_a_lease_this_node_holds():
+
+    pytest.importorskip('aiohttp')
+    from benchmarks.stand_ins import StandInRedis
+
+    async def run():
+        redis = await StandInRedis().start()
+        store, other = make_store('node-a', RedisKV(redis.url)), make_store('node-b', RedisKV(redis.url))
+        job_id = await store.enqueue_job({})
+        await store.claim_job(lease_ms=1000)
+
+        assert await store.renew_job(job_id, 1000)
+        assert not await other.renew_job(job_id, 1000)
+        assert await redis.kv.get(store._key('lease', job_id)) == 'node-a'
+
+        await store.close()
+        await other.close()
+        await redis.stop()
+
+    asyncio.run(run())
+
+def test_worker_keeps_renewing_after_a_store_error():
+
+    async def run():
+        store = make_store()
+        await store.enqueue_job({'stream_name': 's1'})
+        renew_job, attempts = store.renew_job, []
+
+        async def flaky_renew_job(job_id, lease_ms):
+            attempts.append(job_id)
+            if len(attempts) == 1:
+                raise ConnectionError('redis unavailable')
+            return await renew_job(job_id, lease_ms)
+
+        store.renew_job = flaky_renew_job
+
+        async def handler(job_id, payload):
+            await asyncio.sleep(0.1)
+
+        await asyncio.wait_for(run_job_worker(store, handler, lease_ms=60, stop_when_idle=True), timeout=5)
+        return len(attempts)
+
+    # The first renew failed, yet the lease was kept alive until the handler finished
+    assert asyncio.run(run()) >= 3